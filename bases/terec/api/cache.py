@@ -0,0 +1,94 @@
+"""
+Small in-process caches for data read on every request.
+Entries expire after ttl seconds so that changes made by other processes are
+eventually visible, changes made by this process invalidate entries explicitly.
+"""
+
+import os
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Callable
+
+METADATA_CACHE_TTL = float(os.getenv("TEREC_METADATA_CACHE_TTL", "60"))
+METADATA_CACHE_SIZE = 10000
+SUITE_RUNS_CACHE_TTL = float(os.getenv("TEREC_SUITE_RUNS_CACHE_TTL", "30"))
+SUITE_RUNS_CACHE_SIZE = 1000
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with entries expiring after ttl seconds.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, timer: Callable = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= self.timer():
+                del self.entries[key]
+                return default
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value) -> None:
+        with self.lock:
+            self.entries[key] = (self.timer() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def get_or_load(self, key, loader: Callable):
+        """
+        Returns cached value or the one returned by the loader.
+        None (nothing found) is not cached.
+        """
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    def invalidate(self, key) -> None:
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def invalidate_if(self, predicate: Callable) -> None:
+        """
+        Drops all entries with keys matching the predicate.
+        """
+        with self.lock:
+            for key in [k for k in self.entries if predicate(k)]:
+                del self.entries[key]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+
+# orgs, projects, suites and suite runs by their primary keys
+metadata_cache = TTLCache(maxsize=METADATA_CACHE_SIZE, ttl=METADATA_CACHE_TTL)
+
+# recent runs of suites (on a branch or all) by (org, project, suite, branch, limit)
+suite_runs_cache = TTLCache(maxsize=SUITE_RUNS_CACHE_SIZE, ttl=SUITE_RUNS_CACHE_TTL)
+
+
+def invalidate_suite_runs(org: str, project: str, suite: str, branch: str) -> None:
+    """
+    Drops cached recent runs of the suite on the branch and on all branches (any limit).
+    """
+    suite_key = (org, project, suite)
+    suite_runs_cache.invalidate_if(
+        lambda key: key[:3] == suite_key and key[3] in (branch, None)
+    )
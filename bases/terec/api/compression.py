@@ -0,0 +1,190 @@
+"""
+Support for compressed request bodies (Content-Encoding: gzip or zstd).
+Bulk uploads are mostly repetitive stdout/stderr/stacktrace text so they compress very well.
+Bodies are decompressed as a stream, chunk by chunk, so streaming endpoints keep working.
+"""
+
+import json
+import os
+import zlib
+
+from fastapi import HTTPException
+from starlette.datastructures import Headers
+from starlette.responses import PlainTextResponse
+
+SUPPORTED_ENCODINGS = ["gzip", "zstd"]
+# limit of decompressed request body, bigger bodies are rejected with 413
+MAX_DECOMPRESSED_BODY_BYTES = int(
+    os.getenv("TEREC_MAX_DECOMPRESSED_BODY_BYTES", str(256 * 1024 * 1024))
+)
+
+
+def request_compression() -> str | None:
+    """
+    Compression used by clients for request bodies: TEREC_COMPRESSION env variable (gzip by default).
+    Use "none" to send uncompressed bodies.
+    """
+    encoding = os.environ.get("TEREC_COMPRESSION", "gzip").lower()
+    return None if encoding in ["", "none", "identity"] else encoding
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+        return compressor.compress(data) + compressor.flush()
+    if encoding == "zstd":
+        import zstandard
+
+        return zstandard.ZstdCompressor().compress(data)
+    raise ValueError(f"Unsupported encoding {encoding}, expected {SUPPORTED_ENCODINGS}")
+
+
+def compressed_chunks(file, encoding: str | None, chunk_size: int = 1024 * 1024):
+    """
+    Yields chunks of binary file compressed with given encoding (or as they are if None),
+    so that big files can be uploaded as a stream.
+    """
+    if encoding == "gzip":
+        compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    elif encoding == "zstd":
+        import zstandard
+
+        compressor = zstandard.ZstdCompressor().compressobj()
+    elif encoding:
+        raise ValueError(
+            f"Unsupported encoding {encoding}, expected {SUPPORTED_ENCODINGS}"
+        )
+    else:
+        compressor = None
+    while data := file.read(chunk_size):
+        yield compressor.compress(data) if compressor else data
+    if compressor:
+        yield compressor.flush()
+
+
+def json_request_body(body, encoding: str | None) -> tuple[bytes, dict]:
+    """
+    Returns json encoded (and optionally compressed) body with headers describing it.
+    """
+    data = json.dumps(body).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if encoding:
+        data = compress(data, encoding)
+        headers["Content-Encoding"] = encoding
+    return data, headers
+
+
+class BodyTooLargeError(ValueError):
+    pass
+
+
+class BoundedDecompressor:
+    """
+    Streaming decompressor (with decompress() and flush()) failing with BodyTooLargeError
+    as soon as the decompressed body exceeds max_size bytes, so that a small body
+    expanding to gigabytes is rejected before it is held in memory.
+    """
+
+    def __init__(self, encoding: str, max_size: int):
+        self.max_size = max_size
+        self.size = 0
+        self.output = []
+        self.gunzip = self.zstd = None
+        if encoding == "gzip":
+            self.gunzip = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        else:
+            import zstandard
+
+            # decompressed data is passed to write() piece by piece
+            self.zstd = zstandard.ZstdDecompressor().stream_writer(self)
+
+    def write(self, data) -> int:
+        self._add(data)
+        self.output.append(bytes(data))
+        return len(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        if self.gunzip:
+            # never inflate more than one byte over the limit
+            body = self.gunzip.decompress(data, self.max_size - self.size + 1)
+            self._add(body)
+            return body
+        self.zstd.write(data)
+        body = b"".join(self.output)
+        self.output.clear()
+        return body
+
+    def flush(self) -> bytes:
+        if self.gunzip:
+            body = self.gunzip.flush()
+            self._add(body)
+            return body
+        return b""
+
+    def _add(self, data) -> None:
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise BodyTooLargeError(
+                f"Decompressed request body exceeds {self.max_size} bytes"
+            )
+
+
+def decompressor(encoding: str, max_size: int = MAX_DECOMPRESSED_BODY_BYTES):
+    """
+    Returns streaming decompressor limited to max_size bytes of output
+    or None if the encoding is not supported.
+    """
+    if encoding not in SUPPORTED_ENCODINGS:
+        return None
+    try:
+        return BoundedDecompressor(encoding, max_size)
+    except ImportError:
+        return None
+
+
+class DecompressRequestMiddleware:
+    """
+    ASGI middleware decompressing request bodies sent with Content-Encoding gzip or zstd.
+    Content-Encoding and Content-Length headers are removed so that endpoints see plain body.
+    Bodies decompressed to more than max_body_size bytes are rejected with 413.
+    """
+
+    def __init__(self, app, max_body_size: int = MAX_DECOMPRESSED_BODY_BYTES):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = Headers(scope=scope).get("content-encoding", "").strip().lower()
+        if encoding in ["", "identity"]:
+            return await self.app(scope, receive, send)
+        body_decompressor = decompressor(encoding, self.max_body_size)
+        if body_decompressor is None:
+            response = PlainTextResponse(
+                f"Unsupported Content-Encoding: {encoding}", status_code=415
+            )
+            return await response(scope, receive, send)
+
+        async def receive_decompressed():
+            message = await receive()
+            if message["type"] != "http.request":
+                return message
+            try:
+                body = body_decompressor.decompress(message.get("body", b""))
+                if not message.get("more_body", False):
+                    body += body_decompressor.flush()
+            except BodyTooLargeError as e:
+                raise HTTPException(status_code=413, detail=str(e))
+            except Exception as e:
+                raise HTTPException(
+                    status_code=400, detail=f"Invalid {encoding} request body: {e}"
+                )
+            return {**message, "body": body}
+
+        headers = [
+            (k, v)
+            for k, v in scope["headers"]
+            if k not in [b"content-encoding", b"content-length"]
+        ]
+        await self.app({**scope, "headers": headers}, receive_decompressed, send)
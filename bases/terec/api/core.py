@@ -1,12 +1,16 @@
 import fastapi
 
-from .routers import failures, plots, projects, results
+from .compression import DecompressRequestMiddleware
+from .routers import failures, jobs, junit, plots, projects, results
 
 
 def create_app():
     app = fastapi.FastAPI()
+    app.add_middleware(DecompressRequestMiddleware)
     app.include_router(projects.router, prefix="/admin")
     app.include_router(results.router, prefix="/tests")
+    app.include_router(jobs.router, prefix="/tests")
+    app.include_router(junit.router, prefix="/tests")
     app.include_router(plots.router, prefix="/history")
     app.include_router(failures.router, prefix="/history")
     return app
@@ -1,4 +1,5 @@
 from terec.api.core import create_app
+from terec.api.routers.jobs import ingest_queue
 from terec.database import cassandra_session
 from terec.model.util import cqlengine_init
 
@@ -6,5 +7,8 @@ from terec.model.util import cqlengine_init
 cassandra = cassandra_session()
 cqlengine_init(cassandra)
 
+# start background workers for queued imports
+ingest_queue()
+
 # create app
 app = create_app()
@@ -1,34 +1,55 @@
 import datetime
-import uuid
-
-from functools import lru_cache
+from typing import Annotated
 
 from codetiming import Timer
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
 from loguru import logger
 from pydantic.main import BaseModel
 
 from terec.api.auth import req_read_perm
-from terec.api.routers.results import TestSuiteRunInfo, TestCaseRunInfo
+from terec.api.cache import suite_runs_cache
+from terec.api.routers.results import (
+    TestSuiteRunInfo,
+    TestCaseRunInfo,
+    case_run_info,
+    get_projection_or_raise,
+)
 from terec.api.routers.util import (
     get_org_or_raise,
     get_org_project_or_raise,
     get_test_suite_or_raise,
+    get_test_suite_run_or_raise,
+    raise_bad_request,
 )
 from terec.model.failures import (
-    load_failed_tests_for_suite_runs,
-    load_suite_branch_runs,
-    load_test_case_runs,
+    load_failed_tests_for_suite_runs_async,
+    load_suite_branch_runs_async,
+    load_test_case_history_async,
+    load_test_case_runs_async,
+    load_test_cases_history_async,
+    projection_columns,
 )
+from terec.model.history import summarize_history
 from terec.model.results import (
     TestSuiteRun,
     TestCaseRun,
+    TestCaseRunRow,
 )
 from terec.model.util import model_to_dict
-from terec.regression.failure_analysis import TestCaseRunFailureAnalyser
+from terec.regression.failure_analysis import (
+    SuiteRunFailureAnalyser,
+    TestCaseRunFailureAnalyser,
+)
 
 router = APIRouter()
 
+# kept for compatibility of the clients, suite runs are no longer cached per request id
+UserReqId = Annotated[
+    str | None, Query(deprecated=True, description="Deprecated: accepted but ignored.")
+]
+
 
 def request_error(msg):
     raise HTTPException(status_code=500, detail=msg)
@@ -61,52 +82,144 @@ def validate_path(org_name: str, project_name: str, suite_name: str):
     get_test_suite_or_raise(org_name, project_name, suite_name)
 
 
-@lru_cache(maxsize=1024)
-def get_suite_branch_runs(
+async def get_suite_branch_runs_async(
     org_name: str,
     project_name: str,
     suite_name: str,
-    branch: str | None = None,
-    limit: int = 32,
-    user_req_id: str = str(
-        uuid.uuid1()
-    ),  # for memoizing if part of the same user request
+    branch: str | None,
+    limit: int,
 ) -> list[TestSuiteRun]:
-    runs = load_suite_branch_runs(org_name, project_name, suite_name, branch, limit)
-    logger.info(
-        "Found {} interesting build runs for suite {}/{} on branch {}",
-        len(runs),
-        project_name,
-        suite_name,
-        branch,
-    )
+    """
+    Returns recent runs of the suite (on the branch if given): they are cached
+    until a run of the suite is saved (or for SUITE_RUNS_CACHE_TTL seconds).
+    """
+    key = (org_name, project_name, suite_name, branch, limit)
+    runs = suite_runs_cache.get(key)
+    if runs is None:
+        runs = await load_suite_branch_runs_async(
+            org_name, project_name, suite_name, branch, limit
+        )
+        suite_runs_cache.put(key, runs)
     return runs
 
 
+class TestCaseRunRefInfo(TestCaseRunInfo):
+    """
+    Test case run info referencing its suite run by run id (used in normalized responses).
+    """
+
+    run_id: int
+
+
+class TestCaseRunsWithSuiteRuns(BaseModel):
+    """
+    Normalized list of test case runs: each suite run is sent only once in runs map
+    (by run id) and test case runs only reference it with run_id.
+    """
+
+    runs: dict[int, TestSuiteRunInfo]
+    tests: list[TestCaseRunRefInfo]
+
+
+def suite_run_infos(suite_runs: list[TestSuiteRun]) -> dict[int, TestSuiteRunInfo]:
+    return {r.run_id: TestSuiteRunInfo(**model_to_dict(r)) for r in suite_runs}
+
+
 def combine_test_runs_with_suite_runs(
-    test_runs: list[TestCaseRun], suite_runs: list[TestSuiteRun]
+    test_runs: list[TestCaseRun],
+    suite_runs: list[TestSuiteRun],
+    columns: tuple[str, ...] | None = None,
 ):
-    runs_by_id = {r.run_id: r for r in suite_runs}
-    res = []
-    for test in test_runs:
-        test_info = TestCaseRunInfo(**model_to_dict(test))
-        run_info = TestSuiteRunInfo(**model_to_dict(runs_by_id[test.run_id]))
-        res.append(TestCaseSuiteRunInfo(test_run=test_info, suite_run=run_info))
-    return res
+    # suite run infos are built once and shared by test runs
+    runs_by_id = suite_run_infos(suite_runs)
+    return [
+        TestCaseSuiteRunInfo(
+            test_run=case_run_info(test, columns), suite_run=runs_by_id[test.run_id]
+        )
+        for test in test_runs
+    ]
+
+
+# fields of TestCaseRunInfo in the order of the model
+CASE_RUN_INFO_FIELDS = tuple(TestCaseRunInfo.model_fields)
+
+
+def case_run_info_fields(columns: tuple[str, ...] | None) -> tuple[str, ...]:
+    """
+    Fields of TestCaseRunInfo sent for test case runs read with given columns.
+    """
+    if not columns:
+        return CASE_RUN_INFO_FIELDS
+    return tuple(f for f in CASE_RUN_INFO_FIELDS if f in columns)
+
+
+def suite_runs_data(suite_runs: list[TestSuiteRun]) -> dict[int, dict]:
+    return {
+        run_id: info.model_dump(mode="json")
+        for run_id, info in suite_run_infos(suite_runs).items()
+    }
+
+
+def case_runs_data(
+    test_runs: list[TestCaseRunRow],
+    fields: tuple[str, ...],
+    runs_data: dict[int, dict] | None = None,
+) -> list[dict]:
+    """
+    Builds response content of test case runs read as plain rows: test run and suite run pairs
+    (as TestCaseSuiteRunInfo) or test runs with run_id if runs_data is None (normalized).
+    """
+    if runs_data is None:
+        fields += ("run_id",)
+        return [{f: t.get(f) for f in fields} for t in test_runs]
+    return [
+        {
+            "test_run": {f: t.get(f) for f in fields},
+            "suite_run": runs_data[t["run_id"]],
+        }
+        for t in test_runs
+    ]
+
+
+def runs_history_response(
+    test_runs: list[TestCaseRunRow],
+    suite_runs: list[TestSuiteRun],
+    columns: tuple[str, ...] | None,
+    normalized: bool,
+) -> ORJSONResponse:
+    """
+    Fast path for big lists of test case runs: content is built from plain rows directly
+    (same as list of TestCaseSuiteRunInfo or TestCaseRunsWithSuiteRuns with unset fields excluded)
+    without building and validating pydantic models for each row,
+    and it is serialized with orjson. Each suite run is serialized only once.
+    """
+    fields = case_run_info_fields(columns)
+    runs_data = suite_runs_data(suite_runs)
+    if normalized:
+        content = {"runs": runs_data, "tests": case_runs_data(test_runs, fields)}
+    else:
+        content = case_runs_data(test_runs, fields, runs_data)
+    return ORJSONResponse(content)
 
 
 @Timer(name="api-history-get-failed-tests", logger=logger.info)
-@router.get("/orgs/{org_name}/projects/{project_name}/suites/{suite_name}/failed-tests")
-def get_suite_branch_run_failed_tests(
+@router.get(
+    "/orgs/{org_name}/projects/{project_name}/suites/{suite_name}/failed-tests",
+    response_model_exclude_unset=True,
+)
+async def get_suite_branch_run_failed_tests(
     org_name: str,
     project_name: str,
     suite_name: str,
     branch: str | None = None,
     limit: int = 32,
     threshold: int | None = None,
-    user_req_id: str | None = None,
+    user_req_id: UserReqId = None,
+    fields: str | None = None,
+    exclude: str | None = None,
+    normalized: bool = False,
     authz: str = Depends(req_read_perm),
-) -> list[TestCaseSuiteRunInfo]:
+) -> list[TestCaseSuiteRunInfo] | TestCaseRunsWithSuiteRuns:
     """
     Return list of all failed tests for given suite and branch.
     Each item on the list is ia pair of (test case run info, suite run info).
@@ -114,19 +227,21 @@ def get_suite_branch_run_failed_tests(
     Query parameters:
     1. limit - use N recent builds (ordered by run_id descending)
     2. threshold - return only tests that failed at least T times [TODO]
+    3. fields / exclude - comma separated test fields to read and return (or to skip),
+       test keys and result are always returned
+    4. normalized - return suite runs once in runs map (by run_id) and test runs
+       with their run_id instead of the pairs
     """
+    columns = get_projection_or_raise(fields, exclude)
     # collect relevant suite runs (on the branch)
-    validate_path(org_name, project_name, suite_name)
-    runs_history = get_suite_branch_runs(
-        org_name,
-        project_name,
-        suite_name,
-        branch,
-        limit,
-        user_req_id=user_req_id or str(uuid.uuid1()),
+    await run_in_threadpool(validate_path, org_name, project_name, suite_name)
+    runs_history = await get_suite_branch_runs_async(
+        org_name, project_name, suite_name, branch, limit
     )
     # collect failures for given runs history
-    failed_tests = load_failed_tests_for_suite_runs(runs_history)
+    failed_tests = await load_failed_tests_for_suite_runs_async(
+        runs_history, columns=columns, as_rows=True
+    )
     logger.info(
         "Found {} failed tests for suite {}/{} on branch {}",
         len(failed_tests),
@@ -135,12 +250,15 @@ def get_suite_branch_run_failed_tests(
         branch,
     )
     # transform into run info
-    return combine_test_runs_with_suite_runs(failed_tests, runs_history)
+    return runs_history_response(failed_tests, runs_history, columns, normalized)
 
 
 @Timer(name="api-history-get-test-runs", logger=logger.info)
-@router.get("/orgs/{org_name}/projects/{project_name}/suites/{suite_name}/test-runs")
-def get_suite_branch_test_runs_history(
+@router.get(
+    "/orgs/{org_name}/projects/{project_name}/suites/{suite_name}/test-runs",
+    response_model_exclude_unset=True,
+)
+async def get_suite_branch_test_runs_history(
     org_name: str,
     project_name: str,
     suite_name: str,
@@ -150,30 +268,34 @@ def get_suite_branch_test_runs_history(
     test_case: str | None = None,
     test_config: str | None = None,
     run_limit: int = 32,
-    user_req_id: str | None = None,
+    user_req_id: UserReqId = None,
+    fields: str | None = None,
+    exclude: str | None = None,
+    normalized: bool = False,
     authz: str = Depends(req_read_perm),
-) -> list[TestCaseSuiteRunInfo]:
+) -> list[TestCaseSuiteRunInfo] | TestCaseRunsWithSuiteRuns:
     """
     Return history of tests - identified by {package, class, testname} in runs of given suite on given branch.
     Each item on the list is ia pair of (test case run info, suite run info).
+    Test fields can be limited with fields / exclude and the response can be normalized
+    as for failed-tests.
     TODO: order info - maybe unordered?
     """
     # validate parameters
     if test_case and not test_class:
         request_error("When test_case is set then test_class is also required.")
+    columns = get_projection_or_raise(fields, exclude)
     # collect relevant suite runs (on the branch)
-    validate_path(org_name, project_name, suite_name)
-    suite_runs = get_suite_branch_runs(
-        org_name,
-        project_name,
-        suite_name,
-        branch,
-        run_limit,
-        user_req_id=user_req_id or str(uuid.uuid1()),
+    await run_in_threadpool(validate_path, org_name, project_name, suite_name)
+    suite_runs = await get_suite_branch_runs_async(
+        org_name, project_name, suite_name, branch, run_limit
     )
-    # collect test run history
+    # collect test run history: single test case has its own history partition
     suite_runs_ids = [x.run_id for x in suite_runs]
-    test_runs = load_test_case_runs(
+    load_history = (
+        load_test_case_history_async if test_case else load_test_case_runs_async
+    )
+    test_runs = await load_history(
         org_name=org_name,
         project_name=project_name,
         suite_name=suite_name,
@@ -183,6 +305,8 @@ def get_suite_branch_test_runs_history(
         test_class=test_class,
         test_case=test_case,
         test_config=test_config,
+        columns=columns,
+        as_rows=True,
     )
     logger.info(
         "Found {} test {} runs for suite {}/{} on branch {} matching query",
@@ -193,7 +317,191 @@ def get_suite_branch_test_runs_history(
         branch,
     )
     # convert into return format (test run + suite run)
-    return combine_test_runs_with_suite_runs(test_runs, suite_runs)
+    return runs_history_response(test_runs, suite_runs, columns, normalized)
+
+
+class TestCaseKey(BaseModel):
+    """
+    Test case identity as in test-runs query (config is optional).
+    """
+
+    test_package: str
+    test_class: str
+    test_case: str
+    test_config: str | None = None
+
+
+class TestCasesHistoryQuery(BaseModel):
+    branch: str
+    tests: list[TestCaseKey]
+    depth: int = 32  # number of the latest suite runs
+
+
+class TestCaseHistoryInfo(BaseModel):
+    test: TestCaseKey
+    runs: list[TestCaseSuiteRunInfo]
+
+
+class TestCaseHistoryRefInfo(BaseModel):
+    test: TestCaseKey
+    runs: list[TestCaseRunRefInfo]
+
+
+class TestCasesHistoryWithSuiteRuns(BaseModel):
+    """
+    Normalized histories of test cases: suite runs are sent once in runs map (by run id).
+    """
+
+    runs: dict[int, TestSuiteRunInfo]
+    tests: list[TestCaseHistoryRefInfo]
+
+
+class TestCaseHistorySummaryInfo(BaseModel):
+    """
+    Summary of test case history, results has one character per run id of the summary:
+    P(ass), F(ail), S(kip) or _ (no run of the test).
+    Counts are counts of suite runs (not test runs): if a test has more runs in a suite run
+    (e.g. many configs when config is not given) only the worst result is counted.
+    """
+
+    test: TestCaseKey
+    test_group: str | None
+    num_pass: int
+    num_fail: int
+    num_skip: int
+    first_fail_run_id: int | None
+    last_fail_run_id: int | None
+    results: str
+
+
+class TestCasesHistorySummary(BaseModel):
+    run_ids: list[int]  # from the latest one
+    tests: list[TestCaseHistorySummaryInfo]
+
+
+MAX_HISTORY_TESTS = 1000
+
+
+def validate_history_query(query: TestCasesHistoryQuery):
+    if not query.tests:
+        raise_bad_request("Empty list of tests.")
+    if len(query.tests) > MAX_HISTORY_TESTS:
+        raise_bad_request(f"At most {MAX_HISTORY_TESTS} tests can be queried at once.")
+    if query.depth > 128 or query.depth < 1:
+        raise_bad_request("maximum depth allowed is 128, minimum is 1")
+
+
+@Timer(name="api-history-post-test-runs", logger=logger.info)
+@router.post(
+    "/orgs/{org_name}/projects/{project_name}/suites/{suite_name}/test-runs",
+    response_model_exclude_unset=True,
+)
+async def get_suite_branch_test_cases_history(
+    org_name: str,
+    project_name: str,
+    suite_name: str,
+    query: TestCasesHistoryQuery,
+    user_req_id: UserReqId = None,
+    fields: str | None = None,
+    exclude: str | None = None,
+    normalized: bool = False,
+    authz: str = Depends(req_read_perm),
+) -> list[TestCaseHistoryInfo] | TestCasesHistoryWithSuiteRuns:
+    """
+    Return history of many test cases at once in runs of given suite on given branch
+    (same as test-runs for each of them): suite runs are loaded once
+    and histories of the tests are read concurrently.
+    Histories are returned in the order of the tests in the query.
+    With normalized set suite runs are returned once as for failed-tests.
+    """
+    validate_history_query(query)
+    columns = get_projection_or_raise(fields, exclude)
+    await run_in_threadpool(validate_path, org_name, project_name, suite_name)
+    suite_runs = await get_suite_branch_runs_async(
+        org_name, project_name, suite_name, query.branch, query.depth
+    )
+    histories = await load_test_cases_history_async(
+        org_name=org_name,
+        project_name=project_name,
+        suite_name=suite_name,
+        branch=query.branch,
+        runs=[x.run_id for x in suite_runs],
+        test_cases=[
+            (t.test_package, t.test_class, t.test_case, t.test_config)
+            for t in query.tests
+        ],
+        columns=columns,
+        as_rows=True,
+    )
+    logger.info(
+        "Found {} runs of {} tests for suite {}/{} on branch {}",
+        sum(len(h) for h in histories),
+        len(query.tests),
+        project_name,
+        suite_name,
+        query.branch,
+    )
+    fields = case_run_info_fields(columns)
+    runs_data = None if normalized else suite_runs_data(suite_runs)
+    tests = [
+        {
+            "test": test.model_dump(exclude_unset=True),
+            "runs": case_runs_data(runs, fields, runs_data),
+        }
+        for test, runs in zip(query.tests, histories)
+    ]
+    if normalized:
+        return ORJSONResponse({"runs": suite_runs_data(suite_runs), "tests": tests})
+    return ORJSONResponse(tests)
+
+
+@Timer(name="api-history-post-test-runs-summary", logger=logger.info)
+@router.post(
+    "/orgs/{org_name}/projects/{project_name}/suites/{suite_name}/test-runs/summary"
+)
+async def get_suite_branch_test_cases_history_summary(
+    org_name: str,
+    project_name: str,
+    suite_name: str,
+    query: TestCasesHistoryQuery,
+    user_req_id: UserReqId = None,
+    authz: str = Depends(req_read_perm),
+) -> TestCasesHistorySummary:
+    """
+    Return summaries of histories of many test cases (same as POST test-runs) instead
+    of the test runs: counts of results, first and last failure and results vector
+    aligned to run ids of the suite runs checked. Only keys, results and test groups
+    of the test runs are read.
+    Results are counted once per suite run (the worst one if the test has more runs
+    in a suite run e.g. in many configs), not once per test run.
+    """
+    validate_history_query(query)
+    await run_in_threadpool(validate_path, org_name, project_name, suite_name)
+    suite_runs = await get_suite_branch_runs_async(
+        org_name, project_name, suite_name, query.branch, query.depth
+    )
+    run_ids = sorted((x.run_id for x in suite_runs), reverse=True)
+    histories = await load_test_cases_history_async(
+        org_name=org_name,
+        project_name=project_name,
+        suite_name=suite_name,
+        branch=query.branch,
+        runs=run_ids,
+        test_cases=[
+            (t.test_package, t.test_class, t.test_case, t.test_config)
+            for t in query.tests
+        ],
+        columns=projection_columns(fields=["test_group"]),
+        as_rows=True,
+    )
+    summaries = summarize_history(histories, run_ids)
+    return TestCasesHistorySummary(
+        run_ids=run_ids,
+        tests=[
+            TestCaseHistorySummaryInfo(test=test, **vars(summary))
+            for test, summary in zip(query.tests, summaries)
+        ],
+    )
 
 
 class TestCaseRunCheckResponse(BaseModel):
@@ -249,7 +557,7 @@ class TestCaseRunCheckResponse(BaseModel):
 @router.get(
     "/orgs/{org_name}/projects/{project_name}/suites/{suite_name}/test-run-check"
 )
-def get_test_run_check(
+async def get_test_run_check(
     org_name: str,
     project_name: str,
     suite_name: str,
@@ -262,7 +570,7 @@ def get_test_run_check(
     check_suite: str | None = None,
     check_branch: str | None = None,
     depth: int = 32,
-    user_req_id: str | None = None,
+    user_req_id: UserReqId = None,
     authz: str = Depends(req_read_perm),
 ) -> TestCaseRunCheckResponse:
     """
@@ -270,13 +578,13 @@ def get_test_run_check(
     If it is then a list of matching similar failures is also returned.
     We can assume here that provided test run is FAIL.
     """
-    validate_path(org_name, project_name, suite_name)
+    await run_in_threadpool(validate_path, org_name, project_name, suite_name)
     if check_suite and not check_branch:
         request_error("check_branch q param is required with check_suite set.")
     if depth > 128 or depth < 1:
         request_error("maximum depth allowed is 128, minimum is 0")
     # collect requested test case run information
-    test_runs = load_test_case_runs(
+    test_runs = await load_test_case_runs_async(
         org_name=org_name,
         project_name=project_name,
         suite_name=suite_name,
@@ -296,9 +604,86 @@ def get_test_run_check(
     failure_analysis = TestCaseRunFailureAnalyser(the_test)
     if check_branch:
         check_suite = check_suite or the_test.suite
-        failure_analysis.check_vs_upstream(check_suite, check_branch, depth=depth)
+        suite_runs = await get_suite_branch_runs_async(
+            org_name, project_name, check_suite, check_branch, depth
+        )
+        await failure_analysis.check_vs_upstream_async(
+            check_suite, check_branch, depth=depth, suite_runs=suite_runs
+        )
     else:
-        failure_analysis.check_regression(depth=depth)
+        suite_runs = await get_suite_branch_runs_async(
+            org_name, project_name, suite_name, branch, depth
+        )
+        await failure_analysis.check_regression_async(
+            depth=depth, suite_runs=suite_runs
+        )
     # and prepare response
     response = TestCaseRunCheckResponse.from_analyser_result(failure_analysis)
     return response
+
+
+class SuiteRunCheckResponse(BaseModel):
+    """
+    Response for the check of all failed tests of a suite run: same check result
+    as from test-run-check for every failure and the numbers of known and new failures.
+    """
+
+    suite_run: TestSuiteRunInfo
+    num_failures: int
+    num_known_failures: int
+    num_new_failures: int
+    tests: list[TestCaseRunCheckResponse]
+
+
+@Timer(name="api-history-get-suite-run-check", logger=logger.info)
+@router.get("/orgs/{org_name}/projects/{project_name}/suites/{suite_name}/run-check")
+async def get_suite_run_check(
+    org_name: str,
+    project_name: str,
+    suite_name: str,
+    branch: str,
+    run_id: int,
+    check_suite: str | None = None,
+    check_branch: str | None = None,
+    depth: int = 32,
+    authz: str = Depends(req_read_perm),
+) -> SuiteRunCheckResponse:
+    """
+    Return information if failed tests of given suite run are similar to known test failures
+    (same as test-run-check for each of them): suite runs to check and their failures
+    are loaded once for all the failed tests.
+    """
+    if check_suite and not check_branch:
+        raise_bad_request("check_branch q param is required with check_suite set.")
+    if depth > 128 or depth < 1:
+        raise_bad_request("maximum depth allowed is 128, minimum is 1")
+    await run_in_threadpool(validate_path, org_name, project_name, suite_name)
+    suite_run = await run_in_threadpool(
+        get_test_suite_run_or_raise,
+        org_name,
+        project_name,
+        suite_name,
+        branch,
+        run_id,
+        use_cache=False,
+    )
+    suite_runs = await get_suite_branch_runs_async(
+        org_name,
+        project_name,
+        (check_suite or suite_name) if check_branch else suite_name,
+        check_branch or branch,
+        depth,
+    )
+    analyser = SuiteRunFailureAnalyser(suite_run)
+    await analyser.check_async(
+        check_suite, check_branch, depth=depth, suite_runs=suite_runs
+    )
+    return SuiteRunCheckResponse(
+        suite_run=TestSuiteRunInfo(**model_to_dict(suite_run)),
+        num_failures=analyser.num_failures(),
+        num_known_failures=analyser.num_known_failures(),
+        num_new_failures=analyser.num_new_failures(),
+        tests=[
+            TestCaseRunCheckResponse.from_analyser_result(a) for a in analyser.analysers
+        ],
+    )
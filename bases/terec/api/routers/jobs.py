@@ -0,0 +1,198 @@
+import datetime
+import os
+import uuid
+
+from functools import lru_cache
+
+from fastapi import APIRouter, Depends, HTTPException
+from loguru import logger
+from pydantic import BaseModel
+
+from terec.api.auth import req_read_perm
+from terec.api.routers.results import TestCaseRunInfo, write_suite_run_tests
+from terec.api.routers.util import get_test_suite_run_or_raise, raise_not_found
+from terec.model.ingest import IngestCounts
+from terec.model.jobs import IngestJob, IngestJobChunk, job_progress
+from terec.model.util import model_to_dict
+from terec.work_queue import WorkQueueFull, create_work_queue
+
+router = APIRouter()
+
+INGEST_QUEUE_NAME = "terec-ingest"
+# tests are queued in chunks so that messages stay small (RabbitMQ limits their size)
+INGEST_JOB_CHUNK_SIZE = 1024
+INGEST_JOB_CHUNK_BYTES = 4 * 1024 * 1024
+# job without progress for this long is reported as failed (e.g. messages lost on restart)
+INGEST_JOB_TIMEOUT_SEC = float(os.getenv("TEREC_INGEST_JOB_TIMEOUT_SEC", "3600"))
+QUEUE_FULL_RETRY_AFTER_SEC = 30
+
+
+class IngestJobInfo(BaseModel):
+    job_id: uuid.UUID
+    org: str
+    project: str
+    suite: str
+    branch: str
+    run_id: int
+    status: str
+    rows_total: int
+    rows_written: int | None = None
+    rows_skipped: int | None = None
+    rows_failed: int | None = None
+    error: str | None = None
+    created_at: datetime.datetime | None = None
+    updated_at: datetime.datetime | None = None
+
+
+class IngestJobMessage(BaseModel):
+    job_id: uuid.UUID
+    chunk: int
+    org: str
+    project: str
+    suite: str
+    branch: str
+    run_id: int
+    tests: list[TestCaseRunInfo]
+
+
+@lru_cache(maxsize=1)
+def ingest_queue():
+    return create_work_queue(INGEST_QUEUE_NAME, process_ingest_job)
+
+
+def chunk_tests(
+    tests: list[TestCaseRunInfo],
+    max_rows: int = INGEST_JOB_CHUNK_SIZE,
+    max_bytes: int = INGEST_JOB_CHUNK_BYTES,
+) -> list[list[TestCaseRunInfo]]:
+    """
+    Splits tests into chunks of at most max_rows tests and max_bytes of json
+    (a single bigger test makes its own chunk).
+    """
+    chunks, chunk, size = [], [], 0
+    for test in tests:
+        test_size = len(test.model_dump_json(exclude_none=True))
+        if chunk and (len(chunk) >= max_rows or size + test_size > max_bytes):
+            chunks.append(chunk)
+            chunk, size = [], 0
+        chunk.append(test)
+        size += test_size
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def submit_ingest_job(
+    org_name: str,
+    prj_name: str,
+    suite_name: str,
+    branch: str,
+    run_id: int,
+    tests: list[TestCaseRunInfo],
+) -> IngestJob:
+    """
+    Registers import job and puts its chunks on the queue to be processed in the background.
+    Raises 503 if the queue does not accept them.
+    """
+    chunks = chunk_tests(tests)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    job = IngestJob.create(
+        job_id=uuid.uuid4(),
+        org=org_name,
+        project=prj_name,
+        suite=suite_name,
+        branch=branch,
+        run_id=run_id,
+        status=IngestJob.QUEUED,
+        rows_total=len(tests),
+        rows_written=0,
+        rows_skipped=0,
+        rows_failed=0,
+        num_chunks=len(chunks),
+        created_at=now,
+        updated_at=now,
+    )
+    for n, chunk in enumerate(chunks):
+        message = IngestJobMessage(
+            job_id=job.job_id,
+            chunk=n,
+            org=org_name,
+            project=prj_name,
+            suite=suite_name,
+            branch=branch,
+            run_id=run_id,
+            tests=chunk,
+        )
+        try:
+            ingest_queue().put(
+                message.model_dump_json(exclude_none=True).encode("utf-8")
+            )
+        except WorkQueueFull as e:
+            # chunks already queued are still written, the import can be retried
+            error = f"{e} Queued {n} of {len(chunks)} chunks."
+            job.update_progress(status=IngestJob.FAILED, error=error)
+            raise HTTPException(
+                status_code=503,
+                detail=f"Import queue is full, try again later. {error}",
+                headers={"Retry-After": str(QUEUE_FULL_RETRY_AFTER_SEC)},
+            )
+    return job
+
+
+def process_ingest_job(body: bytes) -> None:
+    """
+    Writes test case runs of a chunk of the job and stores the chunk result.
+    A failed chunk is counted as failed rows.
+    """
+    message = IngestJobMessage.model_validate_json(body)
+    job = IngestJob.objects(job_id=message.job_id).first()
+    if not job:
+        logger.warning("Ingest job {} not found, skipping.", message.job_id)
+        return
+    logger.info(
+        "Processing chunk {} of ingest job {} with {} tests",
+        message.chunk,
+        job.job_id,
+        len(message.tests),
+    )
+    counts, rows_failed, error = IngestCounts(), 0, None
+    try:
+        suite_run = get_test_suite_run_or_raise(
+            message.org, message.project, message.suite, message.branch, message.run_id
+        )
+        counts = write_suite_run_tests(suite_run, message.tests)
+    except HTTPException as e:
+        rows_failed, error = len(message.tests), e.detail
+    except Exception as e:
+        logger.warning("Ingest job {} chunk failed: {}", job.job_id, e)
+        rows_failed, error = len(message.tests), str(e)
+    IngestJobChunk.create(
+        job_id=job.job_id,
+        chunk=message.chunk,
+        rows_written=counts.written,
+        rows_skipped=counts.skipped,
+        rows_failed=rows_failed,
+        error=error,
+        updated_at=datetime.datetime.now(datetime.timezone.utc),
+    )
+    logger.info(
+        "Ingest job {} chunk {} finished with {} rows written, {} skipped and {} failed",
+        job.job_id,
+        message.chunk,
+        counts.written,
+        counts.skipped,
+        rows_failed,
+    )
+
+
+@router.get("/orgs/{org_name}/jobs/{job_id}")
+def get_ingest_job(
+    org_name: str, job_id: uuid.UUID, authz: str = Depends(req_read_perm)
+) -> IngestJobInfo:
+    job = IngestJob.objects(job_id=job_id).first()
+    if not job or job.org != org_name:
+        raise_not_found(f"Job not found: {org_name}/{job_id}.")
+    chunks = list(IngestJobChunk.objects(job_id=job_id))
+    now = datetime.datetime.now(datetime.timezone.utc)
+    progress = job_progress(job, chunks, INGEST_JOB_TIMEOUT_SEC, now)
+    return IngestJobInfo(**(model_to_dict(job) | progress))
@@ -0,0 +1,152 @@
+import asyncio
+import zlib
+
+from xml.etree.ElementTree import ParseError
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from loguru import logger
+
+from terec.api.auth import req_write_perm
+from terec.api.routers.results import (
+    NDJSON_CHUNK_SIZE,
+    TestSuiteRunInfo,
+    ingest_counts_response,
+    save_suite_run,
+    write_suite_run_tests_async,
+)
+from terec.api.routers.util import get_org_project_or_raise, raise_bad_request
+from terec.converters.junit.converter import JunitXmlStreamParser
+from terec.model.ingest import IngestCounts
+
+router = APIRouter()
+
+JUNIT_CHUNK_SIZE = NDJSON_CHUNK_SIZE
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+async def iter_xml_body(stream):
+    """
+    Yields chunks of uploaded xml file, gzipped files (e.g. report.xml.gz uploaded as is)
+    are decompressed on the fly.
+    """
+    head = b""
+    gunzip = None
+    async for data in stream:
+        if gunzip is None:
+            head += data
+            if len(head) < len(GZIP_MAGIC):
+                continue
+            data, head = head, b""
+            gunzip = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+            if not data.startswith(GZIP_MAGIC):
+                gunzip = False
+        try:
+            yield gunzip.decompress(data) if gunzip else data
+        except zlib.error as e:
+            raise_bad_request(f"Invalid gzip file: {e}")
+    if head:
+        yield head
+    elif gunzip:
+        yield gunzip.flush()
+        if not gunzip.eof:
+            raise_bad_request("Invalid gzip file: unexpected end of data")
+
+
+async def iter_junit_items(stream):
+    """
+    Yields suites and test cases parsed from the uploaded JUnit XML as it arrives.
+    """
+    parser = JunitXmlStreamParser()
+    try:
+        async for data in iter_xml_body(stream):
+            for item in parser.feed(data):
+                yield item
+        for item in parser.close():
+            yield item
+    except ParseError as e:
+        raise_bad_request(f"Invalid JUnit XML: {e}")
+
+
+@router.post(
+    "/orgs/{org_name}/projects/{prj_name}/branches/{branch}/runs/{run_id}/junit"
+)
+async def import_junit_xml(
+    org_name: str,
+    prj_name: str,
+    branch: str,
+    run_id: int,
+    request: Request,
+    suite: str | None = None,
+    authz: str = Depends(req_write_perm),
+) -> dict:
+    """
+    Imports raw JUnit XML report (optionally gzipped) as runs of its test suites.
+    Suite runs are created as <testsuite> elements are found (all of them go to the given
+    suite if it is set) and test cases are written in chunks while the upload is still read,
+    so memory usage does not depend on the size of the report.
+    """
+    await run_in_threadpool(get_org_project_or_raise, org_name, prj_name)
+    logger.info(
+        "importing junit xml for {}/{}/{}/{}", org_name, prj_name, branch, run_id
+    )
+    suite_runs = {}  # suite name -> TestSuiteRun
+    run_suites = {}  # suite name in xml -> suite name
+    test_counts = {}
+    current, chunk = None, []
+    pending_write = None
+
+    async def write_chunk(suite_name: str, tests: list) -> tuple[str, IngestCounts]:
+        return suite_name, await write_suite_run_tests_async(
+            suite_runs[suite_name], tests
+        )
+
+    async def wait_for_pending_write():
+        nonlocal pending_write
+        if pending_write:
+            suite_name, count = await pending_write
+            test_counts[suite_name] = (
+                test_counts.get(suite_name, IngestCounts()) + count
+            )
+            pending_write = None
+
+    async def flush():
+        # writing a chunk overlaps with parsing of the next one
+        nonlocal chunk, pending_write
+        if chunk:
+            await wait_for_pending_write()
+            pending_write = asyncio.ensure_future(write_chunk(current, chunk))
+            chunk = []
+
+    try:
+        async for item in iter_junit_items(request.stream()):
+            if isinstance(item, TestSuiteRunInfo):
+                suite_name = suite or item.suite
+                run_suites[item.suite] = suite_name
+                if suite_name not in suite_runs:
+                    item.org, item.project, item.suite = org_name, prj_name, suite_name
+                    item.branch, item.run_id = branch, run_id
+                    # counts are maintained from imported test cases
+                    item.pass_count = item.fail_count = None
+                    item.skip_count = item.total_count = None
+                    suite_runs[suite_name] = await run_in_threadpool(
+                        save_suite_run, org_name, item
+                    )
+                continue
+            suite_name = run_suites[item.test_suite]
+            if suite_name != current:
+                await flush()
+                current = suite_name
+            chunk.append(item)
+            if len(chunk) >= JUNIT_CHUNK_SIZE:
+                await flush()
+        await flush()
+    finally:
+        await wait_for_pending_write()
+    # report without test cases is not accepted
+    if not test_counts:
+        raise_bad_request("No test cases found in the JUnit XML.")
+    counts = sum(test_counts.values(), IngestCounts())
+    return ingest_counts_response(counts) | {
+        "suites": {name: c.total for name, c in test_counts.items()}
+    }
@@ -1,18 +1,39 @@
+import datetime
+
 from fastapi import APIRouter, Depends
 from loguru import logger
 from pydantic import BaseModel, field_validator
 
 from terec.api.auth import req_admin_perm, req_read_perm
+from terec.api.cache import metadata_cache
 from terec.api.routers.util import (
     get_org_or_raise,
+    get_org_project_or_raise,
+    raise_bad_request,
     raise_if_org_exists,
     is_valid_terec_name,
 )
+from terec.database import current_concurrency
+from terec.model.blobs import BLOB_FIELDS
+from terec.model.failures import (
+    backfill_failed_test_case_runs,
+    backfill_test_case_history,
+    load_failed_tests_for_suite_runs,
+    load_suite_branch_runs,
+)
 from terec.model.projects import Project, Org, generate_org_tokens, OrgToken
+from terec.model.results import TestSuite, TestSuiteRun
+from terec.model.text_compression import train_project_dictionary
 from terec.model.util import model_to_dict
 
 router = APIRouter()
 
+# number of latest runs of each suite sampled for failures to train compression dictionary
+COMPRESSION_SAMPLE_RUNS = 32
+COMPRESSION_MAX_SAMPLES = 5000
+# number of suite runs read at once when backfilling failures or test case history
+BACKFILL_RUNS_CHUNK = 32
+
 
 class OrgInfo(BaseModel):
     name: str
@@ -52,6 +73,22 @@ class ProjectInfo(BaseModel):
         return v
 
 
+class CompressionDictInfo(BaseModel):
+    org: str
+    project: str
+    dict_id: int
+    samples: int
+    tstamp: datetime.datetime
+
+
+@router.get("/database/concurrency")
+def get_database_concurrency() -> dict[str, int]:
+    """
+    Returns number of concurrent requests currently used for bulk writes and reads.
+    """
+    return current_concurrency()
+
+
 @router.get("/orgs")
 def get_all_orgs() -> list[OrgInfo]:
     orgs = Org.objects()
@@ -64,6 +101,7 @@ def create_org(org_info: OrgInfo) -> dict:
     raise_if_org_exists(org_info.name)
     params = org_info.model_dump(exclude_none=True)
     org = Org.create(**params)
+    metadata_cache.invalidate(("org", org.name))
     org_tokens = {}
     if org.private:
         logger.info("Generating tokens for private org: {}", org.name)
@@ -112,4 +150,90 @@ def create_project(
         project_info.org == org_name
     ), "org name in body does not match the one in path"
     params = project_info.model_dump(exclude_none=True)
-    return Project.create(**params)
+    project = Project.create(**params)
+    metadata_cache.invalidate(("project", project.org, project.name))
+    return project
+
+
+@router.post("/orgs/{org_name}/projects/{prj_name}/compression-dict", status_code=201)
+def train_compression_dict(
+    org_name: str,
+    prj_name: str,
+    authz: str = Depends(req_admin_perm),
+) -> CompressionDictInfo:
+    """
+    Trains new compression dictionary of the project on texts (stacktraces, output)
+    of failures from the latest runs of its suites.
+    New blobs are compressed with it, the ones already stored keep their dictionary.
+    """
+    get_org_project_or_raise(org_name, prj_name)
+    samples = []
+    for suite in TestSuite.objects(org=org_name, project=prj_name):
+        runs = load_suite_branch_runs(
+            org_name, prj_name, suite.suite, limit=COMPRESSION_SAMPLE_RUNS
+        )
+        for test in load_failed_tests_for_suite_runs(list(runs)):
+            samples += [getattr(test, f) for f in BLOB_FIELDS if getattr(test, f)]
+        if len(samples) >= COMPRESSION_MAX_SAMPLES:
+            break
+    try:
+        entry = train_project_dictionary(
+            org_name, prj_name, samples[:COMPRESSION_MAX_SAMPLES]
+        )
+    except ValueError as e:
+        raise_bad_request(str(e))
+    return CompressionDictInfo(**model_to_dict(entry))
+
+
+def backfill_project_runs(org_name: str, prj_name: str, backfill, what: str) -> dict:
+    """
+    Runs backfill function on all suite runs of the project (in chunks).
+    """
+    get_org_project_or_raise(org_name, prj_name)
+    num_runs, num_rows = 0, 0
+    for suite in TestSuite.objects(org=org_name, project=prj_name):
+        runs = list(
+            TestSuiteRun.objects(org=org_name, project=prj_name, suite=suite.suite)
+        )
+        for i in range(0, len(runs), BACKFILL_RUNS_CHUNK):
+            num_rows += backfill(runs[i : i + BACKFILL_RUNS_CHUNK])
+        num_runs += len(runs)
+        logger.info(
+            "backfilled {} of {} runs of {}/{}/{}",
+            what,
+            len(runs),
+            org_name,
+            prj_name,
+            suite.suite,
+        )
+    return {"runs_count": num_runs, f"{what}_count": num_rows}
+
+
+@router.post("/orgs/{org_name}/projects/{prj_name}/failures/backfill")
+def backfill_failures(
+    org_name: str,
+    prj_name: str,
+    authz: str = Depends(req_admin_perm),
+) -> dict:
+    """
+    Copies failed test case runs of all suite runs of the project into the failures table.
+    It is needed once for data imported before the table existed, safe to repeat.
+    """
+    return backfill_project_runs(
+        org_name, prj_name, backfill_failed_test_case_runs, "failures"
+    )
+
+
+@router.post("/orgs/{org_name}/projects/{prj_name}/history/backfill")
+def backfill_history(
+    org_name: str,
+    prj_name: str,
+    authz: str = Depends(req_admin_perm),
+) -> dict:
+    """
+    Copies test case runs of all suite runs of the project into the test case history table.
+    It is needed once for data imported before the table existed, safe to repeat.
+    """
+    return backfill_project_runs(
+        org_name, prj_name, backfill_test_case_history, "test_runs"
+    )
@@ -1,30 +1,54 @@
+import asyncio
+import base64
+import binascii
 import datetime
-import more_itertools
 
-from codetiming import Timer
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Literal
+
+from cassandra import InvalidRequest
+from cassandra.protocol import ProtocolException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from loguru import logger
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, ValidationError, field_validator
 
 from terec.api.auth import req_read_perm, req_write_perm
+from terec.api.cache import invalidate_suite_runs, metadata_cache
 from terec.api.routers.util import (
     get_org_or_raise,
     get_org_project_or_raise,
     get_test_suite_or_raise,
     get_test_suite_run_or_raise,
+    iter_ndjson_lines,
     raise_bad_request,
 )
+from terec.model.aggregates import recount_suite_run_aggregates
+from terec.model.failures import (
+    iter_suite_run_tests_async,
+    load_suite_run_tests,
+    projection_columns,
+)
+from terec.model.ingest import (
+    IngestCounts,
+    write_test_case_runs,
+    write_test_case_runs_async,
+)
 from terec.model.results import (
     TestSuite,
     TestSuiteRun,
     TestCaseRunStatus,
     TestSuiteRunStatus,
-    TestCaseRun,
 )
 from terec.model.util import model_to_dict
 
 router = APIRouter()
 
+MAX_PAGE_SIZE = 10000
+# rows read from the database at once when streaming test case runs
+STREAM_PAGE_SIZE = 1000
+NEXT_PAGE_TOKEN_HEADER = "X-Next-Page-Token"
+
 
 class TestSuiteInfo(BaseModel):
     __test__ = False
@@ -49,6 +73,7 @@ class TestSuiteRunInfo(BaseModel):
     skip_count: int | None = None
     total_count: int | None = None
     duration_sec: int | None = None
+    tests_duration_ms: int | None = None
     status: TestSuiteRunStatus
     ignore: bool | None = False
     ignore_details: str | None = None
@@ -80,6 +105,38 @@ class TestCaseRunInfo(BaseModel):
         return f"{self.test_package}::{self.test_suite}::{self.test_case}::{self.test_config}"
 
 
+def query_list(value: str | None) -> list[str] | None:
+    """
+    Splits comma separated query parameter value (None if not set).
+    """
+    if value is None:
+        return None
+    return [x.strip() for x in value.split(",") if x.strip()]
+
+
+def get_projection_or_raise(
+    fields: str | None, exclude: str | None
+) -> tuple[str, ...] | None:
+    """
+    Returns test case run columns to read for fields / exclude query parameters.
+    """
+    try:
+        return projection_columns(query_list(fields), query_list(exclude))
+    except ValueError as e:
+        raise_bad_request(str(e))
+
+
+def case_run_info(test, columns: tuple[str, ...] | None = None) -> TestCaseRunInfo:
+    """
+    Builds TestCaseRunInfo from test case run with only given columns set
+    (so that others are not sent when response excludes unset fields).
+    """
+    data = model_to_dict(test)
+    if columns:
+        data = {k: v for k, v in data.items() if k in columns}
+    return TestCaseRunInfo(**data)
+
+
 @router.get("/orgs/{org_name}/suites")
 def get_org_suites(
     org_name: str, authz: str = Depends(req_read_perm)
@@ -117,7 +174,9 @@ def create_suite(
     body.org = body.org or org.name
     assert body.org == org_name, "org name in body does not match the one in path"
     params = body.model_dump(exclude_none=True)
-    return TestSuite.create(**params)
+    suite = TestSuite.create(**params)
+    metadata_cache.invalidate(("suite", suite.org, suite.project, suite.suite))
+    return suite
 
 
 @router.post("/orgs/{org_name}/runs")
@@ -129,12 +188,21 @@ def create_suite_run(
     body.org = body.org or org.name
     if body.org != org_name:
         raise_bad_request("org name in body does not match the one in path")
+    save_suite_run(org_name, body)
+
+
+def save_suite_run(org_name: str, body: TestSuiteRunInfo) -> TestSuiteRun:
+    """
+    Creates or updates suite run in existing project, creating its suite if needed.
+    """
     # validate project
     get_org_project_or_raise(org_name, body.project)
-    # create or update suite
-    suite_columns = {"org", "project", "suite"}
-    suite_params = body.model_dump(include=suite_columns, exclude_none=True)
-    TestSuite.create(**suite_params)
+    # create suite if not known yet (upsert of existing suite would not change it)
+    suite_key = ("suite", org_name, body.project, body.suite)
+    if not metadata_cache.get(suite_key):
+        suite_columns = {"org", "project", "suite"}
+        suite_params = body.model_dump(include=suite_columns, exclude_none=True)
+        metadata_cache.put(suite_key, TestSuite.create(**suite_params))
     # create run
     run_params = body.model_dump(exclude_none=True)
     if "status" in run_params:
@@ -145,36 +213,188 @@ def create_suite_run(
         raise_bad_request(
             f"branch name {run_params['branch']} includes prohibited char: /"
         )
-    TestSuiteRun.create(**run_params)
+    suite_run = TestSuiteRun.create(**run_params)
+    metadata_cache.invalidate(
+        ("run", org_name, body.project, body.suite, body.branch, body.run_id)
+    )
+    invalidate_suite_runs(org_name, body.project, body.suite, body.branch)
+    return suite_run
+
+
+def write_suite_run_tests(
+    suite_run: TestSuiteRun, tests: list[TestCaseRunInfo]
+) -> IngestCounts:
+    """
+    Writes test case runs of the suite run (updating its aggregates)
+    and drops cached recent runs of its suite, so that they are read with new counts.
+    """
+    try:
+        return write_test_case_runs(suite_run, tests)
+    finally:
+        invalidate_suite_runs(
+            suite_run.org, suite_run.project, suite_run.suite, suite_run.branch
+        )
+
+
+async def write_suite_run_tests_async(
+    suite_run: TestSuiteRun, tests: list[TestCaseRunInfo]
+) -> IngestCounts:
+    """
+    Asyncio version of write_suite_run_tests().
+    """
+    try:
+        return await write_test_case_runs_async(suite_run, tests)
+    finally:
+        invalidate_suite_runs(
+            suite_run.org, suite_run.project, suite_run.suite, suite_run.branch
+        )
+
+
+class SuiteRunWithTests(BaseModel):
+    run: TestSuiteRunInfo
+    tests: list[TestCaseRunInfo] = []
+
+
+class SuiteRunImportResult(BaseModel):
+    line: int
+    suite: str | None = None
+    branch: str | None = None
+    run_id: int | None = None
+    status: Literal["OK", "FAILED"]
+    test_count: int = 0
+    skipped_count: int = 0
+    error: str | None = None
+
+
+BULK_IMPORT_PARALLEL_RUNS = 8
+
+
+def import_suite_run_with_tests(org_name: str, body: SuiteRunWithTests) -> IngestCounts:
+    """
+    Creates or updates suite run and writes its test results.
+    Returns numbers of test results written and skipped.
+    """
+    body.run.org = body.run.org or org_name
+    if body.run.org != org_name:
+        raise_bad_request("org name in body does not match the one in path")
+    suite_run = save_suite_run(org_name, body.run)
+    if not body.tests:
+        return IngestCounts()
+    return write_suite_run_tests(suite_run, body.tests)
+
+
+@router.post("/orgs/{org_name}/runs/bulk")
+async def add_suite_runs_bulk(
+    org_name: str,
+    request: Request,
+    authz: str = Depends(req_write_perm),
+) -> dict:
+    """
+    Bulk import (e.g. backfill) of many suite runs with their test results.
+    Body is newline-delimited json, one suite run with its tests per line.
+    Runs are imported in parallel as they arrive and each of them succeeds or fails
+    on its own: response reports the result of every line.
+    """
+    await run_in_threadpool(get_org_or_raise, org_name)
+    # limits number of runs being imported and so the memory used
+    slots = asyncio.Semaphore(BULK_IMPORT_PARALLEL_RUNS)
+
+    async def import_run(line_num: int, body: SuiteRunWithTests):
+        result = SuiteRunImportResult(
+            line=line_num,
+            suite=body.run.suite,
+            branch=body.run.branch,
+            run_id=body.run.run_id,
+            status="OK",
+        )
+        try:
+            counts = await run_in_threadpool(
+                import_suite_run_with_tests, org_name, body
+            )
+            result.test_count = counts.total
+            result.skipped_count = counts.skipped
+        except HTTPException as e:
+            result.status, result.error = "FAILED", e.detail
+        except Exception as e:
+            logger.warning("Import of suite run failed: {}", e)
+            result.status, result.error = "FAILED", str(e)
+        finally:
+            slots.release()
+        return result
+
+    results, imports = [], []
+    try:
+        line_num = 0
+        async for line in iter_ndjson_lines(request.stream()):
+            line_num += 1
+            try:
+                body = SuiteRunWithTests.model_validate_json(line)
+            except ValidationError as e:
+                results.append(
+                    SuiteRunImportResult(line=line_num, status="FAILED", error=str(e))
+                )
+                continue
+            await slots.acquire()
+            imports.append(asyncio.ensure_future(import_run(line_num, body)))
+    finally:
+        results += await asyncio.gather(*imports)
+    # empty stream is not accepted
+    if not results:
+        raise_bad_request("Empty list of suite runs to be imported.")
+    results.sort(key=lambda r: r.line)
+    return {
+        "runs_imported": sum(1 for r in results if r.status == "OK"),
+        "runs_failed": sum(1 for r in results if r.status == "FAILED"),
+        "test_count": sum(r.test_count for r in results),
+        "skipped_count": sum(r.skipped_count for r in results),
+        "runs": [r.model_dump(exclude_none=True) for r in results],
+    }
+
+
+def get_suite_run_for_import(
+    org_name: str, prj_name: str, suite_name: str, branch: str, run_id: int
+) -> TestSuiteRun:
+    get_org_or_raise(org_name)
+    get_org_project_or_raise(org_name, prj_name)
+    get_test_suite_or_raise(org_name, prj_name, suite_name)
+    return get_test_suite_run_or_raise(org_name, prj_name, suite_name, branch, run_id)
+
+
+def ingest_counts_response(counts: IngestCounts) -> dict:
+    return {
+        "test_count": counts.total,
+        "written_count": counts.written,
+        "skipped_count": counts.skipped,
+    }
 
 
-# TODO: maybe add something like "N test results added or updated" to the result?
 @router.post(
     "/orgs/{org_name}/projects/{prj_name}/suites/{suite_name}/branches/{branch}/runs/{run_id}/tests"
 )
-def add_suite_run_test_results(
+async def add_suite_run_test_results(
     org_name: str,
     prj_name: str,
     suite_name: str,
     branch: str,
     run_id: int,
     body: list[TestCaseRunInfo],
+    response: Response,
+    mode: Literal["sync", "async"] = "sync",
     authz: str = Depends(req_write_perm),
 ) -> dict:
-    from cassandra.concurrent import execute_concurrent_with_args
-    from cassandra.cqlengine.connection import get_session
-
+    """
+    Imports test case runs into existing suite run.
+    In the async mode results are queued and written in the background:
+    response contains the job id that can be used to check the import status.
+    """
     # empty list is not accepted
     if not body:
         raise HTTPException(
             status_code=400, detail="Empty list of test results to be imported."
         )
     # validate org/project/suite exists
-    get_org_or_raise(org_name)
-    get_org_project_or_raise(org_name, prj_name)
-    get_test_suite_or_raise(org_name, prj_name, suite_name)
-    suite_run = get_test_suite_run_or_raise(
-        org_name, prj_name, suite_name, branch, run_id
+    suite_run = await run_in_threadpool(
+        get_suite_run_for_import, org_name, prj_name, suite_name, branch, run_id
     )
     # add test cases
     logger.info(
@@ -186,88 +406,108 @@ def add_suite_run_test_results(
         branch,
         run_id,
     )
-    now = datetime.datetime.now()
-
-    cols = [
-        "org",
-        "project",
-        "suite",
-        "branch",
-        "run_id",
-        "test_package",
-        "test_suite",
-        "test_case",
-        "test_config",
-        "result",
-        "test_group",
-        "tstamp",
-        "duration_ms",
-        "stdout",
-        "stderr",
-        "error_stacktrace",
-        "error_details",
-        "skip_details",
-    ]
-    num_cols = len(cols)
-    insert_cql = (
-        f"INSERT INTO {TestCaseRun.column_family_name(include_keyspace=True)} "
-        f"({', '.join(cols)})"
-        f"VALUES({','.join('?' * num_cols)})"
-        f"USING TIMESTAMP ?"
-    )
-    session = get_session()
-    p_stmt = session.prepare(insert_cql)
-
-    def limit_text_field(text: str) -> str:
-        if text is None:
-            return None
-        return text[:16384] if len(text) > 16384 else text
-
-    concurrency = 32
-    for chunk in more_itertools.sliced(body, 2 * concurrency):
-        params = []
-        for test in chunk:
-            timestamp = test.tstamp or suite_run.timestamp
-            test_data = (
-                org_name,
-                prj_name,
-                suite_name,
-                branch,
-                run_id,
-                test.test_package,
-                test.test_suite,
-                test.test_case,
-                test.test_config,
-                test.result.value,
-                test.test_group,
-                timestamp,
-                test.duration_ms,
-                limit_text_field(test.stdout),
-                limit_text_field(test.stderr),
-                limit_text_field(test.error_stacktrace),
-                limit_text_field(test.error_details),
-                limit_text_field(test.skip_details),
-            )
-            assert len(test_data) == num_cols
-            params.append(test_data)
-        with Timer(
-            logger=logger.debug,
-            initial_text=f"Inserting chunk of {len(params)} test case runs",
-            text="Elapsed time for inserting chunk: {milliseconds:.0f} ms",
-        ):
-            execute_concurrent_with_args(
-                session, p_stmt, params, concurrency=concurrency
-            )
+    if mode == "async":
+        from terec.api.routers.jobs import submit_ingest_job
 
-    # log information about import
-    test_results_count = len(body)
-    return {
-        "test_count": test_results_count,
-    }
+        job = await run_in_threadpool(
+            submit_ingest_job, org_name, prj_name, suite_name, branch, run_id, body
+        )
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {
+            "test_count": job.rows_total,
+            "job_id": str(job.job_id),
+            "status": job.status,
+        }
+    counts = await write_suite_run_tests_async(suite_run, body)
+    return ingest_counts_response(counts)
+
+
+NDJSON_CHUNK_SIZE = 512
+
+
+@router.post(
+    "/orgs/{org_name}/projects/{prj_name}/suites/{suite_name}/branches/{branch}/runs/{run_id}/tests/ndjson"
+)
+async def add_suite_run_test_results_ndjson(
+    org_name: str,
+    prj_name: str,
+    suite_name: str,
+    branch: str,
+    run_id: int,
+    request: Request,
+    authz: str = Depends(req_write_perm),
+) -> dict:
+    """
+    Streaming variant of test results import: body is newline-delimited json,
+    one test case run info per line. Lines are validated and written in chunks
+    as they arrive so memory usage does not depend on the size of the upload.
+    Writing a chunk overlaps with parsing of the next one.
+    """
+    suite_run = await run_in_threadpool(
+        get_suite_run_for_import, org_name, prj_name, suite_name, branch, run_id
+    )
+    logger.info(
+        "importing ndjson stream of test case results for {}/{}/{}/{}/{}",
+        org_name,
+        prj_name,
+        suite_name,
+        branch,
+        run_id,
+    )
+    counts = IngestCounts()
+    pending_write = None
+    chunk = []
+    try:
+        line_num = 0
+        async for line in iter_ndjson_lines(request.stream()):
+            line_num += 1
+            try:
+                chunk.append(TestCaseRunInfo.model_validate_json(line))
+            except ValidationError as e:
+                raise_bad_request(f"Invalid test case run in line {line_num}: {e}")
+            if len(chunk) >= NDJSON_CHUNK_SIZE:
+                if pending_write:
+                    counts += await pending_write
+                pending_write = asyncio.ensure_future(
+                    write_suite_run_tests_async(suite_run, chunk)
+                )
+                chunk = []
+        if chunk:
+            counts += await write_suite_run_tests_async(suite_run, chunk)
+    finally:
+        if pending_write:
+            counts += await pending_write
+    # empty stream is not accepted
+    if not counts.total:
+        raise_bad_request("Empty list of test results to be imported.")
+    return ingest_counts_response(counts)
+
+
+def encode_page_token(paging_state: bytes | None) -> str | None:
+    return base64.urlsafe_b64encode(paging_state).decode() if paging_state else None
+
+
+def decode_page_token(page_token: str | None) -> bytes | None:
+    if not page_token:
+        return None
+    try:
+        return base64.b64decode(page_token.encode(), altchars=b"-_", validate=True)
+    except (binascii.Error, ValueError):
+        raise_bad_request("Invalid page token.")
+
+
+def validate_suite_run_path(
+    org_name: str, prj_name: str, suite_name: str, branch: str, run_id: int
+):
+    get_org_or_raise(org_name)
+    get_org_project_or_raise(org_name, prj_name)
+    get_test_suite_or_raise(org_name, prj_name, suite_name)
+    get_test_suite_run_or_raise(org_name, prj_name, suite_name, branch, run_id)
 
 
 @router.get(
-    "/orgs/{org_name}/projects/{prj_name}/suites/{suite_name}/branches/{branch}/runs/{run_id}/tests"
+    "/orgs/{org_name}/projects/{prj_name}/suites/{suite_name}/branches/{branch}/runs/{run_id}/tests",
+    response_model_exclude_unset=True,
 )
 def get_suite_run_tests(
     org_name: str,
@@ -275,30 +515,96 @@ def get_suite_run_tests(
     suite_name: str,
     branch: str,
     run_id: int,
+    response: Response,
     result: TestCaseRunStatus | None = None,
+    page_size: int | None = None,
+    page_token: str | None = None,
+    fields: str | None = None,
+    exclude: str | None = None,
     authz: str = Depends(req_read_perm),
 ) -> list[TestCaseRunInfo]:
-    # validate parameters
-    get_org_or_raise(org_name)
-    get_org_project_or_raise(org_name, prj_name)
-    get_test_suite_or_raise(org_name, prj_name, suite_name)
-    get_test_suite_run_or_raise(org_name, prj_name, suite_name, branch, run_id)
+    """
+    Returns test case runs of the suite run, optionally only the ones with given result.
+    Comma separated fields (or exclude) limit test fields read and returned,
+    test keys and result are always returned.
+    With page_size set the results are paged: token of the next page is returned
+    in X-Next-Page-Token header (no header on the last page) and should be sent back
+    as page_token. A page can have less than page_size tests when filtering by result.
+    """
+    if page_size is not None and not 0 < page_size <= MAX_PAGE_SIZE:
+        raise_bad_request(f"page_size should be between 1 and {MAX_PAGE_SIZE}.")
+    if page_token and not page_size:
+        raise_bad_request("page_token requires page_size.")
+    paging_state = decode_page_token(page_token)
+    columns = get_projection_or_raise(fields, exclude)
+    validate_suite_run_path(org_name, prj_name, suite_name, branch, run_id)
     # collect results
-    query_params = {
-        "org": org_name,
-        "project": prj_name,
-        "suite": suite_name,
-        "branch": branch,
-        "run_id": run_id,
-    }
-    if result:
-        query_params["result"] = result.upper()
-    db_data = TestCaseRun.objects(**query_params).all()
+    try:
+        db_data, next_state = load_suite_run_tests(
+            org_name,
+            prj_name,
+            suite_name,
+            branch,
+            run_id,
+            result=result.upper() if result else None,
+            page_size=page_size,
+            paging_state=paging_state,
+            columns=columns,
+        )
+    except (InvalidRequest, ProtocolException):
+        # server rejects paging state that does not match the query
+        raise_bad_request("Invalid page token.")
+    if next_state:
+        response.headers[NEXT_PAGE_TOKEN_HEADER] = encode_page_token(next_state)
     # build response
-    resp = [TestCaseRunInfo(**model_to_dict(x)) for x in db_data]
+    resp = [case_run_info(x, columns) for x in db_data]
     return resp
 
 
+@router.get(
+    "/orgs/{org_name}/projects/{prj_name}/suites/{suite_name}/branches/{branch}/runs/{run_id}/tests/ndjson"
+)
+async def get_suite_run_tests_ndjson(
+    org_name: str,
+    prj_name: str,
+    suite_name: str,
+    branch: str,
+    run_id: int,
+    result: TestCaseRunStatus | None = None,
+    fields: str | None = None,
+    exclude: str | None = None,
+    authz: str = Depends(req_read_perm),
+) -> StreamingResponse:
+    """
+    Streaming variant of the suite run tests listing: newline-delimited json
+    (one TestCaseRunInfo per line) sent as pages are read from the database,
+    so the whole run is never kept in memory.
+    """
+    columns = get_projection_or_raise(fields, exclude)
+    await run_in_threadpool(
+        validate_suite_run_path, org_name, prj_name, suite_name, branch, run_id
+    )
+    tests_pages = iter_suite_run_tests_async(
+        org_name,
+        prj_name,
+        suite_name,
+        branch,
+        run_id,
+        result=result.upper() if result else None,
+        page_size=STREAM_PAGE_SIZE,
+        columns=columns,
+    )
+
+    async def ndjson_lines():
+        async for tests in tests_pages:
+            yield "".join(
+                case_run_info(x, columns).model_dump_json(exclude_unset=True) + "\n"
+                for x in tests
+            )
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+
 @router.get(
     "/orgs/{org_name}/projects/{prj_name}/suites/{suite_name}/branches/{branch}/runs/{run_id}/"
 )
@@ -315,7 +621,32 @@ def get_suite_run_info(
     get_org_project_or_raise(org_name, prj_name)
     get_test_suite_or_raise(org_name, prj_name, suite_name)
     suite_run = get_test_suite_run_or_raise(
-        org_name, prj_name, suite_name, branch, run_id
+        org_name, prj_name, suite_name, branch, run_id, use_cache=False
     )
     # build response
     return TestSuiteRunInfo(**model_to_dict(suite_run))
+
+
+@router.post(
+    "/orgs/{org_name}/projects/{prj_name}/suites/{suite_name}/branches/{branch}/runs/{run_id}/recount"
+)
+def recount_suite_run_results(
+    org_name: str,
+    prj_name: str,
+    suite_name: str,
+    branch: str,
+    run_id: int,
+    authz: str = Depends(req_write_perm),
+) -> TestSuiteRunInfo:
+    """
+    Recomputes pass/fail/skip/total counts and tests duration of the suite run
+    from its stored test results, e.g. after a failed or overlapping upload
+    (see terec.model.aggregates). Returns the updated suite run info.
+    """
+    suite_run = get_suite_run_for_import(org_name, prj_name, suite_name, branch, run_id)
+    recount_suite_run_aggregates(suite_run)
+    invalidate_suite_runs(org_name, prj_name, suite_name, branch)
+    suite_run = get_test_suite_run_or_raise(
+        org_name, prj_name, suite_name, branch, run_id, use_cache=False
+    )
+    return TestSuiteRunInfo(**model_to_dict(suite_run))
@@ -1,5 +1,6 @@
 from fastapi import HTTPException
 
+from terec.api.cache import metadata_cache
 from terec.model.projects import Org, Project
 from terec.model.results import TestSuite, TestSuiteRun
 
@@ -17,7 +18,9 @@ def is_valid_terec_name(name: str) -> bool:
 
 def get_org_or_raise(org_name: str) -> Org:
     assert org_name
-    org = Org.objects(name=org_name)
+    org = metadata_cache.get_or_load(
+        ("org", org_name), lambda: Org.objects(name=org_name).first()
+    )
     if not org:
         raise HTTPException(status_code=404, detail=f"Org not found: {org_name}.")
     return org
@@ -33,7 +36,10 @@ def raise_if_org_exists(org_name: str):
 def get_org_project_or_raise(org_name: str, prj_name: str) -> Project:
     assert org_name
     assert prj_name
-    prj = Project.objects(org=org_name, name=prj_name)
+    prj = metadata_cache.get_or_load(
+        ("project", org_name, prj_name),
+        lambda: Project.objects(org=org_name, name=prj_name).first(),
+    )
     if not prj:
         raise HTTPException(
             status_code=404, detail=f"Project not found: {org_name}/{prj_name}."
@@ -45,7 +51,12 @@ def get_test_suite_or_raise(org_name: str, prj_name: str, suite_name: str) -> Te
     assert org_name
     assert prj_name
     assert suite_name
-    suite = TestSuite.objects(org=org_name, project=prj_name, suite=suite_name)
+    suite = metadata_cache.get_or_load(
+        ("suite", org_name, prj_name, suite_name),
+        lambda: TestSuite.objects(
+            org=org_name, project=prj_name, suite=suite_name
+        ).first(),
+    )
     if not suite:
         raise HTTPException(
             status_code=404,
@@ -55,13 +66,25 @@ def get_test_suite_or_raise(org_name: str, prj_name: str, suite_name: str) -> Te
 
 
 def get_test_suite_run_or_raise(
-    org_name: str, prj_name: str, suite_name: str, branch: str, run_id: int
+    org_name: str,
+    prj_name: str,
+    suite_name: str,
+    branch: str,
+    run_id: int,
+    use_cache: bool = True,
 ) -> TestSuiteRun:
+    """
+    Returns suite run, by default from metadata cache so it is good for existence checks
+    and suite run keys. Use use_cache=False to get current values of other fields.
+    """
     assert org_name
     assert prj_name
     assert suite_name
     assert branch
     assert run_id > 0
+    key = ("run", org_name, prj_name, suite_name, branch, run_id)
+    if use_cache and (suite_run := metadata_cache.get(key)):
+        return suite_run
     suites = TestSuiteRun.objects(
         org=org_name, project=prj_name, suite=suite_name, branch=branch, run_id=run_id
     ).all()
@@ -72,7 +95,7 @@ def get_test_suite_run_or_raise(
         raise_server_error(
             f"Too many suite runs found for {params_str}. Exactly one is expected"
         )
-
+    metadata_cache.put(key, suites[0])
     return suites[0]
 
 
@@ -86,3 +109,22 @@ def raise_bad_request(detail: str):
 
 def raise_server_error(detail: str):
     raise HTTPException(status_code=500, detail=detail)
+
+
+async def iter_ndjson_lines(stream):
+    """
+    Splits async stream of bytes chunks (e.g. request.stream()) into non-empty lines.
+    Only the incomplete last line is buffered between chunks.
+    """
+    buffer = bytearray()
+    async for data in stream:
+        start = 0
+        while (end := data.find(b"\n", start)) >= 0:
+            buffer += data[start:end]
+            if buffer.strip():
+                yield bytes(buffer)
+            buffer.clear()
+            start = end + 1
+        buffer += data[start:]
+    if buffer.strip():
+        yield bytes(buffer)
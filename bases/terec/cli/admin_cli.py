@@ -39,3 +39,33 @@ def setup_org_project_suite(
     if tokens:
         print("Tokens created for private org. [red]Make sure to save them![/red]")
         print(json.dumps(tokens))
+
+
+@admin_app.command(
+    "backfill-failures",
+    short_help="Copy failed tests of existing runs to failures table.",
+    help="Copy failed tests of all runs of the project to the failures table "
+    "(needed once for data imported by older versions).",
+)
+def backfill_failures(org: str, project: str):
+    admin_api = TerecAdminClient(TerecApiClient())
+    resp = admin_api.backfill_failures(org, project)
+    typer.echo(
+        f"Backfilled {resp['failures_count']} failures "
+        f"of {resp['runs_count']} runs of {org}/{project}."
+    )
+
+
+@admin_app.command(
+    "backfill-history",
+    short_help="Copy test runs of existing runs to test case history table.",
+    help="Copy test runs of all runs of the project to the test case history table "
+    "(needed once for data imported by older versions).",
+)
+def backfill_history(org: str, project: str):
+    admin_api = TerecAdminClient(TerecApiClient())
+    resp = admin_api.backfill_history(org, project)
+    typer.echo(
+        f"Backfilled {resp['test_runs_count']} test runs "
+        f"of {resp['runs_count']} runs of {org}/{project}."
+    )
@@ -1,4 +1,3 @@
-from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
@@ -6,6 +5,7 @@ import orjson
 import typer
 
 from terec.api.auth import api_key_headers
+from terec.api.compression import compressed_chunks, request_compression
 from terec.util import cli_params as params
 from terec.util.cli_util import env_terec_url
 
@@ -60,7 +60,7 @@ def convert(
 @junit_app.command("import")
 def import_junit(
     xml_file: Path = typer.Argument(
-        ..., exists=True, readable=True, help="Path to JUnit XML file"
+        ..., exists=True, readable=True, help="Path to JUnit XML file (can be gzipped)"
     ),
     org: str = params.OPT_ORG,
     project: str = params.OPT_PRJ,
@@ -71,9 +71,10 @@ def import_junit(
     ),
     api_key=params.OPT_API_KEY,
 ):
+    """
+    Upload JUnit XML file, it is streamed to the server and parsed there.
+    """
     import requests
-    from fastapi.encoders import jsonable_encoder
-    from terec.converters.junit.converter import JunitXmlConverter
 
     # check parameters
     assert org, "--org parameter or TEREC_ORG environment variable required"
@@ -86,69 +87,26 @@ def import_junit(
         typer.echo(f"Error: {e}", err=True)
         raise typer.Exit(code=1)
 
-    # Parse the XML file
-    xml_content = xml_file.read_text(encoding="utf-8")
-    converter = JunitXmlConverter(xml_content)
-
-    suite_runs = converter.get_suite_runs()
-    if not suite_runs:
-        typer.echo("Error: No test suites found in the XML file.", err=True)
-        raise typer.Exit(code=1)
-
-    for suite_run in suite_runs:
-        suite_run.org = org
-        suite_run.project = project
-        suite_run.suite = suite or suite_run.suite
-        suite_run.branch = branch
-        suite_run.run_id = run_id
-        if not suite_run.tstamp:
-            suite_run.tstamp = datetime.now()
-
-        suite_run_str = f"{suite_run.org}/{suite_run.project}/{suite_run.suite}/{suite_run.branch}/{suite_run.run_id}"
-
-        typer.echo(f"Importing suite run {suite_run_str}...")
-        try:
-            # Create the suite run via API
-            runs_url = f"{base_url}/tests/orgs/{suite_run.org}/runs"
-            data = jsonable_encoder(suite_run)
-            response = requests.post(
-                runs_url, json=data, timeout=180, headers=api_key_headers(api_key)
-            )
-            response.raise_for_status()
-        except requests.exceptions.RequestException as e:
-            typer.echo(f"Error creating suite run: {e}", err=True)
-            raise typer.Exit(code=1)
-
-        typer.echo(f"Suite run {suite_run_str }created successfully.")
-
-        # Gather and upload test case run info
-        test_cases = converter.get_test_cases_for_suite(suite_run.suite)
-        if not test_cases:
-            typer.echo(
-                f"Warning: No test cases found for suite {suite_run_str}.", err=True
-            )
-            continue
-
-        try:
-            # Use the correct endpoint
-            test_cases_url = (
-                f"{base_url}/tests/orgs/{suite_run.org}/projects/{suite_run.project}"
-                f"/suites/{suite_run.suite}/branches/{suite_run.branch}"
-                f"/runs/{suite_run.run_id}/tests"
-            )
-            typer.echo(
-                f"Uploading {len(test_cases)} test case(s) for suite '{suite_run_str}'..."
-            )
+    url = f"{base_url}/tests/orgs/{org}/projects/{project}/branches/{branch}/runs/{run_id}/junit"
+    # gzipped files are sent as they are, server recognizes them
+    encoding = None if xml_file.suffix == ".gz" else request_compression()
+    headers = {"Content-Type": "application/xml"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    typer.echo(f"Importing {xml_file} to {org}/{project}/{branch}/{run_id}...")
+    try:
+        with xml_file.open("rb") as f:
             response = requests.post(
-                test_cases_url,
-                json=jsonable_encoder(test_cases),
+                url,
+                params={"suite": suite} if suite else None,
+                data=compressed_chunks(f, encoding),
                 timeout=180,
-                headers=api_key_headers(api_key),
+                headers=api_key_headers(api_key) | headers,
             )
-            print(response.text)
-            response.raise_for_status()
-        except requests.exceptions.RequestException as e:
-            typer.echo(f"Error uploading test cases: {e}", err=True)
-            raise typer.Exit(code=1)
+        print(response.text)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        typer.echo(f"Error uploading JUnit XML: {e}", err=True)
+        raise typer.Exit(code=1)
 
-        typer.echo("Test cases uploaded successfully.")
+    typer.echo("Test cases uploaded successfully.")
@@ -1,4 +1,3 @@
-import asyncio
 import sys
 
 import typer
@@ -7,57 +6,66 @@ from codetiming import Timer
 
 from terec.util.cli_util import (
     get_terec_rest_api,
+    post_terec_rest_api,
     typer_table_config,
     ratio_str,
-    collect_terec_rest_api_calls,
     TerecCallContext,
 )
 from terec.util import cli_params as params
 
 tests_app = typer.Typer()
 
+# test fields rendered by the commands (test keys are always returned)
+TABLE_FIELDS = "result,test_group"
+# tests sent in one test history request (server accepts at most 1000)
+HISTORY_TESTS_PER_CALL = 500
+
 
 def get_failed_tests(terec: TerecCallContext, suite: str, branch: str):
     # collect response from terec server
     url = f"{terec.url}/history/orgs/{terec.org}/projects/{terec.prj}/suites/{suite}/failed-tests"
-    query_params = {"branch": branch, "user_req_id": terec.user_req_id}
-    return get_terec_rest_api(url, query_params)
-
-
-def get_suite_run_failed_tests(
-    terec: TerecCallContext, suite: str, branch: str, run_id: int
-):
-    # collect response from terec server
-    url = f"{terec.url}/tests/orgs/{terec.org}/projects/{terec.prj}/suites/{suite}/branches/{branch}/runs/{run_id}/tests"
-    query_params = {"result": "FAIL"}
-    return get_terec_rest_api(url, query_params)
+    query_params = {
+        "branch": branch,
+        "user_req_id": terec.user_req_id,
+        "fields": TABLE_FIELDS,
+        "normalized": True,
+    }
+    # suite runs are not needed, only run ids of the failed tests
+    return get_terec_rest_api(url, query_params)["tests"]
 
 
-def get_test_history_api_call(
+def get_tests_history_summary(
     terec: TerecCallContext,
     suite: str,
     branch: str,
-    tpackage: str,
-    tclass: str,
-    tcase: str,
-    tconfig: str,
-):
-    # collect response from terec server
-    url = f"{terec.url}/history/orgs/{terec.org}/projects/{terec.prj}/suites/{suite}/test-runs"
-    query_params = {
-        "branch": branch,
-        "test_package": tpackage,
-        "test_class": tclass,
-        "test_case": tcase,
-        "test_config": tconfig,
-        "user_req_id": terec.user_req_id,
-    }
-    return url, query_params
+    test_cases: list[tuple[str, str, str, str]],
+) -> dict[tuple, dict]:
+    # collect summaries of history of the tests from terec server, many tests per call
+    url = f"{terec.url}/history/orgs/{terec.org}/projects/{terec.prj}/suites/{suite}/test-runs/summary"
+    query_params = {"user_req_id": terec.user_req_id}
+    history = {}
+    for i in range(0, len(test_cases), HISTORY_TESTS_PER_CALL):
+        chunk = test_cases[i : i + HISTORY_TESTS_PER_CALL]
+        body = {
+            "branch": branch,
+            "tests": [
+                {
+                    "test_package": tpackage,
+                    "test_class": tclass,
+                    "test_case": tcase,
+                    "test_config": tconfig,
+                }
+                for tpackage, tclass, tcase, tconfig in chunk
+            ],
+        }
+        resp = post_terec_rest_api(url, body, query_params)
+        history |= {test_case: item for test_case, item in zip(chunk, resp["tests"])}
+    return history
 
 
 class FailedTests:
     """
-    Helper object to group test case -> [test runs] from a flat list of [(test_run, suite_run)] dicts:
+    Helper object to group test case -> [test runs] from a flat list of test run dicts with run_id:
     1. get list of unique test names (keys), then
     2. for each test key get list of runs for this test
     The key is a tuple(package, suite, case, config)
@@ -87,10 +95,10 @@ class FailedTests:
     @staticmethod
     def test_case_key(test: dict):
         return (
-            test["test_run"]["test_package"],
-            test["test_run"]["test_suite"],
-            test["test_run"]["test_case"],
-            test["test_run"]["test_config"],
+            test["test_package"],
+            test["test_suite"],
+            test["test_case"],
+            test["test_config"],
         )
 
     def _key_matches_filter(self, test_case: tuple[str, str, str, str]) -> bool:
@@ -100,7 +108,7 @@ class FailedTests:
             return "::".join(test_case).startswith(self.test_case_filter)
 
     def suite_runs_ids(self) -> list[int]:
-        return sorted({int(x["suite_run"]["run_id"]) for x in self.data}, reverse=True)
+        return sorted({int(x["run_id"]) for x in self.data}, reverse=True)
 
 
 @tests_app.command()
@@ -140,8 +148,8 @@ def failed(
         package, suite, case, config = test_case
         failed_runs = grouped_data.runs_for_test_case(test_case)
         assert failed_runs
-        failed_runs_ids = [f"#{run['suite_run']['run_id']}" for run in failed_runs]
-        t_group = [x["test_run"]["test_group"] for x in failed_runs][0] or "---"
+        failed_runs_ids = [f"#{run['run_id']}" for run in failed_runs]
+        t_group = [x["test_group"] for x in failed_runs][0] or "---"
 
         row_data = test_case_row_data(package, suite, case, config, fold)
         row_data += [
@@ -193,6 +201,7 @@ def history(
     """
     Prints out the list of tests that failed at least once given suite and branch.
     For each test it prints number of failures, skip and history of runs
+    (suite runs are counted, with the worst result of the test in each of them).
     Requires TEREC_URL to be set and optionally TEREC_ORG, TEREC_PROJECT.
     """
     from rich.console import Console
@@ -204,27 +213,16 @@ def history(
         data = get_failed_tests(terec, suite, branch)
     grouped_data = FailedTests(data, test_filter)
     uniq_test_cases = grouped_data.unique_test_cases(limit=limit, threshold=threshold)
-    # collect history for all interesting tests [TODO: make it asynchttp]
+    # collect history for all interesting tests
     with Timer("collect-test-results"):
-        calls = []
-        for test_case in uniq_test_cases:
-            tpackage, tsuite, tcase, tconfig = test_case
-            url, params = get_test_history_api_call(
-                terec,
-                suite,
-                branch,
-                tpackage,
-                tsuite,
-                tcase,
-                tconfig,
-            )
-            calls.append((test_case, url, params))
-
-        tests_history = asyncio.run(collect_terec_rest_api_calls(calls))
+        tests_history = get_tests_history_summary(terec, suite, branch, uniq_test_cases)
 
     # configure table
     title = f"Test history of {terec.org}/{terec.prj}/{suite} on branch {branch}"
-    caption = f"Limit: {limit}, Threshold: {threshold}"
+    caption = (
+        f"Limit: {limit}, Threshold: {threshold}. "
+        "Pass#/Fail#/Skip# count suite runs (the worst result of the test in each run)."
+    )
     table = Table(**typer_table_config(title, caption))
     # configure columns
     add_test_case_columns_to_table(table, fold)
@@ -234,46 +232,23 @@ def history(
     table.add_column("[yellow]Skip#[yellow]", justify="right", style="yellow")
     table.add_column("History", justify="left")
     # add rows
-    run_ids = grouped_data.suite_runs_ids()
+    result_markup = {
+        "P": "[green]P[/green]",
+        "S": "[yellow]s[/yellow]",
+        "F": "[red]F[/red]",
+        "_": "_",
+    }
     for test_case in uniq_test_cases:
         package, suite, case, config = test_case
-        history = sorted(
-            tests_history[test_case],
-            reverse=True,
-            key=lambda x: x["suite_run"]["run_id"],
-        )
-
-        t_group = next(
-            (
-                x["test_run"]["test_group"]
-                for x in history
-                if x["test_run"]["test_group"] is not None
-            ),
-            "---",
-        )
-        history_stream_data = {x: "_" for x in run_ids}
-
-        totals = {"FAIL": 0, "PASS": 0, "SKIP": 0}
-        for r in history:
-            r_id = r["suite_run"]["run_id"]
-            res = r["test_run"]["result"]
-            totals[res] = 1 + totals.get(res, 0)
-            if res == "PASS":
-                history_stream_data[r_id] = "[green]P[/green]"
-            elif res == "SKIP":
-                history_stream_data[r_id] = "[yellow]s[/yellow]"
-            elif res == "FAIL":
-                history_stream_data[r_id] = "[red]F[/red]"
-        history_stream = history_stream_data.values()
-        pass_count, skip_count, fail_count = (
-            totals["PASS"],
-            totals["SKIP"],
-            totals["FAIL"],
-        )
-        total_count = totals["FAIL"] + totals["PASS"] + totals["SKIP"]
+        summary = tests_history[test_case]
+        pass_count = summary["num_pass"]
+        fail_count = summary["num_fail"]
+        skip_count = summary["num_skip"]
+        total_count = pass_count + fail_count + skip_count
+        history_stream = [result_markup[r] for r in summary["results"]]
         row_data = test_case_row_data(package, suite, case, config, fold)
         row_data += [
-            str(t_group),
+            str(summary["test_group"] or "---"),
             " ".join([str(pass_count), ratio_str(pass_count, total_count)]),
             " ".join([str(fail_count), ratio_str(fail_count, total_count)]),
             str(skip_count),
@@ -286,15 +261,12 @@ def history(
     console.print(table)
 
 
-def get_test_run_check(terec: TerecCallContext, suite: str, run_id: int, test_run):
-    url = f"{terec.url}/history/orgs/{terec.org}/projects/{terec.prj}/suites/{suite}/test-run-check"
-    q_params = {
-        "run_id": run_id,
-        "test_package": test_run.test_package,
-        "test_class": test_run.test_suite,
-        "test_case": test_run.test_case,
-        "test_config": test_run.test_config,
-    }
+def get_suite_run_check(
+    terec: TerecCallContext, suite: str, branch: str, run_id: int, depth: int
+):
+    # all failed tests of the run are checked in one call
+    url = f"{terec.url}/history/orgs/{terec.org}/projects/{terec.prj}/suites/{suite}/run-check"
+    q_params = {"branch": branch, "run_id": run_id, "depth": depth}
     return get_terec_rest_api(url, q_params)
 
 
@@ -315,37 +287,27 @@ def check(
     previous runs for same suite and branch.
     """
     from rich.console import Console
-    from rich.progress import Progress
     from rich.table import Table
-    from terec.api.routers.results import TestCaseRunInfo
 
     # validate input
     terec = TerecCallContext.create(org, project)
-    # collect all tests failed in this build
     run_info_str = f"{terec.org}/{terec.prj}/{suite}/{branch}/{run_id}"
     console = Console()
-    with Timer("get-failed-tests"):
-        failed_tests = get_suite_run_failed_tests(terec, suite, branch, run_id)
-    if not failed_tests:
+    # check all tests failed in this build
+    status = Console(file=sys.stderr, quiet=not progress).status(
+        f"checking failed tests in suite run {run_info_str}"
+    )
+    with Timer("check-suite-run"), status:
+        run_check = get_suite_run_check(terec, suite, branch, run_id, limit)
+    if not run_check["num_failures"]:
         console.print(
             f"[green]No regression[green]: no test failures for suite run {run_info_str}."
         )
         return 0
-    # asynchronously check each failure
     console.print(
-        f"Checking {len(failed_tests)} failed tests in suite run {run_info_str}."
+        f"Checked {run_check['num_failures']} failed tests in suite run {run_info_str}."
     )
-    # TODO: make it asynchronous
-    # TODO: use provided limit
-    new_failures = []
-    with Progress(console=Console(file=sys.stderr), disable=not progress) as progress:
-        task = progress.add_task("checking failed tests", total=len(failed_tests))
-        for test_case in failed_tests:
-            info = TestCaseRunInfo(**test_case)
-            check = get_test_run_check(terec, suite, run_id, info)
-            if check["is_known_failure"] is False:
-                new_failures.append(check)
-            progress.update(task, advance=1)
+    new_failures = [t for t in run_check["tests"] if t["is_known_failure"] is False]
     # summary
     if not new_failures:
         console.print("[green]No regression[green]: no new test failures.")
@@ -354,7 +316,7 @@ def check(
     console.print("[red]Regression detected[red]")
     # print table with new test failures
     title = f"New test failures in {terec.org}/{terec.prj}/{suite}/{run_id}."
-    caption = f"Limit: {limit}, Total failures in suite run: {len(failed_tests)} with {len(new_failures)} new."
+    caption = f"Limit: {limit}, Total failures in suite run: {run_check['num_failures']} with {len(new_failures)} new."
     table = Table(**typer_table_config(title, caption))
     add_test_case_columns_to_table(table, fold)
     table.add_column("Run #", justify="right")
@@ -363,9 +325,13 @@ def check(
     table.add_column("Fail(same) #", justify="right", style="red")
     table.add_column("Fail(diff) #", justify="right", style="red")
     for f in new_failures:
-        tc = TestCaseRunInfo(**f["test_case"])
+        tc = f["test_case"]
         row_data = test_case_row_data(
-            tc.test_package, tc.test_suite, tc.test_case, tc.test_config, fold
+            tc["test_package"],
+            tc["test_suite"],
+            tc["test_case"],
+            tc.get("test_config"),
+            fold,
         )
         summary = f["summary"]
         row_data += [
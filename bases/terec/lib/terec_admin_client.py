@@ -19,3 +19,11 @@ class TerecAdminClient:
         path = f"/tests/orgs/{org}/suites"
         body = {"org": org, "project": project, "suite": name, "url": url}
         return self.terec_api_client.post(path, body)
+
+    def backfill_failures(self, org: str, project: str):
+        path = f"/admin/orgs/{org}/projects/{project}/failures/backfill"
+        return self.terec_api_client.post(path, {})
+
+    def backfill_history(self, org: str, project: str):
+        path = f"/admin/orgs/{org}/projects/{project}/history/backfill"
+        return self.terec_api_client.post(path, {})
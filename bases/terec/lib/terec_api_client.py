@@ -3,6 +3,7 @@ import os
 from requests import Session
 
 from terec.api.auth import api_key_headers
+from terec.api.compression import json_request_body, request_compression
 
 
 class TerecApiClient:
@@ -20,10 +21,16 @@ class TerecApiClient:
         http_session: An instance of the HTTP session used for making requests.
         headers: A dictionary containing API key and other relevant
             authentication headers for requests.
+        compression: Content-Encoding used for request bodies (gzip, zstd or None).
+            Defaults to the `TEREC_COMPRESSION` environment variable or gzip.
     """
 
     def __init__(
-        self, terec_api_url: str = None, http_session=None, api_key: str = None
+        self,
+        terec_api_url: str = None,
+        http_session=None,
+        api_key: str = None,
+        compression: str = None,
     ):
         self.terec_url = terec_api_url or os.environ.get(
             "TEREC_URL", "http://localhost:8000/"
@@ -31,6 +38,7 @@ class TerecApiClient:
         self.http_session = http_session or Session()
         api_key = api_key or os.environ.get("TEREC_API_KEY")
         self.headers = api_key_headers(api_key)
+        self.compression = compression or request_compression()
 
     def get(self, path: str, params: dict = None) -> dict:
         url = self.terec_ur(path)
@@ -47,12 +55,16 @@ class TerecApiClient:
 
     def put(self, path: str, body: dict) -> dict:
         url = self.terec_ur(path)
-        response = self.http_session.put(url, headers=self.headers, json=body)
+        data, headers = json_request_body(body, self.compression)
+        response = self.http_session.put(url, headers=self.headers | headers, data=data)
         response.raise_for_status()
         return response.json()
 
     def post(self, path: str, body: dict) -> dict:
         url = self.terec_ur(path)
-        response = self.http_session.post(url, headers=self.headers, json=body)
+        data, headers = json_request_body(body, self.compression)
+        response = self.http_session.post(
+            url, headers=self.headers | headers, data=data
+        )
         response.raise_for_status()
         return response.json()
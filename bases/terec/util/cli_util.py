@@ -1,10 +1,6 @@
 import os
 import uuid
 from dataclasses import dataclass
-from typing import Any
-
-import aiohttp
-import asyncio
 from urllib.parse import urlparse
 
 from terec.api.auth import api_key_headers
@@ -51,33 +47,17 @@ def put_terec_rest_api(url: str, body: dict):
         raise Exception(f"Error when calling {url}: {resp.text}")
 
 
-async def get_terec_rest_api_json_async(
-    session: aiohttp.ClientSession, url: str, query_params: dict
-):
-    resp = await session.request(method="GET", url=url, params=query_params)
-    resp.raise_for_status()
-    json = await resp.json()
-    return json
-
-
-async def collect_terec_rest_api_calls(calls: list[tuple[Any, str, dict]]):
-    results = {}
-
-    async def collect_task(task_name, session, url, params):
-        resp = await get_terec_rest_api_json_async(
-            session=session, url=url, query_params=params
-        )
-        results[task_name] = resp
-
-    async with aiohttp.ClientSession() as session:
-        tasks = []
-        for name, url, params in calls:
-            tasks.append(
-                collect_task(task_name=name, session=session, url=url, params=params)
-            )
-        await asyncio.gather(*tasks)
+def post_terec_rest_api(url: str, body: dict, query_params: dict = None):
+    import requests
 
-    return results
+    api_key = os.environ.get("TEREC_API_KEY")
+    resp = requests.post(
+        url=url, json=body, params=query_params, headers=api_key_headers(api_key)
+    )
+    if resp.ok:
+        return resp.json()
+    else:
+        raise Exception(f"Error when calling {url}: {resp.text}")
 
 
 def typer_table_config(title: str, caption: str):
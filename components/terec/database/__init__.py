@@ -2,6 +2,7 @@
 database connectivity
 """
 
+from terec.database.concurrency import current_concurrency
 from terec.database.core import cassandra_session
 
-__all__ = ["cassandra_session"]
+__all__ = ["cassandra_session", "current_concurrency"]
@@ -0,0 +1,145 @@
+"""
+Bridge between the driver's execute_async (callback based ResponseFuture) and asyncio,
+so that async request handlers can keep many queries in flight without using threads.
+"""
+
+import asyncio
+import time
+
+from cassandra.concurrent import ExecutionResult
+
+from terec.database.concurrency import (
+    AimdConcurrency,
+    MAX_RETRIES,
+    is_overload_error,
+    retry_delay,
+)
+
+
+async def execute_aio(session, statement, params=None) -> list:
+    """
+    Executes statement and returns all rows (all pages are fetched).
+    Driver callbacks run in the driver's event loop thread so results are
+    passed to the asyncio loop with call_soon_threadsafe.
+    """
+    loop = asyncio.get_running_loop()
+    result = loop.create_future()
+    rows = []
+    response_future = session.execute_async(statement, params)
+
+    def set_result(value):
+        if not result.done():
+            result.set_result(value)
+
+    def set_exception(error):
+        if not result.done():
+            result.set_exception(error)
+
+    def on_page(page):
+        # callbacks stay registered so they are called for the next page as well
+        rows.extend(page or [])
+        if response_future.has_more_pages:
+            response_future.start_fetching_next_page()
+        else:
+            loop.call_soon_threadsafe(set_result, rows)
+
+    def on_error(error):
+        loop.call_soon_threadsafe(set_exception, error)
+
+    response_future.add_callbacks(callback=on_page, errback=on_error)
+    return await result
+
+
+async def iter_pages_aio(session, statement, params=None):
+    """
+    Executes statement and yields its rows page by page (see statement fetch_size).
+    Next page is requested only when the previous one was consumed,
+    so memory used does not depend on the number of rows.
+    """
+    loop = asyncio.get_running_loop()
+    waiting = loop.create_future()
+
+    def set_result(future, value):
+        if not future.done():
+            future.set_result(value)
+
+    def set_exception(future, error):
+        if not future.done():
+            future.set_exception(error)
+
+    def on_page(page):
+        loop.call_soon_threadsafe(set_result, waiting, page or [])
+
+    def on_error(error):
+        loop.call_soon_threadsafe(set_exception, waiting, error)
+
+    response_future = session.execute_async(statement, params)
+    response_future.add_callbacks(callback=on_page, errback=on_error)
+    while True:
+        page = await waiting
+        has_more_pages = response_future.has_more_pages
+        yield page
+        if not has_more_pages:
+            return
+        waiting = loop.create_future()
+        response_future.start_fetching_next_page()
+
+
+async def execute_concurrent_aio(
+    session,
+    statements_and_params,
+    concurrency: AimdConcurrency,
+    max_retries: int = MAX_RETRIES,
+) -> list[ExecutionResult]:
+    """
+    Asyncio version of terec.database.concurrency.execute_adaptive:
+    executes (statement, params) pairs keeping number of requests in flight
+    under the adaptive concurrency limit. Statements failed due to overload are retried
+    after a short jittered delay.
+    Returns list of (success, rows or error) in the order of statements.
+    """
+    statements = list(statements_and_params)
+    slots = asyncio.Condition()
+    in_flight = 0
+
+    async def execute(statement, params) -> ExecutionResult:
+        nonlocal in_flight
+        try:
+            for attempt in range(max_retries + 1):
+                start = time.monotonic()
+                try:
+                    rows = await execute_aio(session, statement, params)
+                except Exception as e:
+                    if not is_overload_error(e):
+                        return ExecutionResult(False, e)
+                    concurrency.on_overload()
+                    if attempt == max_retries:
+                        return ExecutionResult(False, e)
+                    await asyncio.sleep(retry_delay(attempt + 1))
+                    continue
+                concurrency.on_success(time.monotonic() - start)
+                return ExecutionResult(True, rows)
+        finally:
+            async with slots:
+                in_flight -= 1
+                slots.notify_all()
+
+    tasks = []
+    for statement, params in statements:
+        async with slots:
+            await slots.wait_for(lambda: in_flight < concurrency.current())
+            in_flight += 1
+        tasks.append(asyncio.ensure_future(execute(statement, params)))
+    return list(await asyncio.gather(*tasks))
+
+
+async def execute_concurrent_aio_with_args(
+    session,
+    statement,
+    parameters,
+    concurrency: AimdConcurrency,
+    max_retries: int = MAX_RETRIES,
+) -> list[ExecutionResult]:
+    return await execute_concurrent_aio(
+        session, [(statement, p) for p in parameters], concurrency, max_retries
+    )
@@ -0,0 +1,116 @@
+"""
+Writing many rows with as few coordinator round trips as possible.
+Rows sharing a partition are grouped into UNLOGGED batches: a single partition batch
+is applied as one mutation so it is atomic and cheap for the coordinator.
+"""
+
+from cassandra.query import BatchStatement, BatchType
+
+from terec.database.aio import execute_concurrent_aio
+from terec.database.concurrency import (
+    AimdConcurrency,
+    execute_adaptive,
+    write_concurrency,
+)
+
+# Since Cassandra 3.x neither batch_size_warn_threshold (5KiB) nor batch_size_fail_threshold
+# (50KiB) applies to single partition batches, which are the only ones created here.
+# The limit still keeps every mutation (and coordinator memory per request) moderate.
+MAX_BATCH_BYTES = 48 * 1024
+# per cell overhead of a mutation (timestamp, ttl, deletion time, flags, value length),
+# null values are written as tombstones so they count too
+CELL_OVERHEAD_BYTES = 16
+
+
+def estimated_size(params) -> int:
+    """
+    Rough estimation of the serialized size of the row values in bytes,
+    including per cell overhead.
+    """
+    size = CELL_OVERHEAD_BYTES * len(params)
+    for v in params:
+        if v is None:
+            continue
+        if isinstance(v, str):
+            size += len(v.encode("utf-8"))
+        elif isinstance(v, bytes):
+            size += len(v)
+        else:
+            size += 8
+    return size
+
+
+class UnloggedBatchWriter:
+    """
+    Collects rows (prepared statement + parameters) by partition and writes them
+    as UNLOGGED batches limited by estimated size in bytes.
+    A row bigger than the limit is written on its own as a plain statement.
+    Setting max_batch_bytes to 0 disables batching so that each row is a separate request.
+    Requests are sent with adaptive concurrency shared by all writers.
+    """
+
+    def __init__(
+        self,
+        session,
+        max_batch_bytes: int = MAX_BATCH_BYTES,
+        concurrency: AimdConcurrency = write_concurrency,
+    ):
+        self.session = session
+        self.max_batch_bytes = max_batch_bytes
+        self.concurrency = concurrency
+        self.open_batches = {}
+        self.ready_batches = []
+        self.num_rows = 0
+
+    def add(self, partition_key: tuple, statement, params) -> None:
+        size = estimated_size(params)
+        rows, rows_size = self.open_batches.get(partition_key, ([], 0))
+        if rows and rows_size + size > self.max_batch_bytes:
+            self.ready_batches.append(rows)
+            rows, rows_size = [], 0
+        rows.append((statement, params))
+        self.open_batches[partition_key] = (rows, rows_size + size)
+        self.num_rows += 1
+
+    def execute(self) -> int:
+        """
+        Writes all collected rows and returns number of rows written.
+        Raises the first error if any write failed.
+        """
+        statements, num_rows = self._take_statements()
+        results = execute_adaptive(self.session, statements, self.concurrency)
+        self._raise_on_error(results)
+        return num_rows
+
+    async def execute_aio(self) -> int:
+        """
+        Asyncio version of execute().
+        """
+        statements, num_rows = self._take_statements()
+        results = await execute_concurrent_aio(
+            self.session, statements, self.concurrency
+        )
+        self._raise_on_error(results)
+        return num_rows
+
+    def _take_statements(self) -> tuple[list, int]:
+        self.ready_batches += [rows for rows, _ in self.open_batches.values()]
+        statements = [self._statement(rows) for rows in self.ready_batches]
+        num_rows = self.num_rows
+        self.open_batches, self.ready_batches, self.num_rows = {}, [], 0
+        return statements, num_rows
+
+    @staticmethod
+    def _raise_on_error(results) -> None:
+        errors = [error for ok, error in results if not ok]
+        if errors:
+            raise errors[0]
+
+    @staticmethod
+    def _statement(rows: list) -> tuple:
+        if len(rows) == 1:
+            return rows[0]
+        batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+        for statement, params in rows:
+            batch.add(statement, params)
+        return batch, None
@@ -0,0 +1,222 @@
+"""
+Executing many statements concurrently with adaptive (AIMD) concurrency.
+Number of requests in flight grows by one per round of successful requests
+and is halved when requests time out, the cluster is overloaded or latency
+goes above the target. This way the same code does not overload small clusters
+(or AstraDB) and does not leave throughput unused on bigger ones.
+"""
+
+import os
+import random
+import threading
+import time
+
+from cassandra import OperationTimedOut, ReadTimeout, Unavailable, WriteTimeout
+from cassandra.cluster import NoHostAvailable, ResultSet
+from cassandra.concurrent import ExecutionResult
+from cassandra.protocol import IsBootstrappingErrorMessage, OverloadedErrorMessage
+from loguru import logger
+
+CONCURRENCY_INITIAL = int(os.getenv("TEREC_CONCURRENCY_INITIAL", "32"))
+CONCURRENCY_MIN = int(os.getenv("TEREC_CONCURRENCY_MIN", "4"))
+CONCURRENCY_MAX = int(os.getenv("TEREC_CONCURRENCY_MAX", "256"))
+TARGET_LATENCY_MS = int(os.getenv("TEREC_TARGET_LATENCY_MS", "250"))
+MAX_RETRIES = 3
+# base of exponential backoff before retrying overloaded requests
+RETRY_DELAY_SEC = 0.05
+
+# errors meaning that the cluster can't keep up with the load
+OVERLOAD_ERRORS = (
+    OperationTimedOut,
+    OverloadedErrorMessage,
+    IsBootstrappingErrorMessage,
+    ReadTimeout,
+    WriteTimeout,
+    Unavailable,
+    NoHostAvailable,
+)
+
+
+def is_overload_error(error: Exception) -> bool:
+    return isinstance(error, OVERLOAD_ERRORS)
+
+
+def retry_delay(attempt: int) -> float:
+    """
+    Delay in seconds before given retry (1, 2, ...) of an overloaded request:
+    exponential backoff with full jitter so that retries do not come in waves.
+    """
+    return random.uniform(0, RETRY_DELAY_SEC * 2 ** (attempt - 1))
+
+
+class AimdConcurrency:
+    """
+    Concurrency limit controlled with additive increase / multiplicative decrease.
+    It is shared by all executions using it so it is thread safe.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: int = CONCURRENCY_INITIAL,
+        min_limit: int = CONCURRENCY_MIN,
+        max_limit: int = CONCURRENCY_MAX,
+        target_latency_ms: int = TARGET_LATENCY_MS,
+        backoff: float = 0.5,
+    ):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency_ms / 1000.0
+        self.backoff = backoff
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        # number of completed requests, limit is decreased at most once per
+        # current() completions so that a burst of slow responses halves it only once
+        self.completed = 0
+        self.last_decrease = -max_limit
+        self.lock = threading.Lock()
+
+    def current(self) -> int:
+        return int(self.limit)
+
+    def on_success(self, latency: float) -> None:
+        if latency > self.target_latency:
+            self.decrease()
+            return
+        with self.lock:
+            self.completed += 1
+            # +1 after current() successful requests
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def on_overload(self) -> None:
+        self.decrease()
+
+    def decrease(self) -> None:
+        with self.lock:
+            self.completed += 1
+            if self.completed - self.last_decrease < self.current():
+                return
+            old = self.current()
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+            self.last_decrease = self.completed
+        logger.info(
+            "Concurrency of {} decreased from {} to {}", self.name, old, self.current()
+        )
+
+
+write_concurrency = AimdConcurrency("writes")
+read_concurrency = AimdConcurrency("reads")
+
+
+def current_concurrency() -> dict[str, int]:
+    """
+    Returns concurrency levels currently used for writes and reads.
+    """
+    return {c.name: c.current() for c in [write_concurrency, read_concurrency]}
+
+
+class _AdaptiveExecution:
+    def __init__(self, session, statements_and_params, concurrency, max_retries):
+        self.session = session
+        self.statements = list(statements_and_params)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.results = [None] * len(self.statements)
+        self.in_flight = 0
+        self.done = 0
+        self.condition = threading.Condition()
+
+    def run(self) -> list[ExecutionResult]:
+        for idx in range(len(self.statements)):
+            with self.condition:
+                while self.in_flight >= self.concurrency.current():
+                    self.condition.wait()
+                self.in_flight += 1
+            self._submit(idx, 0)
+        with self.condition:
+            while self.done < len(self.statements):
+                self.condition.wait()
+        return self.results
+
+    def _submit(self, idx: int, attempt: int) -> None:
+        statement, params = self.statements[idx]
+        start = time.monotonic()
+        try:
+            future = self.session.execute_async(statement, params)
+        except Exception as e:
+            self._on_error(e, idx, attempt, start)
+            return
+        future.add_callbacks(
+            callback=self._on_success,
+            callback_args=(future, idx, start),
+            errback=self._on_error,
+            errback_args=(idx, attempt, start),
+        )
+
+    def _on_success(self, rows, future, idx: int, start: float) -> None:
+        # completion is always counted, otherwise run() would wait forever
+        result = ExecutionResult(False, RuntimeError("result callback failed"))
+        try:
+            future.clear_callbacks()
+            self.concurrency.on_success(time.monotonic() - start)
+            result = ExecutionResult(True, ResultSet(future, rows))
+        except Exception as e:
+            result = ExecutionResult(False, e)
+        finally:
+            self._complete(idx, result)
+
+    def _on_error(self, error, idx: int, attempt: int, start: float) -> None:
+        retrying = False
+        try:
+            if is_overload_error(error):
+                self.concurrency.on_overload()
+                if attempt < self.max_retries:
+                    logger.debug("Retrying statement after {}", error)
+                    self._submit_later(idx, attempt + 1)
+                    retrying = True
+        finally:
+            if not retrying:
+                self._complete(idx, ExecutionResult(False, error))
+
+    def _submit_later(self, idx: int, attempt: int) -> None:
+        # callbacks run in the driver's event loop thread so it must not sleep there
+        timer = threading.Timer(retry_delay(attempt), self._submit, (idx, attempt))
+        timer.daemon = True
+        timer.start()
+
+    def _complete(self, idx: int, result: ExecutionResult) -> None:
+        with self.condition:
+            self.results[idx] = result
+            self.in_flight -= 1
+            self.done += 1
+            self.condition.notify_all()
+
+
+def execute_adaptive(
+    session,
+    statements_and_params,
+    concurrency: AimdConcurrency,
+    max_retries: int = MAX_RETRIES,
+) -> list[ExecutionResult]:
+    """
+    Executes (statement, params) pairs like cassandra.concurrent.execute_concurrent
+    with raise_on_first_error=False, but the number of requests in flight is controlled
+    by given AimdConcurrency. Statements failed due to overload are retried
+    after a short jittered delay (see retry_delay).
+    Returns list of (success, result or error) in the order of statements.
+    """
+    return _AdaptiveExecution(
+        session, statements_and_params, concurrency, max_retries
+    ).run()
+
+
+def execute_adaptive_with_args(
+    session,
+    statement,
+    parameters,
+    concurrency: AimdConcurrency,
+    max_retries: int = MAX_RETRIES,
+) -> list[ExecutionResult]:
+    return execute_adaptive(
+        session, [(statement, p) for p in parameters], concurrency, max_retries
+    )
@@ -0,0 +1,132 @@
+"""
+Process-wide registry of prepared statements used in the hot paths (bulk imports, history).
+Modules register CQL of their statements by name and take prepared statements from here
+so that each statement is prepared once per process instead of once per request.
+Statements are prepared again when the session changes (reconnect), after invalidate()
+or when the driver replaced metadata of their table (it does so on schema change events,
+e.g. after ALTER TABLE), so that SELECT * statements get the new columns.
+Re-preparing on nodes which restarted or lost their cache is handled by the driver itself.
+"""
+
+import asyncio
+import threading
+
+from functools import partial
+from typing import Callable
+
+from cassandra.cqlengine.connection import get_session
+from cassandra.query import PreparedStatement
+from loguru import logger
+
+
+class StatementRegistry:
+    def __init__(self):
+        self.cql = {}
+        self.prepared = {}
+        self.lock = threading.Lock()
+
+    def register(self, name: str, cql: Callable[[], str]) -> None:
+        """
+        Registers statement under given name. CQL is provided as a function
+        as table names depend on the keyspace known only after connecting.
+        """
+        self.cql[name] = cql
+
+    def get(self, name: str, session=None) -> PreparedStatement:
+        session = session or get_session()
+        statement = self._ready(name, session)
+        if statement is not None:
+            return statement
+        statement = session.prepare(self.cql[name]())
+        with self.lock:
+            self.prepared[name] = (
+                session,
+                statement,
+                _table_metadata(session, statement),
+            )
+        return statement
+
+    async def get_async(self, name: str, session=None) -> PreparedStatement:
+        """
+        Same as get() but statement not prepared yet is prepared in a thread
+        so that the event loop is not blocked.
+        """
+        session = session or get_session()
+        statement = self._ready(name, session)
+        if statement is not None:
+            return statement
+        return await asyncio.to_thread(self.get, name, session)
+
+    def _ready(self, name: str, session) -> PreparedStatement | None:
+        with self.lock:
+            prepared = self.prepared.get(name)
+        if prepared is None:
+            return None
+        prepared_session, statement, table = prepared
+        if prepared_session is not session:
+            return None
+        if table is not _table_metadata(session, statement):
+            return None
+        return statement
+
+    def get_projected(
+        self, name: str, columns: tuple[str, ...] | None, session=None
+    ) -> PreparedStatement:
+        """
+        Returns variant of the statement selecting only given columns (None means all),
+        CQL function of the statement has to accept columns argument.
+        Each projection is registered and prepared on the first use.
+        """
+        return self.get(self._projected(name, columns), session)
+
+    async def get_projected_async(
+        self, name: str, columns: tuple[str, ...] | None, session=None
+    ) -> PreparedStatement:
+        """
+        Same as get_projected() but prepares in a thread (see get_async).
+        """
+        return await self.get_async(self._projected(name, columns), session)
+
+    def register_projection(self, name: str, columns: tuple[str, ...] | None) -> None:
+        """
+        Registers projection of the statement so that it is prepared by warm_up().
+        """
+        self._projected(name, columns)
+
+    def _projected(self, name: str, columns: tuple[str, ...] | None) -> str:
+        if not columns:
+            return name
+        projected = f"{name}({','.join(columns)})"
+        with self.lock:
+            if projected not in self.cql:
+                self.cql[projected] = partial(self.cql[name], columns=columns)
+        return projected
+
+    def warm_up(self, session=None) -> None:
+        """
+        Prepares all registered statements.
+        """
+        self.invalidate()
+        for name in list(self.cql):
+            self.get(name, session)
+        logger.info("Prepared {} statements", len(self.cql))
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self.prepared = {}
+
+
+def _table_metadata(session, statement):
+    """
+    Returns driver metadata of the table the statement is bound to (None if not known).
+    The driver replaces it when the table schema changes.
+    """
+    columns = getattr(statement, "column_metadata", None)
+    cluster = getattr(session, "cluster", None)
+    if not columns or cluster is None:
+        return None
+    keyspace = cluster.metadata.keyspaces.get(columns[0].keyspace_name)
+    return keyspace.tables.get(columns[0].table_name) if keyspace else None
+
+
+statements = StatementRegistry()
@@ -0,0 +1,213 @@
+"""
+Suite run aggregates (pass/fail/skip/total counts and total duration of tests)
+maintained at ingest time.
+Before a chunk of test case runs is written, results of the same tests already stored
+in the run are read from the run manifest, so that only the difference is added to the counters.
+This makes partial and repeated uploads of the same tests idempotent.
+Counters are kept in a counter table (concurrent chunks do not lose updates)
+and their current values are copied to the suite run row.
+
+Counter updates themselves are not idempotent, so the counters can drift when:
+- test case runs are written but the counter update fails (a retry sees them as existing),
+- two overlapping uploads of the same tests both count them,
+- a timed out counter update was applied anyway and the upload is repeated.
+recount_suite_run_aggregates() (POST .../runs/{run_id}/recount) repairs them
+by recomputing the counts from the stored test case runs.
+"""
+
+from cassandra.cqlengine import columns
+from cassandra.cqlengine.connection import get_session
+from cassandra.cqlengine.models import Model
+
+from terec.database.aio import execute_aio
+from terec.database.statements import statements
+from terec.model.manifest import ManifestEntry, case_key
+from terec.model.results import TestCaseRun, TestSuiteRun
+
+RESULT_COUNTERS = {"PASS": "pass_count", "FAIL": "fail_count", "SKIP": "skip_count"}
+COUNTERS = ["pass_count", "fail_count", "skip_count", "total_count", "duration_ms"]
+
+
+class TestSuiteRunCounters(Model):
+    __test__ = False
+    org = columns.Text(partition_key=True)
+    project = columns.Text(partition_key=True)
+    suite = columns.Text(partition_key=True)
+    branch = columns.Text(primary_key=True)
+    run_id = columns.Integer(primary_key=True, clustering_order="DESC")
+    pass_count = columns.Counter()
+    fail_count = columns.Counter()
+    skip_count = columns.Counter()
+    total_count = columns.Counter()
+    duration_ms = columns.Counter()
+
+
+def counters_update_cql() -> str:
+    return (
+        f"UPDATE {TestSuiteRunCounters.column_family_name(include_keyspace=True)} SET "
+        + ", ".join(f"{c}={c}+?" for c in COUNTERS)
+        + " WHERE org=? AND project=? AND suite=? AND branch=? AND run_id=?"
+    )
+
+
+def counters_select_cql() -> str:
+    return (
+        f"SELECT {', '.join(COUNTERS)} "
+        f"FROM {TestSuiteRunCounters.column_family_name(include_keyspace=True)} "
+        f"WHERE org=? AND project=? AND suite=? AND branch=? AND run_id=?"
+    )
+
+
+def suite_run_counts_update_cql() -> str:
+    return (
+        f"UPDATE {TestSuiteRun.column_family_name(include_keyspace=True)} "
+        f"SET pass_count=?, fail_count=?, skip_count=?, total_count=?, tests_duration_ms=? "
+        f"WHERE org=? AND project=? AND suite=? AND branch=? AND run_id=?"
+    )
+
+
+def suite_run_results_select_cql() -> str:
+    return (
+        f"SELECT result, duration_ms "
+        f"FROM {TestCaseRun.column_family_name(include_keyspace=True)} "
+        f"WHERE org=? AND project=? AND suite=? AND branch=? AND run_id=?"
+    )
+
+
+statements.register("suite_run_counters_update", counters_update_cql)
+statements.register("suite_run_counters_select", counters_select_cql)
+statements.register("suite_run_counts_update", suite_run_counts_update_cql)
+statements.register("suite_run_results_select", suite_run_results_select_cql)
+
+
+def _run_key(suite_run: TestSuiteRun) -> tuple:
+    return (
+        suite_run.org,
+        suite_run.project,
+        suite_run.suite,
+        suite_run.branch,
+        suite_run.run_id,
+    )
+
+
+def aggregates_delta(
+    existing: dict[tuple, ManifestEntry], tests: list
+) -> dict[str, int]:
+    """
+    Returns change of the counters after writing tests (e.g. TestCaseRunInfo)
+    over the existing results. If the same test is given more than once the last one wins.
+    """
+    delta = {c: 0 for c in COUNTERS}
+
+    def add(result: str, duration_ms: int | None, sign: int):
+        delta[RESULT_COUNTERS[result]] += sign
+        delta["total_count"] += sign
+        delta["duration_ms"] += sign * (duration_ms or 0)
+
+    new_results = {case_key(t): (t.result.value, t.duration_ms) for t in tests}
+    for key, (result, duration_ms) in new_results.items():
+        if key in existing:
+            add(existing[key].result, existing[key].duration_ms, sign=-1)
+        add(result, duration_ms, sign=1)
+    return delta
+
+
+def results_aggregates(results) -> dict[str, int]:
+    """
+    Returns counters of test case runs given as (result, duration_ms) pairs.
+    """
+    counts = {c: 0 for c in COUNTERS}
+    for result, duration_ms in results:
+        counts[RESULT_COUNTERS[result]] += 1
+        counts["total_count"] += 1
+        counts["duration_ms"] += duration_ms or 0
+    return counts
+
+
+def _counts_params(suite_run: TestSuiteRun, counters: dict) -> tuple:
+    return tuple(counters.get(c) or 0 for c in COUNTERS) + _run_key(suite_run)
+
+
+def update_suite_run_aggregates(
+    suite_run: TestSuiteRun, delta: dict[str, int], session=None
+) -> None:
+    """
+    Adds delta to the suite run counters and copies them into the suite run row.
+    They are copied also when nothing changed so that counts sent by importers
+    are replaced with the counted ones.
+    """
+    session = session or get_session()
+    run_key = _run_key(suite_run)
+    if any(delta.values()):
+        session.execute(
+            statements.get("suite_run_counters_update", session),
+            tuple(delta[c] for c in COUNTERS) + run_key,
+        )
+    rows = list(
+        session.execute(statements.get("suite_run_counters_select", session), run_key)
+    )
+    # nothing counted yet
+    if not rows:
+        return
+    session.execute(
+        statements.get("suite_run_counts_update", session),
+        _counts_params(suite_run, rows[0]),
+    )
+
+
+async def update_suite_run_aggregates_async(
+    suite_run: TestSuiteRun, delta: dict[str, int], session=None
+) -> None:
+    """
+    Asyncio version of update_suite_run_aggregates().
+    """
+    session = session or get_session()
+    run_key = _run_key(suite_run)
+    if any(delta.values()):
+        await execute_aio(
+            session,
+            await statements.get_async("suite_run_counters_update", session),
+            tuple(delta[c] for c in COUNTERS) + run_key,
+        )
+    rows = await execute_aio(
+        session,
+        await statements.get_async("suite_run_counters_select", session),
+        run_key,
+    )
+    if not rows:
+        return
+    await execute_aio(
+        session,
+        await statements.get_async("suite_run_counts_update", session),
+        _counts_params(suite_run, rows[0]),
+    )
+
+
+def recount_suite_run_aggregates(
+    suite_run: TestSuiteRun, session=None
+) -> dict[str, int]:
+    """
+    Recomputes the suite run counters from its stored test case runs (also for runs
+    imported before the counters existed) and copies them into the suite run row.
+    It should not run while tests of the run are being uploaded.
+    Returns the counters.
+    """
+    session = session or get_session()
+    run_key = _run_key(suite_run)
+    rows = session.execute(statements.get("suite_run_results_select", session), run_key)
+    counts = results_aggregates((r["result"], r["duration_ms"]) for r in rows)
+    current = list(
+        session.execute(statements.get("suite_run_counters_select", session), run_key)
+    )
+    current = current[0] if current else {}
+    delta = {c: counts[c] - (current.get(c) or 0) for c in COUNTERS}
+    if any(delta.values()):
+        session.execute(
+            statements.get("suite_run_counters_update", session),
+            tuple(delta[c] for c in COUNTERS) + run_key,
+        )
+    session.execute(
+        statements.get("suite_run_counts_update", session),
+        _counts_params(suite_run, counts),
+    )
+    return counts
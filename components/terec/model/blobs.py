@@ -0,0 +1,217 @@
+"""
+Content-addressed storage for big text fields of test case runs (stdout, stderr, stacktrace).
+The same output or stacktrace is repeated in many runs and configs of a failing test
+so it is stored once in TextBlob table and test case run keeps only its hash.
+Blobs are zstd-compressed with the dictionary of the project (see terec.model.text_compression).
+Blobs written before compression have only the uncompressed content column set,
+it is not written anymore but still read for them (compressed is null).
+"""
+
+import hashlib
+import threading
+
+from collections import OrderedDict
+
+from cassandra.cqlengine import columns
+from cassandra.cqlengine.connection import get_session
+from cassandra.cqlengine.models import Model
+
+from terec.database.aio import execute_concurrent_aio_with_args
+from terec.database.concurrency import execute_adaptive_with_args, read_concurrency
+from terec.database.statements import statements
+from terec.model.text_compression import (
+    NO_DICT,
+    compress_text,
+    decompress_text,
+    project_dicts,
+)
+
+# test case run text fields stored as blobs, each has <field>_hash column
+BLOB_FIELDS = ["stdout", "stderr", "error_stacktrace", "error_details"]
+# shorter texts are kept inline as separate read would cost more than it saves
+BLOB_MIN_SIZE = 256
+KNOWN_BLOBS_CACHE_SIZE = 50000
+
+
+class TextBlob(Model):
+    org = columns.Text(partition_key=True)
+    project = columns.Text(partition_key=True)
+    hash = columns.Text(partition_key=True)
+    content = columns.Text()  # legacy: only read for blobs written before compression
+    compressed = columns.Blob()
+    dict_id = columns.BigInt()  # compression dictionary, 0 means no dictionary
+
+
+def text_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class TextBlobs:
+    """
+    Collects distinct texts to be stored as blobs for given org/project.
+    """
+
+    def __init__(self, org: str, project: str):
+        self.org = org
+        self.project = project
+        self.blobs = {}
+
+    def add(self, text: str | None) -> tuple[str | None, str | None]:
+        """
+        Returns pair of (inline text, blob hash) where only one of them is set.
+        """
+        if text is None or len(text) < BLOB_MIN_SIZE:
+            return text, None
+        h = text_hash(text)
+        self.blobs[h] = text
+        return None, h
+
+    def retain(self, hashes: set[str]) -> None:
+        """
+        Keeps only blobs with given hashes (e.g. the ones used by rows being written).
+        """
+        self.blobs = {h: text for h, text in self.blobs.items() if h in hashes}
+
+
+class _KnownBlobs:
+    """
+    Bounded set of blob hashes already written by this process.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hashes = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, key) -> bool:
+        with self.lock:
+            if key in self.hashes:
+                self.hashes.move_to_end(key)
+                return True
+            return False
+
+    def add(self, key) -> None:
+        with self.lock:
+            self.hashes[key] = True
+            self.hashes.move_to_end(key)
+            while len(self.hashes) > self.max_size:
+                self.hashes.popitem(last=False)
+
+
+known_blobs = _KnownBlobs(KNOWN_BLOBS_CACHE_SIZE)
+
+
+def text_blob_insert_cql() -> str:
+    return (
+        f"INSERT INTO {TextBlob.column_family_name(include_keyspace=True)} "
+        f"(org, project, hash, compressed, dict_id) VALUES (?, ?, ?, ?, ?)"
+    )
+
+
+def text_blob_select_cql() -> str:
+    return (
+        f"SELECT hash, content, compressed, dict_id FROM {TextBlob.column_family_name(include_keyspace=True)} "
+        f"WHERE org=? AND project=? AND hash=?"
+    )
+
+
+statements.register("text_blob_insert", text_blob_insert_cql)
+statements.register("text_blob_select", text_blob_select_cql)
+
+
+def new_blob_rows(blobs: TextBlobs, session=None) -> list[tuple]:
+    """
+    Returns insert parameters (with compressed content) for collected blobs
+    not yet written by this process.
+    """
+    rows = []
+    for h, text in blobs.blobs.items():
+        if (blobs.org, blobs.project, h) not in known_blobs:
+            dict_id, data = compress_text(blobs.org, blobs.project, text, session)
+            rows.append((blobs.org, blobs.project, h, data, dict_id))
+    return rows
+
+
+def mark_blobs_written(rows: list[tuple]) -> None:
+    for org, project, h, *_ in rows:
+        known_blobs.add((org, project, h))
+
+
+def resolve_text_blobs(test_runs: list, session=None) -> list:
+    """
+    Fills text fields of test case runs (TestCaseRun objects) stored as blobs.
+    All distinct blobs are loaded with concurrent queries.
+    """
+    keys = _blob_keys(test_runs)
+    if not keys:
+        return test_runs
+    session = session or get_session()
+    stmt = statements.get("text_blob_select", session)
+    results = execute_adaptive_with_args(session, stmt, keys, read_concurrency)
+    return _set_blob_texts(test_runs, keys, results)
+
+
+async def resolve_text_blobs_async(test_runs: list, session=None) -> list:
+    """
+    Asyncio version of resolve_text_blobs().
+    """
+    keys = _blob_keys(test_runs)
+    if not keys:
+        return test_runs
+    session = session or get_session()
+    stmt = await statements.get_async("text_blob_select", session)
+    results = await execute_concurrent_aio_with_args(
+        session, stmt, keys, read_concurrency
+    )
+    # dictionaries are loaded here, decompression must not block the event loop
+    for (org, project), dict_ids in _blob_dict_ids(keys, results).items():
+        await project_dicts.preload_async(org, project, dict_ids, session)
+    return _set_blob_texts(test_runs, keys, results)
+
+
+def _blob_keys(test_runs: list) -> list[tuple]:
+    return list(
+        {
+            (t.org, t.project, getattr(t, f"{field}_hash"))
+            for t in test_runs
+            for field in BLOB_FIELDS
+            if getattr(t, f"{field}_hash", None)
+        }
+    )
+
+
+def _blob_dict_ids(keys: list[tuple], results) -> dict[tuple, set[int]]:
+    """
+    Returns ids of compression dictionaries used by loaded blobs by (org, project).
+    """
+    dict_ids = {}
+    for (org, project, _), (ok, rows) in zip(keys, results):
+        for row in rows if ok else []:
+            if row["compressed"] is not None and row["dict_id"]:
+                dict_ids.setdefault((org, project), set()).add(row["dict_id"])
+    return dict_ids
+
+
+def _set_blob_texts(test_runs: list, keys: list[tuple], results) -> list:
+    errors = [error for ok, error in results if not ok]
+    if errors:
+        raise Exception(
+            f"{len(errors)}/{len(keys)} queries failed. Example failure: {str(errors[0])}"
+        )
+    contents = {}
+    for (org, project, _), (_, rows) in zip(keys, results):
+        for row in rows:
+            contents[(org, project, row["hash"])] = _blob_content(org, project, row)
+    for t in test_runs:
+        for field in BLOB_FIELDS:
+            h = getattr(t, f"{field}_hash", None)
+            if h:
+                setattr(t, field, contents.get((t.org, t.project, h)))
+    return test_runs
+
+
+def _blob_content(org: str, project: str, row: dict) -> str | None:
+    # blobs written before compression keep uncompressed content
+    if row["compressed"] is None:
+        return row["content"]
+    return decompress_text(org, project, row["dict_id"] or NO_DICT, row["compressed"])
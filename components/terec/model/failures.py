@@ -1,7 +1,42 @@
-from cassandra.concurrent import execute_concurrent_with_args
+from functools import partial
+from operator import attrgetter
+
 from cassandra.cqlengine.connection import get_session
 
-from terec.model.results import TestSuiteRun, TestCaseRun
+from terec.database.aio import (
+    execute_aio,
+    execute_concurrent_aio,
+    execute_concurrent_aio_with_args,
+    iter_pages_aio,
+)
+from terec.database.batch import UnloggedBatchWriter
+from terec.database.concurrency import execute_adaptive_with_args, read_concurrency
+from terec.database.statements import statements
+from terec.model.blobs import (
+    BLOB_FIELDS,
+    resolve_text_blobs,
+    resolve_text_blobs_async,
+)
+from terec.model.ingest import TEST_CASE_RUN_COLUMNS
+from terec.model.results import (
+    FailedTestCaseRun,
+    TestCaseRunHistory,
+    TestCaseRunRow,
+    TestSuiteRun,
+    TestCaseRun,
+)
+
+# order of test case runs (same as TestCaseRun.test_case_run_id_tuple())
+TEST_CASE_RUN_ORDER = attrgetter(
+    "test_package", "test_suite", "test_case", "test_config", "run_id"
+)
+
+
+def case_run_class(as_rows: bool):
+    """
+    Class of loaded test case runs: TestCaseRun or plain rows (TestCaseRunRow) if as_rows.
+    """
+    return TestCaseRunRow if as_rows else TestCaseRun
 
 
 def load_suite_branch_runs(
@@ -23,43 +58,332 @@ def load_suite_branch_runs(
     return runs
 
 
+def suite_runs_select_cql(with_branch: bool) -> str:
+    branch_cond = " AND branch=?" if with_branch else ""
+    return (
+        f"SELECT * FROM {TestSuiteRun.column_family_name(include_keyspace=True)} "
+        f"WHERE org=? AND project=? AND suite=?{branch_cond} LIMIT ?"
+    )
+
+
+statements.register("suite_runs_select", partial(suite_runs_select_cql, False))
+statements.register("suite_branch_runs_select", partial(suite_runs_select_cql, True))
+
+
+async def load_suite_branch_runs_async(
+    org_name: str,
+    project_name: str,
+    suite_name: str,
+    branch: str | None = None,
+    limit: int = 32,
+    session=None,
+) -> list[TestSuiteRun]:
+    """
+    Asyncio version of load_suite_branch_runs().
+    """
+    session = session or get_session()
+    if branch:
+        stmt = await statements.get_async("suite_branch_runs_select", session)
+        params = (org_name, project_name, suite_name, branch, limit)
+    else:
+        stmt = await statements.get_async("suite_runs_select", session)
+        params = (org_name, project_name, suite_name, limit)
+    rows = await execute_aio(session, stmt, params)
+    return [TestSuiteRun(**r) for r in rows]
+
+
+# columns of test case runs always read: keys of the row and the result
+PROJECTION_KEY_COLUMNS = TEST_CASE_RUN_COLUMNS[:10]
+# test case run fields which can be selected or excluded from reading
+PROJECTION_FIELDS = [
+    "test_group",
+    "tstamp",
+    "duration_ms",
+    "stdout",
+    "stderr",
+    "error_stacktrace",
+    "error_details",
+    "skip_details",
+]
+
+
+def projection_columns(
+    fields: list[str] | None = None, exclude: list[str] | None = None
+) -> tuple[str, ...] | None:
+    """
+    Returns columns to read so that test case runs have only given fields
+    or all but excluded ones (None means all columns, no projection).
+    Keys and result are always read, texts stored as blobs are read with their hashes.
+    Raises ValueError for unknown fields.
+    """
+    if fields is None and exclude is None:
+        return None
+    known = set(PROJECTION_KEY_COLUMNS) | set(PROJECTION_FIELDS)
+    unknown = (set(fields or []) | set(exclude or [])) - known
+    if unknown:
+        raise ValueError(f"Unknown test fields: {', '.join(sorted(unknown))}")
+    selected = {
+        f
+        for f in PROJECTION_FIELDS
+        if (fields is None or f in fields) and f not in (exclude or [])
+    }
+    selected |= {f"{f}_hash" for f in selected if f in BLOB_FIELDS}
+    return tuple(
+        c for c in TEST_CASE_RUN_COLUMNS if c in PROJECTION_KEY_COLUMNS or c in selected
+    )
+
+
+def select_list(columns: tuple[str, ...] | None) -> str:
+    return ", ".join(columns) if columns else "*"
+
+
+def failed_tests_select_cql(columns: tuple[str, ...] | None = None) -> str:
+    return (
+        f"SELECT {select_list(columns)} FROM {FailedTestCaseRun.column_family_name(include_keyspace=True)} "
+        f"WHERE org=? AND project=? AND suite=? AND branch=? AND run_id=?"
+    )
+
+
+def suite_run_tests_select_cql(columns: tuple[str, ...] | None = None) -> str:
+    return (
+        f"SELECT {select_list(columns)} FROM {TestCaseRun.column_family_name(include_keyspace=True)} "
+        f"WHERE org=? AND project=? AND suite=? AND branch=? AND run_id=?"
+    )
+
+
+def failed_test_select_cql(columns: tuple[str, ...] | None = None) -> str:
+    return (
+        f"SELECT {select_list(columns)} FROM {FailedTestCaseRun.column_family_name(include_keyspace=True)} "
+        f"WHERE org=? AND project=? AND suite=? AND branch=? AND run_id=? "
+        f"AND test_package=? AND test_suite=? AND test_case=? AND test_config=?"
+    )
+
+
+statements.register("failed_tests_select", failed_tests_select_cql)
+statements.register("suite_run_tests_select", suite_run_tests_select_cql)
+statements.register("failed_test_select", failed_test_select_cql)
+
+
 def load_failed_tests_for_suite_runs(
-    runs: list[TestSuiteRun], session=None
+    runs: list[TestSuiteRun], session=None, columns: tuple[str, ...] | None = None
 ) -> list[TestCaseRun]:
     """
-    Loads all test failures for given list of runs (builds).
+    Loads all test failures for given list of runs (builds) from the failures table.
     Session can be explicitly provided or will be taken from cqlengine.
-    To make things more performant we will use concurrent queries.
+    Only given columns are read if set (see projection_columns).
+    To make things more performant we will use concurrent queries (with adaptive concurrency).
     """
     session = session or get_session()
-    # prepare statement
-    select_cql = (
-        f"SELECT * FROM {TestCaseRun.column_family_name(include_keyspace=True)} "
-        f"WHERE org=? AND project=? AND suite=? AND branch=? AND run_id=? AND result=?"
-    )
-    stmt = session.prepare(select_cql)
+    stmt = statements.get_projected("failed_tests_select", columns, session)
     # create list of parameters for the queries
-    params = [(r.org, r.project, r.suite, r.branch, r.run_id, "FAIL") for r in runs]
-    # run the query
-    concurrency = 32
-    results = execute_concurrent_with_args(
-        session, stmt, params, concurrency=concurrency
+    params = [(r.org, r.project, r.suite, r.branch, r.run_id) for r in runs]
+    # run the queries
+    results = execute_adaptive_with_args(session, stmt, params, read_concurrency)
+    tests = _combine_failed_tests(results)
+    return resolve_text_blobs(tests, session)
+
+
+async def load_failed_tests_for_suite_runs_async(
+    runs: list[TestSuiteRun],
+    session=None,
+    columns: tuple[str, ...] | None = None,
+    as_rows: bool = False,
+) -> list[TestCaseRun]:
+    """
+    Asyncio version of load_failed_tests_for_suite_runs().
+    With as_rows failures are returned as plain rows (TestCaseRunRow).
+    """
+    session = session or get_session()
+    stmt = await statements.get_projected_async("failed_tests_select", columns, session)
+    params = [(r.org, r.project, r.suite, r.branch, r.run_id) for r in runs]
+    results = await execute_concurrent_aio_with_args(
+        session, stmt, params, read_concurrency
     )
+    tests = _combine_failed_tests(results, case_run_class(as_rows))
+    return await resolve_text_blobs_async(tests, session)
+
+
+async def load_failed_test_case_runs_async(
+    test_runs: list,
+    session=None,
+    columns: tuple[str, ...] | None = None,
+    as_rows: bool = False,
+) -> list[TestCaseRun]:
+    """
+    Reads failures of given test case runs (e.g. history read with keys and results only)
+    from the failures table with a query per failure, runs which did not fail are skipped.
+    Unlike load_failed_tests_for_suite_runs_async() other failures of the suite runs are not read.
+    """
+    session = session or get_session()
+    stmt = await statements.get_projected_async("failed_test_select", columns, session)
+    params = [
+        tuple(getattr(t, c) for c in TEST_CASE_RUN_COLUMNS[:9])
+        for t in test_runs
+        if t.result == "FAIL"
+    ]
+    results = await execute_concurrent_aio_with_args(
+        session, stmt, params, read_concurrency
+    )
+    tests = _combine_failed_tests(results, case_run_class(as_rows))
+    return await resolve_text_blobs_async(tests, session)
+
+
+def _combine_failed_tests(results, row_class=TestCaseRun) -> list[TestCaseRun]:
     # check for errors
     errors = [error for ok, error in results if not ok]
     if errors:
         raise Exception(
-            f"{len(errors)}/{len(params)} queries failed. Example failure: {str(errors[0])}"
+            f"{len(errors)}/{len(results)} queries failed. Example failure: {str(errors[0])}"
         )
     # collect and combine results
     tests = []
     for success, rows in results:
         if success:
-            tests += [TestCaseRun(**r) for r in rows]
-    tests.sort(reverse=True, key=lambda x: x.test_case_run_id_tuple())
+            tests += [row_class(**r) for r in rows]
+    tests.sort(reverse=True, key=TEST_CASE_RUN_ORDER)
     return tests
 
 
+def _suite_run_tests_select(result: str | None) -> str:
+    # failures have their own table, other results are filtered within the run partition
+    return "failed_tests_select" if result == "FAIL" else "suite_run_tests_select"
+
+
+def _suite_run_tests_statement(
+    prepared,
+    org_name,
+    project_name,
+    suite_name,
+    branch,
+    run_id,
+    page_size,
+):
+    stmt = prepared.bind((org_name, project_name, suite_name, branch, run_id))
+    if page_size:
+        stmt.fetch_size = page_size
+    return stmt
+
+
+def _with_result(rows, result: str | None) -> list[TestCaseRun]:
+    return [TestCaseRun(**r) for r in rows if not result or r["result"] == result]
+
+
+def load_suite_run_tests(
+    org_name: str,
+    project_name: str,
+    suite_name: str,
+    branch: str,
+    run_id: int,
+    result: str | None = None,
+    page_size: int | None = None,
+    paging_state: bytes | None = None,
+    columns: tuple[str, ...] | None = None,
+    session=None,
+) -> tuple[list[TestCaseRun], bytes | None]:
+    """
+    Loads test case runs of the suite run, optionally only the ones with given result
+    and only given columns (see projection_columns).
+    If page_size is set only one page starting at paging_state is loaded.
+    Returns test case runs and the paging state of the next page (None if it was the last one).
+    As rows are filtered by result after reading a page can have less than page_size rows.
+    """
+    session = session or get_session()
+    prepared = statements.get_projected(
+        _suite_run_tests_select(result), columns, session
+    )
+    stmt = _suite_run_tests_statement(
+        prepared, org_name, project_name, suite_name, branch, run_id, page_size
+    )
+    if not page_size:
+        tests = _with_result(session.execute(stmt), result)
+        return resolve_text_blobs(tests, session), None
+    rs = session.execute(stmt, paging_state=paging_state)
+    tests = _with_result(rs.current_rows, result)
+    return resolve_text_blobs(tests, session), rs.paging_state
+
+
+async def iter_suite_run_tests_async(
+    org_name: str,
+    project_name: str,
+    suite_name: str,
+    branch: str,
+    run_id: int,
+    result: str | None = None,
+    page_size: int = 1000,
+    columns: tuple[str, ...] | None = None,
+    session=None,
+):
+    """
+    Yields test case runs of the suite run (see load_suite_run_tests) in lists,
+    one per database page, as pages are fetched.
+    """
+    session = session or get_session()
+    prepared = await statements.get_projected_async(
+        _suite_run_tests_select(result), columns, session
+    )
+    stmt = _suite_run_tests_statement(
+        prepared, org_name, project_name, suite_name, branch, run_id, page_size
+    )
+    async for page in iter_pages_aio(session, stmt):
+        tests = _with_result(page, result)
+        if tests:
+            yield await resolve_text_blobs_async(tests, session)
+
+
+def _suite_run_tests_params(runs: list[TestSuiteRun], session) -> list[tuple]:
+    """
+    Reads all test case runs of given suite runs as insert parameters.
+    """
+    stmt = statements.get("suite_run_tests_select", session)
+    params = [(r.org, r.project, r.suite, r.branch, r.run_id) for r in runs]
+    results = execute_adaptive_with_args(session, stmt, params, read_concurrency)
+    errors = [error for ok, error in results if not ok]
+    if errors:
+        raise errors[0]
+    return [
+        tuple(r[c] for c in TEST_CASE_RUN_COLUMNS) for _, rows in results for r in rows
+    ]
+
+
+def backfill_failed_test_case_runs(runs: list[TestSuiteRun], session=None) -> int:
+    """
+    Copies FAIL test case runs of given suite runs into the failures table
+    (e.g. runs imported before the table existed) and removes from it tests
+    which are not FAIL anymore (runs imported before the run manifest existed
+    do not know that a re-imported test failed before, so ingest does not remove them).
+    Rows are written as they are so it is safe to run it many times.
+    Returns number of failures written and removed.
+    """
+    session = session or get_session()
+    f_stmt = statements.get("failed_test_case_run_insert", session)
+    fd_stmt = statements.get("failed_test_case_run_delete", session)
+    # keys of the rows in the failures table (same as first 9 insert parameters)
+    failures = load_failed_tests_for_suite_runs(
+        runs, session, columns=projection_columns(fields=[])
+    )
+    stored = {tuple(getattr(t, c) for c in TEST_CASE_RUN_COLUMNS[:9]) for t in failures}
+    writer = UnloggedBatchWriter(session)
+    for params in _suite_run_tests_params(runs, session):
+        if params[9] == "FAIL":
+            writer.add(params[:5], f_stmt, params)
+        elif params[:9] in stored:
+            writer.add(params[:5], fd_stmt, params[:9])
+    return writer.execute()
+
+
+def backfill_test_case_history(runs: list[TestSuiteRun], session=None) -> int:
+    """
+    Copies test case runs of given suite runs into the test case history table,
+    same as backfill_failed_test_case_runs(). Returns number of test case runs written.
+    """
+    session = session or get_session()
+    h_stmt = statements.get("test_case_history_insert", session)
+    writer = UnloggedBatchWriter(session)
+    for params in _suite_run_tests_params(runs, session):
+        writer.add(params[:4] + params[5:8], h_stmt, params)
+    return writer.execute()
+
+
 def load_test_case_runs(
     org_name: str,
     project_name: str,
@@ -96,4 +420,298 @@ def load_test_case_runs(
     # collect failures for given runs history
     test_runs = TestCaseRun.objects().filter(**query_params).limit(limit).all()
     # filter by result
-    return [x for x in test_runs if (not result) or (x.result == result)]
+    test_runs = [x for x in test_runs if (not result) or (x.result == result)]
+    return resolve_text_blobs(test_runs)
+
+
+# test case clustering columns, a query can restrict any prefix of them
+TEST_CASE_COLUMNS = ["test_package", "test_suite", "test_case", "test_config"]
+
+
+def test_case_runs_select_cql(
+    num_test_case_columns: int, columns: tuple[str, ...] | None = None
+) -> str:
+    conditions = "".join(
+        f" AND {c}=?" for c in TEST_CASE_COLUMNS[:num_test_case_columns]
+    )
+    return (
+        f"SELECT {select_list(columns)} "
+        f"FROM {TestCaseRun.column_family_name(include_keyspace=True)} "
+        f"WHERE org=? AND project=? AND suite=? AND branch=? AND run_id=?{conditions} "
+        f"LIMIT ?"
+    )
+
+
+for n in range(1, len(TEST_CASE_COLUMNS) + 1):
+    statements.register(
+        f"test_case_runs_select_{n}", partial(test_case_runs_select_cql, n)
+    )
+
+
+async def load_test_case_runs_async(
+    org_name: str,
+    project_name: str,
+    suite_name: str,
+    branch: str,
+    runs: list[int],
+    test_package: str,
+    test_class: str,
+    test_case: str,
+    test_config: str | None = None,
+    result: str | None = None,
+    limit: int = 10000,
+    columns: tuple[str, ...] | None = None,
+    session=None,
+    as_rows: bool = False,
+) -> list[TestCaseRun]:
+    """
+    Asyncio version of load_test_case_runs(): each suite run partition is queried
+    separately (and concurrently) instead of using IN on run_id.
+    With as_rows test runs are returned as plain rows (TestCaseRunRow).
+    """
+    session = session or get_session()
+    test_values = [test_package, test_class, test_case, test_config]
+    num_restricted = 0
+    while num_restricted < len(test_values) and test_values[num_restricted]:
+        num_restricted += 1
+    stmt = await statements.get_projected_async(
+        f"test_case_runs_select_{num_restricted}", columns, session
+    )
+    params = [
+        (org_name, project_name, suite_name, branch, run_id)
+        + tuple(test_values[:num_restricted])
+        + (limit,)
+        for run_id in runs
+    ]
+    results = await execute_concurrent_aio_with_args(
+        session, stmt, params, read_concurrency
+    )
+    errors = [error for ok, error in results if not ok]
+    if errors:
+        raise Exception(
+            f"{len(errors)}/{len(params)} queries failed. Example failure: {str(errors[0])}"
+        )
+    row_class = case_run_class(as_rows)
+    test_runs = [row_class(**r) for _, rows in results for r in rows]
+    # columns not restricted in the query (e.g. config without test case)
+    for column, value in zip(TEST_CASE_COLUMNS, test_values):
+        if value:
+            test_runs = [x for x in test_runs if getattr(x, column) == value]
+    # filter by result
+    test_runs = [x for x in test_runs if (not result) or (x.result == result)]
+    return await resolve_text_blobs_async(test_runs[:limit], session)
+
+
+def test_case_history_select_cql(
+    columns: tuple[str, ...] | None = None, with_config: bool = False
+) -> str:
+    # test_config is clustered after run_id so it can be restricted only
+    # together with an exact list of runs (IN), not with a range of them
+    config_cond = " AND test_config=?" if with_config else ""
+    return (
+        f"SELECT {select_list(columns)} "
+        f"FROM {TestCaseRunHistory.column_family_name(include_keyspace=True)} "
+        f"WHERE org=? AND project=? AND suite=? AND branch=? "
+        f"AND test_package=? AND test_suite=? AND test_case=? "
+        f"AND run_id IN ?{config_cond}"
+    )
+
+
+statements.register("test_case_history_select", test_case_history_select_cql)
+statements.register(
+    "test_case_config_history_select",
+    partial(test_case_history_select_cql, with_config=True),
+)
+# projections read by the check and history summary endpoints are prepared at startup
+for _name in ("test_case_history_select", "test_case_config_history_select"):
+    statements.register_projection(_name, projection_columns(fields=[]))
+    statements.register_projection(_name, projection_columns(fields=["test_group"]))
+
+
+def _test_case_history_select(test_config: str | None) -> str:
+    return (
+        "test_case_config_history_select" if test_config else "test_case_history_select"
+    )
+
+
+def _test_case_history_params(
+    org_name,
+    project_name,
+    suite_name,
+    branch,
+    runs,
+    test_package,
+    test_class,
+    test_case,
+    test_config,
+) -> tuple:
+    """
+    Returns params of the query reading given runs of a single test case,
+    restricted to the config if it is given (see _test_case_history_select).
+    """
+    params = (
+        org_name,
+        project_name,
+        suite_name,
+        branch,
+        test_package,
+        test_class,
+        test_case,
+        list(runs),
+    )
+    return params + ((test_config,) if test_config else ())
+
+
+def _filter_test_case_history(
+    rows,
+    result: str | None,
+    limit: int,
+    row_class=TestCaseRun,
+) -> list[TestCaseRun]:
+    # limit is applied after filtering by result so that runs with other results
+    # do not take the place of the matching ones
+    test_runs = [row_class(**r) for r in rows if not result or r["result"] == result]
+    return test_runs[:limit]
+
+
+def load_test_case_history(
+    org_name: str,
+    project_name: str,
+    suite_name: str,
+    branch: str,
+    runs: list[int],
+    test_package: str,
+    test_class: str,
+    test_case: str,
+    test_config: str | None = None,
+    result: str | None = None,
+    limit: int = 10000,
+    columns: tuple[str, ...] | None = None,
+    session=None,
+) -> list[TestCaseRun]:
+    """
+    Same as load_test_case_runs() but for a single test case (test class and case are required):
+    runs are read from the test case history partition with one query
+    (restricted to given runs) instead of a query per suite run.
+    Runs are returned latest first.
+    """
+    if not runs:
+        return []
+    session = session or get_session()
+    stmt = statements.get_projected(
+        _test_case_history_select(test_config), columns, session
+    )
+    params = _test_case_history_params(
+        org_name,
+        project_name,
+        suite_name,
+        branch,
+        runs,
+        test_package,
+        test_class,
+        test_case,
+        test_config,
+    )
+    rows = session.execute(stmt, params)
+    test_runs = _filter_test_case_history(rows, result, limit)
+    return resolve_text_blobs(test_runs, session)
+
+
+async def load_test_case_history_async(
+    org_name: str,
+    project_name: str,
+    suite_name: str,
+    branch: str,
+    runs: list[int],
+    test_package: str,
+    test_class: str,
+    test_case: str,
+    test_config: str | None = None,
+    result: str | None = None,
+    limit: int = 10000,
+    columns: tuple[str, ...] | None = None,
+    session=None,
+    as_rows: bool = False,
+) -> list[TestCaseRun]:
+    """
+    Asyncio version of load_test_case_history().
+    With as_rows test runs are returned as plain rows (TestCaseRunRow).
+    """
+    if not runs:
+        return []
+    session = session or get_session()
+    stmt = await statements.get_projected_async(
+        _test_case_history_select(test_config), columns, session
+    )
+    params = _test_case_history_params(
+        org_name,
+        project_name,
+        suite_name,
+        branch,
+        runs,
+        test_package,
+        test_class,
+        test_case,
+        test_config,
+    )
+    rows = await execute_aio(session, stmt, params)
+    test_runs = _filter_test_case_history(rows, result, limit, case_run_class(as_rows))
+    return await resolve_text_blobs_async(test_runs, session)
+
+
+async def load_test_cases_history_async(
+    org_name: str,
+    project_name: str,
+    suite_name: str,
+    branch: str,
+    runs: list[int],
+    test_cases: list[tuple],
+    result: str | None = None,
+    limit: int = 10000,
+    columns: tuple[str, ...] | None = None,
+    session=None,
+    as_rows: bool = False,
+) -> list[list[TestCaseRun]]:
+    """
+    Loads history of many test cases (package, class, case, config or None) at once:
+    a query per test case (see load_test_case_history) run with adaptive concurrency.
+    Returns lists of test case runs (or plain rows if as_rows) in the order of test cases.
+    """
+    if not runs:
+        return [[] for _ in test_cases]
+    session = session or get_session()
+    names = {_test_case_history_select(config) for *_, config in test_cases}
+    stmts = {
+        name: await statements.get_projected_async(name, columns, session)
+        for name in names
+    }
+    queries = [
+        (
+            stmts[_test_case_history_select(config)],
+            _test_case_history_params(
+                org_name,
+                project_name,
+                suite_name,
+                branch,
+                runs,
+                package,
+                cls,
+                case,
+                config,
+            ),
+        )
+        for package, cls, case, config in test_cases
+    ]
+    results = await execute_concurrent_aio(session, queries, read_concurrency)
+    errors = [error for ok, error in results if not ok]
+    if errors:
+        raise Exception(
+            f"{len(errors)}/{len(queries)} queries failed. Example failure: {str(errors[0])}"
+        )
+    row_class = case_run_class(as_rows)
+    histories = [
+        _filter_test_case_history(rows, result, limit, row_class) for _, rows in results
+    ]
+    # blobs of all the histories are resolved together
+    await resolve_text_blobs_async([t for h in histories for t in h], session)
+    return histories
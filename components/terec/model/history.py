@@ -0,0 +1,88 @@
+"""
+Summary of test case histories computed on the server: instead of all the test runs
+(with their suite runs) a client gets per test counts of results, first and last failure
+and a vector of results aligned to the list of run ids, one character per run.
+Histories are put into a (tests x runs) matrix of result codes so the summaries
+are computed with NumPy for all the tests at once.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from terec.model.results import TestCaseRun
+
+NO_RUN, PASS, SKIP, FAIL = range(4)
+# codes are ordered so that the worst result wins if a test has many runs in a suite run
+# (e.g. many configs)
+RESULT_CODES = {"PASS": PASS, "SKIP": SKIP, "FAIL": FAIL}
+# character of each result code in the results vector
+RESULT_CHARS = np.frombuffer(b"_PSF", dtype=np.uint8)
+
+
+@dataclass
+class HistorySummary:
+    num_pass: int
+    num_fail: int
+    num_skip: int
+    first_fail_run_id: int | None
+    last_fail_run_id: int | None
+    test_group: str | None
+    results: str  # one of _PSF for each run id
+
+
+def results_matrix(
+    histories: list[list[TestCaseRun]], run_ids: list[int]
+) -> np.ndarray:
+    """
+    Returns matrix of result codes with a row per history and a column per run id.
+    Runs of other suite runs and unknown results are ignored.
+    """
+    columns = {run_id: i for i, run_id in enumerate(run_ids)}
+    rows, cols, codes = [], [], []
+    for i, history in enumerate(histories):
+        for test in history:
+            j = columns.get(test.run_id)
+            code = RESULT_CODES.get(test.result)
+            if j is not None and code is not None:
+                rows.append(i)
+                cols.append(j)
+                codes.append(code)
+    matrix = np.zeros((len(histories), len(run_ids)), dtype=np.uint8)
+    np.maximum.at(matrix, (rows, cols), np.array(codes, dtype=np.uint8))
+    return matrix
+
+
+def summarize_history(
+    histories: list[list[TestCaseRun]], run_ids: list[int]
+) -> list[HistorySummary]:
+    """
+    Summarizes histories of test cases in given suite runs, run ids are expected
+    to be ordered from the latest one (as in results vectors).
+    Results are counted per suite run, the worst one if a test has more runs in it.
+    """
+    if not run_ids:
+        return [HistorySummary(0, 0, 0, None, None, None, "") for _ in histories]
+    matrix = results_matrix(histories, run_ids)
+    counts = {
+        code: np.count_nonzero(matrix == code, axis=1) for code in (PASS, SKIP, FAIL)
+    }
+    failed = matrix == FAIL
+    has_failed = failed.any(axis=1)
+    last_fail = np.argmax(failed, axis=1)
+    first_fail = len(run_ids) - 1 - np.argmax(failed[:, ::-1], axis=1)
+    results = RESULT_CHARS[matrix]
+    summaries = []
+    for i, history in enumerate(histories):
+        summaries.append(
+            HistorySummary(
+                num_pass=int(counts[PASS][i]),
+                num_fail=int(counts[FAIL][i]),
+                num_skip=int(counts[SKIP][i]),
+                first_fail_run_id=run_ids[first_fail[i]] if has_failed[i] else None,
+                last_fail_run_id=run_ids[last_fail[i]] if has_failed[i] else None,
+                test_group=next((t.test_group for t in history if t.test_group), None),
+                results=results[i].tobytes().decode("ascii"),
+            )
+        )
+    return summaries
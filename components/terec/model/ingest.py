@@ -0,0 +1,270 @@
+import asyncio
+from dataclasses import dataclass
+from functools import partial
+
+from cassandra.cqlengine.connection import get_session
+from codetiming import Timer
+from loguru import logger
+
+from terec.database.batch import MAX_BATCH_BYTES, UnloggedBatchWriter
+from terec.database.statements import statements
+from terec.model.aggregates import (
+    aggregates_delta,
+    update_suite_run_aggregates,
+    update_suite_run_aggregates_async,
+)
+from terec.model.blobs import TextBlobs, mark_blobs_written, new_blob_rows
+from terec.model.manifest import (
+    ManifestEntry,
+    case_key,
+    content_hash,
+    load_run_manifest,
+    load_run_manifest_async,
+    manifest_params,
+)
+from terec.model.results import (
+    FailedTestCaseRun,
+    TestCaseRunHistory,
+    TestSuiteRun,
+    TestCaseRun,
+)
+from terec.model.text_compression import project_dicts
+from terec.regression.fingerprint import failure_fingerprint
+
+TEXT_FIELD_LIMIT = 16384
+
+TEST_CASE_RUN_COLUMNS = [
+    "org",
+    "project",
+    "suite",
+    "branch",
+    "run_id",
+    "test_package",
+    "test_suite",
+    "test_case",
+    "test_config",
+    "result",
+    "test_group",
+    "tstamp",
+    "duration_ms",
+    "stdout",
+    "stderr",
+    "error_stacktrace",
+    "error_details",
+    "skip_details",
+    "stdout_hash",
+    "stderr_hash",
+    "error_stacktrace_hash",
+    "error_details_hash",
+    "failure_fingerprint",
+]
+BLOB_HASH_COLUMNS = [
+    TEST_CASE_RUN_COLUMNS.index(f"{field}_hash")
+    for field in ["stdout", "stderr", "error_stacktrace", "error_details"]
+]
+
+
+@dataclass
+class IngestCounts:
+    written: int = 0
+    skipped: int = 0  # not changed since the previous import
+
+    @property
+    def total(self) -> int:
+        return self.written + self.skipped
+
+    def __add__(self, other: "IngestCounts") -> "IngestCounts":
+        return IngestCounts(self.written + other.written, self.skipped + other.skipped)
+
+
+def limit_text_field(text: str | None) -> str | None:
+    if text is None:
+        return None
+    return text[:TEXT_FIELD_LIMIT] if len(text) > TEXT_FIELD_LIMIT else text
+
+
+def test_case_run_insert_cql(model=TestCaseRun) -> str:
+    num_cols = len(TEST_CASE_RUN_COLUMNS)
+    return (
+        f"INSERT INTO {model.column_family_name(include_keyspace=True)} "
+        f"({', '.join(TEST_CASE_RUN_COLUMNS)})"
+        f"VALUES({','.join('?' * num_cols)})"
+        f"USING TIMESTAMP ?"
+    )
+
+
+def failed_test_case_run_delete_cql() -> str:
+    return (
+        f"DELETE FROM {FailedTestCaseRun.column_family_name(include_keyspace=True)} "
+        f"WHERE org=? AND project=? AND suite=? AND branch=? AND run_id=? "
+        f"AND test_package=? AND test_suite=? AND test_case=? AND test_config=?"
+    )
+
+
+statements.register("test_case_run_insert", test_case_run_insert_cql)
+statements.register(
+    "failed_test_case_run_insert", partial(test_case_run_insert_cql, FailedTestCaseRun)
+)
+statements.register("failed_test_case_run_delete", failed_test_case_run_delete_cql)
+statements.register(
+    "test_case_history_insert", partial(test_case_run_insert_cql, TestCaseRunHistory)
+)
+
+
+def test_case_run_params(suite_run: TestSuiteRun, test, blobs: TextBlobs) -> tuple:
+    """
+    Builds insert parameters for a test case run (e.g. TestCaseRunInfo) of given suite run.
+    Test timestamp defaults to the suite run timestamp.
+    Big texts are collected into blobs and only their hashes are kept in the row.
+    Failed tests get their failure fingerprint.
+    """
+    timestamp = test.tstamp or suite_run.tstamp
+    error_stacktrace = limit_text_field(test.error_stacktrace)
+    error_details = limit_text_field(test.error_details)
+    fingerprint = None
+    if test.result.value == "FAIL":
+        fingerprint = failure_fingerprint(error_stacktrace, error_details)
+    stdout, stdout_hash = blobs.add(limit_text_field(test.stdout))
+    stderr, stderr_hash = blobs.add(limit_text_field(test.stderr))
+    stacktrace, stacktrace_hash = blobs.add(error_stacktrace)
+    details, details_hash = blobs.add(error_details)
+    return (
+        suite_run.org,
+        suite_run.project,
+        suite_run.suite,
+        suite_run.branch,
+        suite_run.run_id,
+        test.test_package,
+        test.test_suite,
+        test.test_case,
+        test.test_config,
+        test.result.value,
+        test.test_group,
+        timestamp,
+        test.duration_ms,
+        stdout,
+        stderr,
+        stacktrace,
+        details,
+        limit_text_field(test.skip_details),
+        stdout_hash,
+        stderr_hash,
+        stacktrace_hash,
+        details_hash,
+        fingerprint,
+    )
+
+
+def write_test_case_runs(
+    suite_run: TestSuiteRun,
+    tests: list,
+    session=None,
+    max_batch_bytes: int = MAX_BATCH_BYTES,
+) -> IngestCounts:
+    """
+    Writes test case runs (objects with TestCaseRun fields e.g. TestCaseRunInfo) for given suite run.
+    All the rows share the suite run partition so they are written as UNLOGGED batches
+    of at most max_batch_bytes (0 means one request per row).
+    Rows not changed since the previous import of the run (see terec.model.manifest)
+    are skipped. Suite run aggregates (counts, tests duration) are updated with the difference
+    against results of the same tests already stored, so re-sending tests does not change them.
+    Session can be explicitly provided or will be taken from cqlengine.
+    Returns numbers of test case runs written and skipped.
+    """
+    session = session or get_session()
+    existing = load_run_manifest(suite_run, tests, session)
+    changed, blob_rows, blobs_writer, writer, manifest_writer = _test_case_runs_writers(
+        suite_run, tests, existing, session, max_batch_bytes
+    )
+    with Timer(
+        logger=logger.debug,
+        initial_text=f"Inserting {len(changed)} of {len(tests)} test case runs",
+        text="Elapsed time for inserting test case runs: {milliseconds:.0f} ms",
+    ):
+        # blobs go first so that rows never point to missing text
+        blobs_writer.execute()
+        mark_blobs_written(blob_rows)
+        writer.execute()
+        # manifest entries go last so that a failed row is not skipped on retry
+        manifest_writer.execute()
+    update_suite_run_aggregates(suite_run, aggregates_delta(existing, changed), session)
+    return IngestCounts(written=len(changed), skipped=len(tests) - len(changed))
+
+
+async def write_test_case_runs_async(
+    suite_run: TestSuiteRun,
+    tests: list,
+    session=None,
+    max_batch_bytes: int = MAX_BATCH_BYTES,
+) -> IngestCounts:
+    """
+    Asyncio version of write_test_case_runs().
+    """
+    session = session or get_session()
+    existing = await load_run_manifest_async(suite_run, tests, session)
+    # texts are compressed with the latest dictionary, load it without blocking
+    await project_dicts.get_latest_async(suite_run.org, suite_run.project, session)
+    # hashing, fingerprints and compression are cpu bound so they should not block the event loop
+    changed, blob_rows, blobs_writer, writer, manifest_writer = await asyncio.to_thread(
+        _test_case_runs_writers, suite_run, tests, existing, session, max_batch_bytes
+    )
+    await blobs_writer.execute_aio()
+    mark_blobs_written(blob_rows)
+    await writer.execute_aio()
+    await manifest_writer.execute_aio()
+    delta = aggregates_delta(existing, changed)
+    await update_suite_run_aggregates_async(suite_run, delta, session)
+    return IngestCounts(written=len(changed), skipped=len(tests) - len(changed))
+
+
+def _test_case_runs_writers(
+    suite_run: TestSuiteRun,
+    tests: list,
+    existing: dict[tuple, ManifestEntry],
+    session,
+    max_batch_bytes: int,
+) -> tuple[
+    list, list[tuple], UnloggedBatchWriter, UnloggedBatchWriter, UnloggedBatchWriter
+]:
+    """
+    Returns tests changed since the previous import, new text blobs rows, their writer,
+    the writer of changed test case runs and the writer of their manifest entries.
+    Changed runs are also written to the test case history table and FAIL runs
+    to the failures table (and removed from it when a test stored as FAIL
+    is re-imported with other result).
+    Manifest entries have to be written only after all the rows were written:
+    otherwise a row which failed to be written would be skipped as unchanged on retry.
+    If the same test is given more than once the last one wins.
+    """
+    p_stmt = statements.get("test_case_run_insert", session)
+    m_stmt = statements.get("manifest_insert", session)
+    f_stmt = statements.get("failed_test_case_run_insert", session)
+    fd_stmt = statements.get("failed_test_case_run_delete", session)
+    h_stmt = statements.get("test_case_history_insert", session)
+    blobs = TextBlobs(suite_run.org, suite_run.project)
+    rows = {case_key(t): (t, test_case_run_params(suite_run, t, blobs)) for t in tests}
+    writer = UnloggedBatchWriter(session, max_batch_bytes=max_batch_bytes)
+    manifest_writer = UnloggedBatchWriter(session, max_batch_bytes=max_batch_bytes)
+    changed, blob_hashes = [], set()
+    for key, (test, params) in rows.items():
+        row_hash = content_hash(params)
+        entry = existing.get(key)
+        if entry and entry.content_hash == row_hash:
+            continue
+        changed.append(test)
+        blob_hashes.update(params[i] for i in BLOB_HASH_COLUMNS if params[i])
+        writer.add(params[:5], p_stmt, params)
+        manifest_writer.add(params[:5], m_stmt, manifest_params(params, row_hash))
+        writer.add(("history",) + params[:4] + params[5:8], h_stmt, params)
+        if params[9] == "FAIL":
+            writer.add(("failures",) + params[:5], f_stmt, params)
+        elif entry and entry.result == "FAIL":
+            writer.add(("failures",) + params[:5], fd_stmt, params[:9])
+    blobs.retain(blob_hashes)
+    blobs_writer = UnloggedBatchWriter(session)
+    blob_rows = new_blob_rows(blobs, session)
+    if blob_rows:
+        b_stmt = statements.get("text_blob_insert", session)
+        for params in blob_rows:
+            blobs_writer.add(params[:3], b_stmt, params)
+    return changed, blob_rows, blobs_writer, writer, manifest_writer
@@ -0,0 +1,95 @@
+from datetime import datetime, timezone
+
+from cassandra.cqlengine import columns
+from cassandra.cqlengine.models import Model
+
+JOB_TTL = 7 * 24 * 3600
+
+
+class IngestJob(Model):
+    """
+    Background import of test case runs into a suite run.
+    Tests are queued in chunks (one message per chunk) and each processed chunk
+    stores its result as IngestJobChunk, progress of the job is combined from them
+    (see job_progress). Jobs are kept for a week and then expire.
+    """
+
+    __options__ = {"default_time_to_live": JOB_TTL}
+
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+    job_id = columns.UUID(primary_key=True)
+    org = columns.Text()
+    project = columns.Text()
+    suite = columns.Text()
+    branch = columns.Text()
+    run_id = columns.Integer()
+    status = columns.Text()
+    rows_total = columns.Integer()
+    rows_written = columns.Integer()
+    rows_skipped = columns.Integer()  # not changed since the previous import
+    rows_failed = columns.Integer()
+    num_chunks = columns.Integer()
+    error = columns.Text()
+    created_at = columns.DateTime()
+    updated_at = columns.DateTime()
+
+    def update_progress(self, **kwargs) -> None:
+        self.update(updated_at=datetime.now(timezone.utc), **kwargs)
+
+
+class IngestJobChunk(Model):
+    """
+    Result of a processed chunk of an ingest job. Each chunk writes only its own row,
+    so chunks can be processed concurrently and re-processed (e.g. redelivered).
+    """
+
+    __options__ = {"default_time_to_live": JOB_TTL}
+
+    job_id = columns.UUID(partition_key=True)
+    chunk = columns.Integer(primary_key=True)
+    rows_written = columns.Integer()
+    rows_skipped = columns.Integer()
+    rows_failed = columns.Integer()
+    error = columns.Text()
+    updated_at = columns.DateTime()
+
+
+def job_progress(
+    job: IngestJob, chunks: list[IngestJobChunk], timeout_sec: float, now: datetime
+) -> dict:
+    """
+    Returns status, rows counts, error and update time of the job combined from its chunks.
+    Job without progress for timeout_sec (e.g. its messages were lost with
+    the in-process queue on restart) is reported as FAILED.
+    """
+    progress = {
+        "rows_written": sum(c.rows_written or 0 for c in chunks),
+        "rows_skipped": sum(c.rows_skipped or 0 for c in chunks),
+        "rows_failed": sum(c.rows_failed or 0 for c in chunks),
+        "error": job.error or next((c.error for c in chunks if c.error), None),
+        "updated_at": max(
+            _utc(t) for t in [job.updated_at] + [c.updated_at for c in chunks]
+        ),
+    }
+    if job.status == IngestJob.FAILED:
+        status = IngestJob.FAILED
+    elif len(chunks) >= job.num_chunks:
+        status = IngestJob.FAILED if progress["rows_failed"] else IngestJob.DONE
+    elif (_utc(now) - progress["updated_at"]).total_seconds() > timeout_sec:
+        status = IngestJob.FAILED
+        progress["error"] = progress["error"] or (
+            f"No progress for {timeout_sec:.0f} seconds: "
+            f"{len(chunks)} of {job.num_chunks} chunks processed."
+        )
+    else:
+        status = IngestJob.RUNNING if chunks else IngestJob.QUEUED
+    return {"status": status, **progress}
+
+
+def _utc(t: datetime) -> datetime:
+    # datetimes are read from the database without timezone (as UTC)
+    return t if t.tzinfo else t.replace(tzinfo=timezone.utc)
@@ -0,0 +1,145 @@
+"""
+Per-run manifest of stored test case runs: result, duration and hash of the content
+of each row, kept in a compact table (no texts) partitioned by suite run.
+Ingest reads the manifest entries of the tests it is going to write so that
+rows which did not change (e.g. retried or repeated import of the same run) are skipped
+and only the changed ones are written and counted in suite run aggregates.
+"""
+
+import hashlib
+
+from typing import NamedTuple
+
+from cassandra.cqlengine import columns
+from cassandra.cqlengine.connection import get_session
+from cassandra.cqlengine.models import Model
+
+from terec.database.aio import execute_concurrent_aio_with_args
+from terec.database.concurrency import execute_adaptive_with_args, read_concurrency
+from terec.database.statements import statements
+from terec.model.results import TestSuiteRun
+
+# number of test keys in IN clause of one query
+MANIFEST_QUERY_SIZE = 100
+
+
+class TestSuiteRunManifest(Model):
+    __test__ = False
+    org = columns.Text(partition_key=True)
+    project = columns.Text(partition_key=True)
+    suite = columns.Text(partition_key=True)
+    branch = columns.Text(partition_key=True)
+    run_id = columns.Integer(partition_key=True)
+    test_package = columns.Text(primary_key=True, clustering_order="ASC")
+    test_suite = columns.Text(primary_key=True, clustering_order="ASC")
+    test_case = columns.Text(primary_key=True, clustering_order="ASC")
+    test_config = columns.Text(primary_key=True, clustering_order="ASC")
+    result = columns.Text()
+    duration_ms = columns.Integer()
+    content_hash = columns.Text()
+
+
+class ManifestEntry(NamedTuple):
+    result: str
+    duration_ms: int | None
+    content_hash: str | None
+
+
+def manifest_select_cql() -> str:
+    return (
+        f"SELECT test_package, test_suite, test_case, test_config, "
+        f"result, duration_ms, content_hash "
+        f"FROM {TestSuiteRunManifest.column_family_name(include_keyspace=True)} "
+        f"WHERE org=? AND project=? AND suite=? AND branch=? AND run_id=? "
+        f"AND (test_package, test_suite, test_case, test_config) IN ?"
+    )
+
+
+def manifest_insert_cql() -> str:
+    return (
+        f"INSERT INTO {TestSuiteRunManifest.column_family_name(include_keyspace=True)} "
+        f"(org, project, suite, branch, run_id, test_package, test_suite, test_case, "
+        f"test_config, result, duration_ms, content_hash) "
+        f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+
+
+statements.register("manifest_select", manifest_select_cql)
+statements.register("manifest_insert", manifest_insert_cql)
+
+
+def case_key(test) -> tuple:
+    return test.test_package, test.test_suite, test.test_case, test.test_config
+
+
+def content_hash(row_params: tuple) -> str:
+    """
+    Hash of test case run insert parameters (big texts are represented by their hashes).
+    """
+    return hashlib.blake2b(repr(row_params).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def manifest_params(row_params: tuple, row_hash: str) -> tuple:
+    """
+    Manifest insert parameters for test case run insert parameters
+    (see terec.model.ingest.TEST_CASE_RUN_COLUMNS).
+    """
+    return row_params[:10] + (row_params[12], row_hash)
+
+
+def _run_key(suite_run: TestSuiteRun) -> tuple:
+    return (
+        suite_run.org,
+        suite_run.project,
+        suite_run.suite,
+        suite_run.branch,
+        suite_run.run_id,
+    )
+
+
+def _manifest_query_params(suite_run: TestSuiteRun, tests: list) -> list[tuple]:
+    keys = list({case_key(t) for t in tests})
+    step = MANIFEST_QUERY_SIZE
+    run_key = _run_key(suite_run)
+    return [run_key + (keys[i : i + step],) for i in range(0, len(keys), step)]
+
+
+def _manifest_entries(results) -> dict[tuple, ManifestEntry]:
+    errors = [error for ok, error in results if not ok]
+    if errors:
+        raise errors[0]
+    return {
+        (r["test_package"], r["test_suite"], r["test_case"], r["test_config"]): (
+            ManifestEntry(r["result"], r["duration_ms"], r["content_hash"])
+        )
+        for _, rows in results
+        for r in rows
+    }
+
+
+def load_run_manifest(
+    suite_run: TestSuiteRun, tests: list, session=None
+) -> dict[tuple, ManifestEntry]:
+    """
+    Returns manifest entries of given tests already stored in the suite run by test key.
+    """
+    session = session or get_session()
+    stmt = statements.get("manifest_select", session)
+    params = _manifest_query_params(suite_run, tests)
+    return _manifest_entries(
+        execute_adaptive_with_args(session, stmt, params, read_concurrency)
+    )
+
+
+async def load_run_manifest_async(
+    suite_run: TestSuiteRun, tests: list, session=None
+) -> dict[tuple, ManifestEntry]:
+    """
+    Asyncio version of load_run_manifest().
+    """
+    session = session or get_session()
+    stmt = await statements.get_async("manifest_select", session)
+    params = _manifest_query_params(suite_run, tests)
+    return _manifest_entries(
+        await execute_concurrent_aio_with_args(session, stmt, params, read_concurrency)
+    )
@@ -0,0 +1,30 @@
+"""
+One-off schema migrations which are not safe to run on every startup of the API
+(e.g. DROP statements raced by many workers). Run once after upgrade:
+
+    python -m terec.model.migrations
+"""
+
+from loguru import logger
+
+from terec.model import results
+
+
+def drop_obsolete_indexes(cassandra):
+    """
+    Drops secondary indexes which are not declared by the model anymore
+    (see results.OBSOLETE_INDEXES). Safe to repeat.
+    """
+    keyspace = results.TestCaseRun._get_keyspace()
+    for index_name in results.OBSOLETE_INDEXES:
+        logger.info("dropping index {}.{} if exists", keyspace, index_name)
+        cassandra.execute(f"DROP INDEX IF EXISTS {keyspace}.{index_name}")
+
+
+if __name__ == "__main__":
+    from terec.database import cassandra_session
+    from terec.model.util import cqlengine_init
+
+    cassandra = cassandra_session()
+    cqlengine_init(cassandra)
+    drop_obsolete_indexes(cassandra)
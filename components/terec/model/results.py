@@ -53,6 +53,7 @@ class TestSuiteRun(Model):
     skip_count = columns.Integer()
     total_count = columns.Integer()
     duration_sec = columns.Integer()
+    tests_duration_ms = columns.BigInt()  # sum of test case runs durations
     status = columns.Text()  # CI-provided status of the run
     ignore = columns.Boolean(
         default=False
@@ -90,7 +91,7 @@ class TestCaseRun(Model):
     test_suite = columns.Text(primary_key=True, clustering_order="ASC")
     test_case = columns.Text(primary_key=True, clustering_order="ASC")
     test_config = columns.Text(primary_key=True, clustering_order="ASC")
-    result = columns.Text(required=True, index=True)  # PASSed, FAILed, SKIPped
+    result = columns.Text(required=True)  # PASSed, FAILed, SKIPped
     test_group = columns.Text()
     tstamp = columns.DateTime()
     duration_ms = columns.Integer()
@@ -99,6 +100,13 @@ class TestCaseRun(Model):
     error_stacktrace = columns.Text()
     error_details = columns.Text()
     skip_details = columns.Text()
+    # hashes of big texts stored in TextBlob table (see terec.model.blobs)
+    stdout_hash = columns.Text()
+    stderr_hash = columns.Text()
+    error_stacktrace_hash = columns.Text()
+    error_details_hash = columns.Text()
+    # normalized failure fingerprint of FAIL runs (see terec.regression.fingerprint)
+    failure_fingerprint = columns.Text()
 
     def test_suite_str(self) -> str:
         return f"{self.org}::{self.project}::{self.suite}"
@@ -131,3 +139,71 @@ class TestCaseRun(Model):
 
     def is_same_test_case_and_config(self, other: TestCaseRun):
         return self.test_config == other.test_config and self.is_same_test_case(other)
+
+
+class TestCaseRunRow(dict):
+    """
+    Test case run read as a plain row (column -> value) with attribute access.
+    Much cheaper to build than TestCaseRun for read only paths (e.g. API responses).
+    """
+
+    __test__ = False
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+# secondary indexes created by older versions and no longer used
+# (failures of runs are read from FailedTestCaseRun), dropped once
+# by running the migration: python -m terec.model.migrations
+OBSOLETE_INDEXES = ["test_case_run_result_idx"]
+
+
+class FailedTestCaseRun(TestCaseRun):
+    """
+    Copy of FAIL test case runs of a suite run (same columns and keys as TestCaseRun),
+    written at ingest so that failures of runs are read from a single small partition
+    instead of using a secondary index on result.
+    """
+
+    __test__ = False
+
+
+class TestCaseRunHistory(Model):
+    """
+    Copy of test case runs partitioned by the test case (and suite branch) instead of
+    the suite run, latest runs first, so history of a test is read with one slice query.
+    Columns are the same as in TestCaseRun.
+    """
+
+    __test__ = False
+    org = columns.Text(partition_key=True)
+    project = columns.Text(partition_key=True)
+    suite = columns.Text(partition_key=True)
+    branch = columns.Text(partition_key=True)
+    test_package = columns.Text(partition_key=True)
+    test_suite = columns.Text(partition_key=True)
+    test_case = columns.Text(partition_key=True)
+    run_id = columns.Integer(primary_key=True, clustering_order="DESC")
+    test_config = columns.Text(primary_key=True, clustering_order="ASC")
+    result = columns.Text(required=True)
+    test_group = columns.Text()
+    tstamp = columns.DateTime()
+    duration_ms = columns.Integer()
+    stdout = columns.Text()
+    stderr = columns.Text()
+    error_stacktrace = columns.Text()
+    error_details = columns.Text()
+    skip_details = columns.Text()
+    stdout_hash = columns.Text()
+    stderr_hash = columns.Text()
+    error_stacktrace_hash = columns.Text()
+    error_details_hash = columns.Text()
+    failure_fingerprint = columns.Text()
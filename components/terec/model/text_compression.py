@@ -0,0 +1,213 @@
+"""
+Zstd compression of big text blobs (stdout, stderr, stacktraces) with per-project dictionaries.
+Texts of a project share a lot of structure (package names, frames of the same test framework)
+so a dictionary trained on sampled failures of the project compresses them much better
+than plain zstd, especially the short ones.
+Dictionaries are immutable and identified by their zstd dict_id, every compressed blob
+keeps dict_id it was compressed with (0 means no dictionary) so a project can train
+a new dictionary at any time and old blobs are still readable.
+"""
+
+import datetime
+import threading
+import time
+
+import zstandard
+
+from cassandra.cqlengine import columns
+from cassandra.cqlengine.connection import get_session
+from cassandra.cqlengine.models import Model
+from loguru import logger
+
+from terec.database.aio import execute_aio
+from terec.database.statements import statements
+
+COMPRESSION_LEVEL = 3
+DICT_SIZE = 64 * 1024
+# zstd needs many samples to train a useful dictionary
+TRAIN_MIN_SAMPLES = 20
+# how often latest dictionary of a project is checked (new one could be trained by other process)
+LATEST_DICT_TTL_SEC = 60
+NO_DICT = 0
+
+
+class CompressionDict(Model):
+    org = columns.Text(partition_key=True)
+    project = columns.Text(partition_key=True)
+    dict_id = columns.BigInt(primary_key=True)
+    tstamp = columns.DateTime()
+    samples = columns.Integer()
+    data = columns.Blob()
+
+
+def compression_dict_select_cql() -> str:
+    return (
+        f"SELECT dict_id, tstamp, data "
+        f"FROM {CompressionDict.column_family_name(include_keyspace=True)} "
+        f"WHERE org=? AND project=?"
+    )
+
+
+statements.register("compression_dict_select", compression_dict_select_cql)
+
+
+class _ProjectDicts:
+    """
+    Cache of project dictionaries: all known ones by id and the latest one per project.
+    """
+
+    def __init__(self, timer=time.monotonic):
+        self.timer = timer
+        self.dicts = {}
+        self.latest = {}
+        self.lock = threading.Lock()
+
+    def get_latest(self, org: str, project: str, session=None):
+        """
+        Returns latest dictionary of the project or None if it has none.
+        """
+        with self.lock:
+            latest = self.latest.get((org, project))
+        if latest and self.timer() - latest[0] < LATEST_DICT_TTL_SEC:
+            return latest[1]
+        return self.load(org, project, session)
+
+    def get(self, org: str, project: str, dict_id: int, session=None):
+        with self.lock:
+            d = self.dicts.get((org, project, dict_id))
+        if d is None:
+            self.load(org, project, session)
+            with self.lock:
+                d = self.dicts.get((org, project, dict_id))
+        if d is None:
+            raise KeyError(f"Compression dictionary {dict_id} of {org}/{project}")
+        return d
+
+    def load(self, org: str, project: str, session=None):
+        """
+        Loads all dictionaries of the project and returns the latest one.
+        """
+        session = session or get_session()
+        stmt = statements.get("compression_dict_select", session)
+        return self._add_loaded(org, project, session.execute(stmt, (org, project)))
+
+    async def load_async(self, org: str, project: str, session=None):
+        """
+        Asyncio version of load().
+        """
+        session = session or get_session()
+        stmt = await statements.get_async("compression_dict_select", session)
+        rows = await execute_aio(session, stmt, (org, project))
+        return self._add_loaded(org, project, rows)
+
+    async def get_latest_async(self, org: str, project: str, session=None):
+        """
+        Asyncio version of get_latest(). The latest dictionary is refreshed ahead of
+        its expiry so that get_latest() called right after it does not query the database
+        (async code calls it before compressing texts).
+        """
+        with self.lock:
+            latest = self.latest.get((org, project))
+        if latest and self.timer() - latest[0] < LATEST_DICT_TTL_SEC / 2:
+            return latest[1]
+        return await self.load_async(org, project, session)
+
+    async def preload_async(
+        self, org: str, project: str, dict_ids: set[int], session=None
+    ) -> None:
+        """
+        Loads dictionaries of the project unless all given ones are already known,
+        so that get() does not query the database (async code calls it before decompressing).
+        """
+        with self.lock:
+            known = all((org, project, i) in self.dicts for i in dict_ids)
+        if not known:
+            await self.load_async(org, project, session)
+
+    def _add_loaded(self, org: str, project: str, rows):
+        latest = None
+        rows = sorted(rows, key=lambda r: r["tstamp"])
+        with self.lock:
+            for row in rows:
+                latest = zstandard.ZstdCompressionDict(row["data"])
+                latest.precompute_compress(level=COMPRESSION_LEVEL)
+                self.dicts[(org, project, row["dict_id"])] = latest
+            self.latest[(org, project)] = (self.timer(), latest)
+        return latest
+
+    def put(self, org: str, project: str, d) -> None:
+        """
+        Sets the latest dictionary of the project (None means the project has no dictionary).
+        """
+        with self.lock:
+            if d is not None:
+                self.dicts[(org, project, d.dict_id())] = d
+            self.latest[(org, project)] = (self.timer(), d)
+
+    def invalidate(self, org: str, project: str) -> None:
+        with self.lock:
+            self.latest.pop((org, project), None)
+
+
+project_dicts = _ProjectDicts()
+
+
+def compress_text(org: str, project: str, text: str, session=None) -> tuple[int, bytes]:
+    """
+    Compresses text with the latest dictionary of the project.
+    Returns (dict_id, compressed data).
+    """
+    d = project_dicts.get_latest(org, project, session)
+    if d is None:
+        compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL)
+        return NO_DICT, compressor.compress(text.encode("utf-8"))
+    compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL, dict_data=d)
+    return d.dict_id(), compressor.compress(text.encode("utf-8"))
+
+
+def decompress_text(
+    org: str, project: str, dict_id: int, data: bytes, session=None
+) -> str:
+    if dict_id == NO_DICT:
+        decompressor = zstandard.ZstdDecompressor()
+    else:
+        d = project_dicts.get(org, project, dict_id, session)
+        decompressor = zstandard.ZstdDecompressor(dict_data=d)
+    return decompressor.decompress(data).decode("utf-8")
+
+
+def train_project_dictionary(
+    org: str, project: str, samples: list[str], dict_size: int = DICT_SIZE
+) -> CompressionDict:
+    """
+    Trains dictionary on sample texts (e.g. stacktraces of failed tests) and makes it
+    the one used to compress new texts of the project.
+    Raises ValueError if there are not enough samples to train a dictionary.
+    """
+    samples = [s.encode("utf-8") for s in samples if s]
+    if len(samples) < TRAIN_MIN_SAMPLES:
+        raise ValueError(
+            f"At least {TRAIN_MIN_SAMPLES} samples are needed, got {len(samples)}"
+        )
+    try:
+        d = zstandard.train_dictionary(dict_size, samples, level=COMPRESSION_LEVEL)
+    except zstandard.ZstdError as e:
+        raise ValueError(f"Can't train dictionary: {e}")
+    d.precompute_compress(level=COMPRESSION_LEVEL)
+    entry = CompressionDict.create(
+        org=org,
+        project=project,
+        dict_id=d.dict_id(),
+        tstamp=datetime.datetime.now(datetime.timezone.utc),
+        samples=len(samples),
+        data=d.as_bytes(),
+    )
+    project_dicts.put(org, project, d)
+    logger.info(
+        "Trained compression dictionary {} for {}/{} on {} samples",
+        entry.dict_id,
+        org,
+        project,
+        len(samples),
+    )
+    return entry
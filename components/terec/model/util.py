@@ -2,12 +2,24 @@ import os
 
 from cassandra.cqlengine import connection
 from cassandra.cqlengine.management import sync_table
-from terec.model import projects, results
+from terec.database.statements import statements
+from terec.model import (
+    aggregates,
+    blobs,
+    failures,
+    ingest,
+    jobs,
+    manifest,
+    projects,
+    results,
+    text_compression,
+)
 
 
 def cqlengine_init(cassandra):
     """
-    Initializes cql engine and syncs all tables.
+    Initializes cql engine, syncs all tables and prepares hot path statements.
+    Obsolete indexes are not dropped here (see terec.model.migrations).
     """
     if os.getenv("CQLENG_ALLOW_SCHEMA_MANAGEMENT") is None:
         os.environ["CQLENG_ALLOW_SCHEMA_MANAGEMENT"] = "1"
@@ -18,6 +30,15 @@ def cqlengine_init(cassandra):
     sync_table(results.TestSuite)
     sync_table(results.TestSuiteRun)
     sync_table(results.TestCaseRun)
+    sync_table(results.FailedTestCaseRun)
+    sync_table(results.TestCaseRunHistory)
+    sync_table(aggregates.TestSuiteRunCounters)
+    sync_table(manifest.TestSuiteRunManifest)
+    sync_table(blobs.TextBlob)
+    sync_table(text_compression.CompressionDict)
+    sync_table(jobs.IngestJob)
+    sync_table(jobs.IngestJobChunk)
+    statements.warm_up(cassandra)
 
 
 def model_to_dict(model_instance):
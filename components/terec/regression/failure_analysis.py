@@ -1,7 +1,19 @@
+import asyncio
+
 from loguru import logger
 
-from terec.model.failures import load_suite_branch_runs, load_test_case_runs
+from terec.model.failures import (
+    load_failed_test_case_runs_async,
+    load_failed_tests_for_suite_runs_async,
+    load_suite_branch_runs,
+    load_suite_branch_runs_async,
+    load_test_case_history,
+    load_test_case_history_async,
+    load_test_cases_history_async,
+    projection_columns,
+)
 from terec.model.results import TestCaseRun, TestSuiteRun
+from terec.regression.fingerprint import fingerprint_of
 from terec.regression.similarity_checker import SimilarityChecker
 
 
@@ -39,32 +51,140 @@ class TestCaseRunFailureAnalyser:
         logger.info(msg)
         self.messages.append(msg)
 
-    def check_regression(self, depth: int = 16):
+    def check_regression(
+        self, depth: int = 16, suite_runs: list[TestSuiteRun] | None = None
+    ):
         """
         Check if failed_test case failure is a regression vs history of the same suite on the same branch.
         In this case suite and branch will be same as the failed tests.
         And only builds with run_id < failed_test.run_id will be checked.
+        Recent runs of the suite (up to depth) can be given (e.g. cached),
+        otherwise they are loaded.
+        """
+        before_run = self._start_regression_check()
+        self._check(before_run_id=before_run, depth=depth, suite_runs=suite_runs)
+
+    async def check_regression_async(
+        self, depth: int = 16, suite_runs: list[TestSuiteRun] | None = None
+    ):
+        """
+        Asyncio version of check_regression().
         """
+        before_run = self._start_regression_check()
+        await self._check_async(
+            before_run_id=before_run, depth=depth, suite_runs=suite_runs
+        )
+
+    def _start_regression_check(self) -> int:
         self.check_suite = self.failed_test.suite
         self.check_branch = self.failed_test.branch
         before_run = self.failed_test.run_id
         self.add_msg(
             f"Checking regression on {self.check_suite}::{self.check_branch} before run {before_run}"
         )
-        self._check(before_run_id=before_run, depth=depth)
+        return before_run
 
-    def check_vs_upstream(self, suite: str, branch: str, depth: int = 16):
+    def check_vs_upstream(
+        self,
+        suite: str,
+        branch: str,
+        depth: int = 16,
+        suite_runs: list[TestSuiteRun] | None = None,
+    ):
         """
         Check if failed_test case failure is a known failure vs some upstream branch runs.
         In this case suite and branch need to be provided.
         All builds on upstream (even recent ones, run after failed_test) will be checked.
+        Recent runs of the upstream suite (up to depth) can be given as for check_regression().
         """
+        self._start_upstream_check(suite, branch)
+        self._check(before_run_id=None, depth=depth, suite_runs=suite_runs)
+
+    async def check_vs_upstream_async(
+        self,
+        suite: str,
+        branch: str,
+        depth: int = 16,
+        suite_runs: list[TestSuiteRun] | None = None,
+    ):
+        """
+        Asyncio version of check_vs_upstream().
+        """
+        self._start_upstream_check(suite, branch)
+        await self._check_async(before_run_id=None, depth=depth, suite_runs=suite_runs)
+
+    def _start_upstream_check(self, suite: str, branch: str):
         self.check_suite = suite
         self.check_branch = branch
         self.add_msg(f"Checking regression vs upstream {suite}::{branch}")
-        self._check(before_run_id=None, depth=depth)
 
-    def _check(self, before_run_id: int = None, depth: int = 16):
+    def _check(
+        self,
+        before_run_id: int = None,
+        depth: int = 16,
+        suite_runs: list[TestSuiteRun] | None = None,
+    ):
+        run_filter = self._start_check(before_run_id, depth)
+        self.collect_relevant_builds(run_filter, suite_runs)
+        if not self._has_suite_runs_to_check():
+            return
+        # collect all the test runs of failed tests in the interesting suite runs
+        self.collect_test_runs()
+        if not self._has_test_runs_to_check():
+            return
+        # and analyze them
+        self.find_similar_test_runs()
+
+    async def _check_async(
+        self,
+        before_run_id: int = None,
+        depth: int = 16,
+        suite_runs: list[TestSuiteRun] | None = None,
+    ):
+        run_filter = self._start_check(before_run_id, depth)
+        if suite_runs is None:
+            suite_runs = await load_suite_branch_runs_async(
+                **self._suite_runs_query(), limit=self.depth
+            )
+        self.set_relevant_builds(suite_runs, run_filter)
+        if not self._has_suite_runs_to_check():
+            return
+        test_runs = await load_test_case_history_async(**self._test_runs_query())
+        self.set_test_runs(test_runs)
+        if not self._has_test_runs_to_check():
+            return
+        # similarity checks are cpu bound so they should not block the event loop
+        await asyncio.to_thread(self.find_similar_test_runs)
+
+    def check_loaded(
+        self,
+        suite_runs: list[TestSuiteRun],
+        test_runs: list[TestCaseRun],
+        check_suite: str | None = None,
+        check_branch: str | None = None,
+        depth: int = 16,
+    ):
+        """
+        Same as check_regression() (or check_vs_upstream() if check_branch is set)
+        but on already loaded suite runs and test runs of the test case.
+        Test runs of suite runs not relevant for the check are ignored.
+        """
+        if check_branch:
+            self._start_upstream_check(check_suite, check_branch)
+            before_run = None
+        else:
+            before_run = self._start_regression_check()
+        run_filter = self._start_check(before_run_id=before_run, depth=depth)
+        self.set_relevant_builds(suite_runs, run_filter)
+        if not self._has_suite_runs_to_check():
+            return
+        run_ids = {x.run_id for x in self.suite_runs_to_check}
+        self.set_test_runs([x for x in test_runs if x.run_id in run_ids])
+        if not self._has_test_runs_to_check():
+            return
+        self.find_similar_test_runs()
+
+    def _start_check(self, before_run_id: int | None, depth: int):
         self.add_msg(f"Using depth of {depth}")
         self.depth = depth
         # collect relevant builds to check
@@ -72,28 +192,40 @@ class TestCaseRunFailureAnalyser:
         if before_run_id:
             self.add_msg(f"Using only suite runs with id < {before_run_id}.")
             run_filter = lambda x: x.run_id < before_run_id
-        self.collect_relevant_builds(run_filter)
+        return run_filter
+
+    def _has_suite_runs_to_check(self) -> bool:
         if not self.suite_runs_to_check:
             self.add_msg("No suite runs for checking found.")
-            return
-        # collect all the test runs of failed tests in the interesting suite runs
-        self.collect_test_runs()
+            return False
+        return True
+
+    def _has_test_runs_to_check(self) -> bool:
         if not self.test_runs_to_check:
             self.add_msg(
                 f"Got {len(self.suite_runs_to_check)} suite runs but no test runs for the test under check."
             )
-            return
-        # and analyze them
-        self.find_similar_test_runs()
+            return False
+        return True
 
-    def collect_relevant_builds(self, run_filter):
-        suite_runs = load_suite_branch_runs(
-            self.failed_test.org,
-            self.failed_test.project,
-            self.check_suite,
-            self.check_branch,
-            limit=self.depth,
-        )
+    def _suite_runs_query(self) -> dict:
+        return {
+            "org_name": self.failed_test.org,
+            "project_name": self.failed_test.project,
+            "suite_name": self.check_suite,
+            "branch": self.check_branch,
+        }
+
+    def collect_relevant_builds(
+        self, run_filter, suite_runs: list[TestSuiteRun] | None = None
+    ):
+        if suite_runs is None:
+            suite_runs = load_suite_branch_runs(
+                **self._suite_runs_query(), limit=self.depth
+            )
+        self.set_relevant_builds(suite_runs, run_filter)
+
+    def set_relevant_builds(self, suite_runs, run_filter):
         self.suite_runs_to_check = [
             x for x in suite_runs if run_filter is None or run_filter(x)
         ]
@@ -106,35 +238,57 @@ class TestCaseRunFailureAnalyser:
             and run.run_id == self.failed_test.run_id
         )
 
+    def _test_runs_query(self) -> dict:
+        return {
+            "org_name": self.failed_test.org,
+            "project_name": self.failed_test.project,
+            "suite_name": self.check_suite,
+            "branch": self.check_branch,
+            "runs": [x.run_id for x in self.suite_runs_to_check],
+            "test_package": self.failed_test.test_package,
+            "test_class": self.failed_test.test_suite,
+            "test_case": self.failed_test.test_case,
+        }
+
     def collect_test_runs(self):
-        suite_runs_ids = [x.run_id for x in self.suite_runs_to_check]
-        test_runs = load_test_case_runs(
-            org_name=self.failed_test.org,
-            project_name=self.failed_test.project,
-            suite_name=self.check_suite,
-            branch=self.check_branch,
-            runs=suite_runs_ids,
-            test_package=self.failed_test.test_package,
-            test_class=self.failed_test.test_suite,
-            test_case=self.failed_test.test_case,
-        )
+        self.set_test_runs(load_test_case_history(**self._test_runs_query()))
+
+    def set_test_runs(self, test_runs: list[TestCaseRun]):
         logger.info(
             "Found {} test runs to check for test {}.",
             len(test_runs),
             f"{str(self.failed_test)}",
         )
         if not test_runs:
-            self.message += f"Cannot check: no runs for the test under check for suite {self.full_suite_name()}::{self.check_branch}."
-            self.message += f"Builds considered: {suite_runs_ids}."
+            self.add_msg(
+                f"Cannot check: no runs for the test under check for suite {self.full_suite_name()}."
+            )
+            self.add_msg(
+                f"Builds considered: {[x.run_id for x in self.suite_runs_to_check]}."
+            )
         self.test_runs_to_check = test_runs
 
     def find_similar_test_runs(self):
+        """
+        Failures with the same fingerprint as the failed test are similar by definition.
+        Only if there are none, the failures are compared using SimilarityChecker.
+        """
+        failures = list(self.test_runs_with_result("FAIL"))
+        fingerprint = fingerprint_of(self.failed_test)
+        if fingerprint:
+            self.similar_failures = [
+                x for x in failures if fingerprint_of(x) == fingerprint
+            ]
+            if self.similar_failures:
+                self.add_msg(
+                    f"Found {len(self.similar_failures)} failures with the same fingerprint."
+                )
+                return self.similar_failures
         sim_checker = SimilarityChecker(self.failed_test)
-        for other in self.test_runs_to_check:
-            if other.result == "FAIL":
-                logger.info(f"checking {other}")
-                if sim_checker.is_similar(other):
-                    self.similar_failures.append(other)
+        for other in failures:
+            logger.info(f"checking {other}")
+            if sim_checker.is_similar(other):
+                self.similar_failures.append(other)
         return self.similar_failures
 
     def is_known_failure(self):
@@ -162,3 +316,112 @@ class TestCaseRunFailureAnalyser:
 
     def test_runs_with_result(self, result):
         return (x for x in self.test_runs_to_check if x.result == result)
+
+
+def case_name_key(test) -> tuple:
+    return test.test_package, test.test_suite, test.test_case
+
+
+class SuiteRunFailureAnalyser:
+    """
+    Checks all failed tests of a suite run at once.
+    Suite runs to check, their failures and results of the failed tests in them
+    are loaded in one pass for all the failures (instead of once per failed test)
+    and then every failure is analysed by TestCaseRunFailureAnalyser on the loaded data.
+    """
+
+    __test__ = False
+
+    def __init__(self, suite_run: TestSuiteRun):
+        self.suite_run = suite_run
+        self.analysers: list[TestCaseRunFailureAnalyser] = []
+
+    async def check_async(
+        self,
+        check_suite: str | None = None,
+        check_branch: str | None = None,
+        depth: int = 16,
+        suite_runs: list[TestSuiteRun] | None = None,
+    ):
+        """
+        Checks failures for regression (same suite and branch, runs before the suite run)
+        or vs runs of check_suite (default: same suite) on check_branch if it is set.
+        Recent runs of the checked suite and branch (up to depth) can be given (e.g. cached),
+        otherwise they are loaded.
+        """
+        failed_tests = await load_failed_tests_for_suite_runs_async([self.suite_run])
+        self.analysers = [TestCaseRunFailureAnalyser(t) for t in failed_tests]
+        if not failed_tests:
+            return
+        if check_branch:
+            check_suite = check_suite or self.suite_run.suite
+            suite, branch = check_suite, check_branch
+        else:
+            suite, branch = self.suite_run.suite, self.suite_run.branch
+        if suite_runs is None:
+            suite_runs = await load_suite_branch_runs_async(
+                self.suite_run.org, self.suite_run.project, suite, branch, limit=depth
+            )
+        if not check_branch:
+            runs = [x for x in suite_runs if x.run_id < self.suite_run.run_id]
+        else:
+            runs = suite_runs
+        test_runs = await self._load_test_runs(suite, branch, runs, failed_tests)
+        # similarity checks are cpu bound so they should not block the event loop
+        await asyncio.to_thread(
+            self._analyse, suite_runs, test_runs, check_suite, check_branch, depth
+        )
+
+    async def _load_test_runs(
+        self,
+        suite: str,
+        branch: str,
+        runs: list[TestSuiteRun],
+        failed_tests: list[TestCaseRun],
+    ) -> dict[tuple, list[TestCaseRun]]:
+        """
+        Returns runs of the failed test cases (all configs) in given suite runs by test name.
+        Only keys and results are read from the history of the failed test cases,
+        full failures are read only for these of them which failed
+        (not all failures of the suite runs).
+        """
+        if not runs:
+            return {}
+        keys = list({case_name_key(t) for t in failed_tests})
+        histories = await load_test_cases_history_async(
+            org_name=self.suite_run.org,
+            project_name=self.suite_run.project,
+            suite_name=suite,
+            branch=branch,
+            runs=[x.run_id for x in runs],
+            test_cases=[k + (None,) for k in keys],
+            columns=projection_columns(fields=[]),
+        )
+        failures = await load_failed_test_case_runs_async(
+            [x for h in histories for x in h]
+        )
+        test_runs = {
+            k: [x for x in h if x.result != "FAIL"] for k, h in zip(keys, histories)
+        }
+        for failure in failures:
+            test_runs[case_name_key(failure)].append(failure)
+        return test_runs
+
+    def _analyse(self, suite_runs, test_runs, check_suite, check_branch, depth):
+        for analyser in self.analysers:
+            analyser.check_loaded(
+                suite_runs,
+                test_runs.get(case_name_key(analyser.failed_test), []),
+                check_suite=check_suite,
+                check_branch=check_branch,
+                depth=depth,
+            )
+
+    def num_failures(self) -> int:
+        return len(self.analysers)
+
+    def num_known_failures(self) -> int:
+        return len([a for a in self.analysers if a.is_known_failure()])
+
+    def num_new_failures(self) -> int:
+        return len([a for a in self.analysers if a.is_known_failure() is False])
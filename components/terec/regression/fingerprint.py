@@ -0,0 +1,50 @@
+"""
+Failure fingerprint: hash of the normalized stacktrace and error details of a failed test.
+It is computed once at ingest so that identical failures can be found with simple
+equality check before falling back to (expensive) similarity checks.
+"""
+
+import hashlib
+import re
+
+from terec.model.results import TestCaseRun
+
+
+def normalize_stack_trace_line(stack_trace_line: str) -> str:
+    # Remove line numbers in Java-style stack traces
+    stack_trace_line = re.sub(r"(:\d+)", ":X", stack_trace_line)
+    # Normalize file paths
+    stack_trace_line = re.sub(r"([a-zA-Z]:)?\\|/", "/", stack_trace_line)
+    # Replace memory addresses
+    stack_trace_line = re.sub(r"0x[0-9a-fA-F]+", "0xADDR", stack_trace_line)
+    return stack_trace_line
+
+
+def failure_fingerprint(
+    error_stacktrace: str | None, error_details: str | None = None
+) -> str | None:
+    """
+    Returns fingerprint of a failure or None if there is no stacktrace to build it from.
+    """
+    if not error_stacktrace:
+        return None
+    lines = [
+        normalize_stack_trace_line(line)
+        for line in error_stacktrace.splitlines(keepends=False)
+    ]
+    if error_details:
+        lines.append(normalize_stack_trace_line(error_details))
+    text = "\n".join(lines)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def fingerprint_of(test_run: TestCaseRun) -> str | None:
+    """
+    Returns stored fingerprint of a failed test case run or computes it for runs
+    imported before fingerprints were introduced.
+    """
+    if test_run.result != "FAIL":
+        return None
+    return test_run.failure_fingerprint or failure_fingerprint(
+        test_run.error_stacktrace, test_run.error_details
+    )
@@ -1,5 +1,3 @@
-import re
-
 from difflib import SequenceMatcher
 from polyleven import levenshtein
 
@@ -7,6 +5,7 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 
 from terec.model.results import TestCaseRun
+from terec.regression.fingerprint import normalize_stack_trace_line
 
 
 def levenshtein_sim_ratio(str1, str2):
@@ -101,13 +100,7 @@ class SimilarityChecker:
         return True
 
     def normalize_stack_trace_line(self, stack_trace_line):
-        # Remove line numbers in Java-style stack traces
-        stack_trace_line = re.sub(r"(:\d+)", ":X", stack_trace_line)
-        # Normalize file paths
-        stack_trace_line = re.sub(r"([a-zA-Z]:)?\\|/", "/", stack_trace_line)
-        # Replace memory addresses
-        stack_trace_line = re.sub(r"0x[0-9a-fA-F]+", "0xADDR", stack_trace_line)
-        return stack_trace_line
+        return normalize_stack_trace_line(stack_trace_line)
 
     @classmethod
     def is_out_stream_similar(cls, matcher: SequenceMatcher, other: str) -> bool | None:
@@ -0,0 +1,7 @@
+"""
+work queues for background processing
+"""
+
+from terec.work_queue.core import WorkQueueFull, create_work_queue
+
+__all__ = ["WorkQueueFull", "create_work_queue"]
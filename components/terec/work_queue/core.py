@@ -0,0 +1,165 @@
+"""
+Simple work queue: messages (bytes) are put on the queue and background workers
+call the handler for each of them.
+RabbitMQ is used when RABBITMQ_URL is set, otherwise an in-process queue is used,
+which is good enough for a single api process and local development.
+Both are bounded: put() raises WorkQueueFull when a message is not accepted.
+"""
+
+import os
+import queue
+import threading
+import time
+
+from loguru import logger
+
+RABBITMQ_URL = os.getenv("RABBITMQ_URL", None)
+QUEUE_WORKERS = int(os.getenv("QUEUE_WORKERS", "2"))
+# maximum number of messages waiting in the in-process queue
+QUEUE_MAX_SIZE = int(os.getenv("QUEUE_MAX_SIZE", "256"))
+
+
+class WorkQueueFull(Exception):
+    """
+    Message was not accepted by the queue (full or rejected by the broker).
+    """
+
+
+def create_work_queue(name: str, handler, num_workers: int = QUEUE_WORKERS):
+    """
+    Creates a work queue with given name and starts workers calling handler(message).
+    """
+    if RABBITMQ_URL:
+        logger.info("Using RabbitMQ work queue {} with {} workers", name, num_workers)
+        return RabbitMqWorkQueue(name, handler, RABBITMQ_URL, num_workers)
+    else:
+        logger.info("Using in-process work queue {} with {} workers", name, num_workers)
+        return InProcessWorkQueue(name, handler, num_workers, QUEUE_MAX_SIZE)
+
+
+def _handle(handler, message: bytes) -> None:
+    try:
+        handler(message)
+    except Exception:
+        logger.exception("Failed to process work queue message")
+
+
+class InProcessWorkQueue:
+    def __init__(
+        self, name: str, handler, num_workers: int, max_size: int = QUEUE_MAX_SIZE
+    ):
+        self.name = name
+        self.handler = handler
+        self.queue = queue.Queue(maxsize=max_size)
+        for n in range(num_workers):
+            worker = threading.Thread(
+                target=self._work, name=f"{name}-worker-{n}", daemon=True
+            )
+            worker.start()
+
+    def put(self, message: bytes) -> None:
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            raise WorkQueueFull(f"Work queue {self.name} is full.")
+
+    def join(self) -> None:
+        """
+        Blocks until all messages put on the queue are processed.
+        """
+        self.queue.join()
+
+    def _work(self):
+        while True:
+            message = self.queue.get()
+            try:
+                _handle(self.handler, message)
+            finally:
+                self.queue.task_done()
+
+
+class RabbitMqWorkQueue:
+    """
+    Durable RabbitMQ queue so that messages survive api restarts.
+    Each worker has its own connection and processes one message at a time.
+    Message is acknowledged after the handler is done, handler failures are only logged.
+    Messages are published with confirms, so messages rejected by the broker
+    (e.g. too big or over the queue length limit set with a max-length policy
+    and reject-publish overflow) raise WorkQueueFull.
+    """
+
+    RECONNECT_DELAY_SEC = 5
+
+    def __init__(self, name: str, handler, url: str, num_workers: int):
+        import pika
+
+        self.name = name
+        self.handler = handler
+        self.params = pika.URLParameters(url)
+        self.publisher = threading.local()
+        for n in range(num_workers):
+            worker = threading.Thread(
+                target=self._consume, name=f"{name}-worker-{n}", daemon=True
+            )
+            worker.start()
+
+    def put(self, message: bytes) -> None:
+        import pika
+
+        rejected = (pika.exceptions.NackError, pika.exceptions.UnroutableError)
+        try:
+            try:
+                self._publish(message)
+            except rejected:
+                raise
+            except pika.exceptions.AMQPError:
+                # stale connection of this thread, reconnect and retry once
+                self.publisher.channel = None
+                self._publish(message)
+        except rejected as e:
+            raise WorkQueueFull(f"Work queue {self.name} rejected message: {e!r}")
+
+    def _publish(self, message: bytes) -> None:
+        import pika
+
+        channel = getattr(self.publisher, "channel", None)
+        if channel is None or not channel.is_open:
+            channel = self._channel()
+            channel.confirm_delivery()
+            self.publisher.channel = channel
+        channel.basic_publish(
+            exchange="",
+            routing_key=self.name,
+            body=message,
+            properties=pika.BasicProperties(delivery_mode=pika.DeliveryMode.Persistent),
+        )
+
+    def _channel(self):
+        import pika
+
+        connection = pika.BlockingConnection(self.params)
+        channel = connection.channel()
+        channel.queue_declare(queue=self.name, durable=True)
+        return channel
+
+    def _consume(self):
+        import pika
+
+        while True:
+            try:
+                channel = self._channel()
+                channel.basic_qos(prefetch_count=1)
+                for method, _, body in channel.consume(self.name):
+                    # handle in a separate thread to keep connection heartbeats going
+                    worker = threading.Thread(
+                        target=_handle, args=(self.handler, body), daemon=True
+                    )
+                    worker.start()
+                    while worker.is_alive():
+                        channel.connection.process_data_events(time_limit=1)
+                    channel.basic_ack(method.delivery_tag)
+            except pika.exceptions.AMQPError as e:
+                logger.warning(
+                    "Work queue {} connection failed: {}. Reconnecting.", self.name, e
+                )
+                time.sleep(self.RECONNECT_DELAY_SEC)
@@ -0,0 +1,35 @@
+import pytest
+
+from assertions import raise_for_status
+from generator import generate_suite_with_test_runs
+
+
+@pytest.mark.usefixtures("api_client")
+class TestBenchmarkFailuresAPI:
+    @pytest.fixture(autouse=True)
+    def inject_client(self, api_client):
+        self.api_client = api_client
+
+    @pytest.fixture()
+    def suite_with_test_runs(self, cassandra_model, public_project):
+        return generate_suite_with_test_runs(
+            public_project.org, public_project.name, num_runs=32
+        )
+
+    @pytest.mark.parametrize("normalized", [False, True])
+    def test_benchmark_get_failed_tests(
+        self, suite_with_test_runs, benchmark, normalized
+    ):
+        suite, suite_runs, _ = suite_with_test_runs
+        url = f"/history/orgs/{suite.org}/projects/{suite.project}/suites/{suite.suite}/failed-tests"
+        params = {"branch": "main", "normalized": normalized}
+        resp = benchmark(self.api_client.get, url, params=params)
+        raise_for_status(resp)
+
+    def test_benchmark_get_test_runs(self, suite_with_test_runs, benchmark):
+        suite, _, test_runs = suite_with_test_runs
+        url = f"/history/orgs/{suite.org}/projects/{suite.project}/suites/{suite.suite}/test-runs"
+        params = {"branch": "main", "test_package": test_runs[0].test_package}
+        resp = benchmark(self.api_client.get, url, params=params)
+        raise_for_status(resp)
+        assert resp.json()
@@ -1,17 +1,29 @@
 import json
+import uuid
+
 import pytest
 
 from faker import Faker
 from fastapi.encoders import jsonable_encoder
-from pytest import fixture
 
 from assertions import raise_for_status
 from .random_data import random_test_case_run_info
+from terec.database.batch import MAX_BATCH_BYTES
+from terec.model.ingest import write_test_case_runs
+
+BENCHMARK_ROUNDS = 10
 
 
-@fixture(scope="module")
-def random_100_test_runs():
-    return [random_test_case_run_info() for _ in range(100)]
+def unique_test_runs(num_tests: int) -> list:
+    """
+    Random test runs with unique keys: runs already imported into the suite run
+    are skipped, so each benchmark round needs new ones to measure the writes.
+    """
+    prefix = uuid.uuid4().hex[:8]
+    return [
+        random_test_case_run_info().model_copy(update={"test_case": f"{prefix}_{i}"})
+        for i in range(num_tests)
+    ]
 
 
 @pytest.mark.usefixtures("api_client")
@@ -28,45 +40,60 @@ class TestBenchmarkResultsAPI:
         url = f"/tests/orgs/{org}/projects/{prj}/suites/{suite}/branches/{branch}/runs/{run}/tests"
         return self.api_client.post(url, content=body)
 
-    def test_benchmark_adding_100_test_results(
+    @pytest.mark.parametrize("num_tests", [100, 1000])
+    def test_benchmark_adding_test_results(
         self,
         cassandra_model,
         public_project,
         public_project_suite_run,
         benchmark,
-        random_100_test_runs,
+        num_tests,
     ):
-        # prepare random data encoded as json
-        tests = random_100_test_runs
-        body = jsonable_encoder(tests, exclude_none=True)
-        json_body = json.dumps(body)
+        run = public_project_suite_run
+
+        def new_body():
+            # random data encoded as json, new tests in every round
+            body = jsonable_encoder(unique_test_runs(num_tests), exclude_none=True)
+            args = (run.org, run.project, run.suite, run.branch, run.run_id)
+            return args + (json.dumps(body),), {}
+
         # benchmark calling the api
-        resp = benchmark(
-            self.post_test_results,
-            public_project.org,
-            public_project.name,
-            public_project_suite_run.suite,
-            public_project_suite_run.branch,
-            public_project_suite_run.run_id,
-            json_body,
+        resp = benchmark.pedantic(
+            self.post_test_results, setup=new_body, rounds=BENCHMARK_ROUNDS
         )
         raise_for_status(resp)
+        assert resp.json()["written_count"] == num_tests
 
-    def test_benchmark_adding_1000_test_results(
-        self, cassandra_model, public_project, public_project_suite_run, benchmark
+    @pytest.mark.parametrize("num_tests", [100, 1000])
+    @pytest.mark.parametrize(
+        "max_batch_bytes", [0, MAX_BATCH_BYTES], ids=["single", "batched"]
+    )
+    def test_benchmark_writing_test_results(
+        self,
+        cassandra_model,
+        public_project_suite_run,
+        benchmark,
+        num_tests,
+        max_batch_bytes,
     ):
-        # prepare random data encoded as json
-        tests = [random_test_case_run_info() for _ in range(1000)]
-        body = jsonable_encoder(tests, exclude_none=True)
-        json_body = json.dumps(body)
-        # benchmark calling the api
-        resp = benchmark(
-            self.post_test_results,
-            public_project.org,
-            public_project.name,
-            public_project_suite_run.suite,
-            public_project_suite_run.branch,
-            public_project_suite_run.run_id,
-            json_body,
+        def new_tests():
+            return (public_project_suite_run, unique_test_runs(num_tests)), {
+                "max_batch_bytes": max_batch_bytes
+            }
+
+        # benchmark writing with and without partition batches
+        written = benchmark.pedantic(
+            write_test_case_runs, setup=new_tests, rounds=BENCHMARK_ROUNDS
         )
-        raise_for_status(resp)
+        assert written.written == num_tests
+
+    @pytest.mark.parametrize("num_tests", [100, 1000])
+    def test_benchmark_writing_unchanged_test_results(
+        self, cassandra_model, public_project_suite_run, benchmark, num_tests
+    ):
+        # given tests already imported
+        tests = unique_test_runs(num_tests)
+        write_test_case_runs(public_project_suite_run, tests)
+        # benchmark importing them again (all skipped as unchanged)
+        written = benchmark(write_test_case_runs, public_project_suite_run, tests)
+        assert written.skipped == num_tests
@@ -0,0 +1,83 @@
+from terec.api.cache import TTLCache, invalidate_suite_runs, suite_runs_cache
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl():
+    timer = FakeTimer()
+    cache = TTLCache(maxsize=10, ttl=5, timer=timer)
+    cache.put("a", 1)
+    timer.now = 4.9
+    assert cache.get("a") == 1
+    timer.now = 5.0
+    assert cache.get("a") is None
+    assert not cache.entries
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_get_or_load_does_not_cache_missing_values():
+    cache = TTLCache(maxsize=10, ttl=60)
+    loads = []
+
+    def loader(value):
+        loads.append(value)
+        return value
+
+    assert cache.get_or_load("a", lambda: loader(None)) is None
+    assert cache.get_or_load("a", lambda: loader(1)) == 1
+    assert cache.get_or_load("a", lambda: loader(2)) == 1
+    assert loads == [None, 1]
+
+
+def test_invalidate():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.invalidate("a")
+    cache.invalidate("not-there")
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    cache.clear()
+    assert cache.get("b") is None
+
+
+def test_invalidate_if():
+    cache = TTLCache(maxsize=10, ttl=60)
+    for key in ["a1", "a2", "b1"]:
+        cache.put(key, key)
+    cache.invalidate_if(lambda key: key.startswith("a"))
+    assert list(cache.entries) == ["b1"]
+
+
+def test_invalidate_suite_runs_drops_runs_of_branch_and_suite():
+    suite_runs_cache.clear()
+    for key in [
+        ("o", "p", "s", "main", 16),
+        ("o", "p", "s", "main", 32),
+        ("o", "p", "s", None, 32),
+        ("o", "p", "s", "dev", 32),
+        ("o", "p", "other", "main", 32),
+    ]:
+        suite_runs_cache.put(key, [])
+    invalidate_suite_runs("o", "p", "s", "main")
+    assert list(suite_runs_cache.entries) == [
+        ("o", "p", "s", "dev", 32),
+        ("o", "p", "other", "main", 32),
+    ]
+    suite_runs_cache.clear()
@@ -0,0 +1,125 @@
+import gzip
+import io
+
+import pytest
+import zstandard
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from terec.api.compression import (
+    DecompressRequestMiddleware,
+    compress,
+    compressed_chunks,
+    json_request_body,
+)
+
+
+@pytest.fixture(scope="module")
+def echo_client() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(DecompressRequestMiddleware)
+
+    @app.post("/echo")
+    def echo(body: list[dict]) -> list[dict]:
+        return body
+
+    @app.post("/echo-stream")
+    async def echo_stream(request: Request) -> dict:
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+        return {"size": size}
+
+    return TestClient(app)
+
+
+@pytest.fixture(scope="module")
+def limited_client() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(DecompressRequestMiddleware, max_body_size=100_000)
+
+    @app.post("/echo-stream")
+    async def echo_stream(request: Request) -> dict:
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+        return {"size": size}
+
+    return TestClient(app)
+
+
+BODY = [{"stdout": "the same line over and over\n" * 100} for _ in range(10)]
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_compressed_body_is_decoded(echo_client, encoding):
+    data, headers = json_request_body(BODY, encoding)
+    assert headers["Content-Encoding"] == encoding
+    resp = echo_client.post("/echo", content=data, headers=headers)
+    assert resp.is_success, resp.text
+    assert resp.json() == BODY
+
+
+def test_compressed_body_is_much_smaller():
+    data, _ = json_request_body(BODY, None)
+    compressed, _ = json_request_body(BODY, "gzip")
+    assert len(compressed) * 10 < len(data)
+
+
+def test_compressed_stream_is_decoded(echo_client):
+    data = b"x" * 1_000_000
+    resp = echo_client.post(
+        "/echo-stream",
+        content=compress(data, "zstd"),
+        headers={"Content-Encoding": "zstd"},
+    )
+    assert resp.is_success, resp.text
+    assert resp.json()["size"] == len(data)
+
+
+def test_plain_body_is_not_changed(echo_client):
+    data, headers = json_request_body(BODY, None)
+    assert "Content-Encoding" not in headers
+    resp = echo_client.post("/echo", content=data, headers=headers)
+    assert resp.json() == BODY
+
+
+def test_unsupported_encoding(echo_client):
+    resp = echo_client.post("/echo", content=b"[]", headers={"Content-Encoding": "br"})
+    assert resp.status_code == 415
+
+
+def test_invalid_compressed_body(echo_client):
+    resp = echo_client.post(
+        "/echo", content=b"not gzip at all", headers={"Content-Encoding": "gzip"}
+    )
+    assert resp.status_code == 400, resp.text
+
+
+def test_gzip_compatible_with_stdlib():
+    assert gzip.decompress(compress(b"abc", "gzip")) == b"abc"
+    assert zstandard.ZstdDecompressor().decompress(compress(b"abc", "zstd")) == b"abc"
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd", None])
+def test_compressed_file_chunks_are_decoded(echo_client, encoding):
+    data = b"the same line over and over\n" * 100_000
+    chunks = compressed_chunks(io.BytesIO(data), encoding, chunk_size=64 * 1024)
+    headers = {"Content-Encoding": encoding} if encoding else {}
+    resp = echo_client.post("/echo-stream", content=chunks, headers=headers)
+    assert resp.is_success, resp.text
+    assert resp.json()["size"] == len(data)
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_too_big_decompressed_body_is_rejected(limited_client, encoding):
+    # small compressed body expanding over the limit
+    data = compress(b"x" * 10_000_000, encoding)
+    assert len(data) < 100_000
+    headers = {"Content-Encoding": encoding}
+    resp = limited_client.post("/echo-stream", content=data, headers=headers)
+    assert resp.status_code == 413, resp.text
+    # while the body within the limit is accepted
+    data = compress(b"x" * 100_000, encoding)
+    resp = limited_client.post("/echo-stream", content=data, headers=headers)
+    assert resp.json()["size"] == 100_000
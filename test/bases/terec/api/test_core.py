@@ -1,3 +1,9 @@
 def test_openapi_doc(cassandra_model, api_client):
     response = api_client.get("docs")
     assert response.is_success, response.text
+
+
+def test_database_concurrency(api_client):
+    response = api_client.get("/admin/database/concurrency")
+    assert response.is_success, response.text
+    assert set(response.json().keys()) == {"writes", "reads"}
@@ -1,9 +1,19 @@
+import asyncio
+import datetime
+import json
+
+import orjson
 import pytest
 from faker import Faker
+from pydantic import TypeAdapter
 
 from generator import ResultsGenerator, generate_suite_with_test_runs
 from conftest import random_name
-from terec.model.results import TestCaseRun
+from terec.api.cache import invalidate_suite_runs, suite_runs_cache
+from terec.api.routers import failures as failures_router
+from terec.model.failures import projection_columns
+from terec.model.ingest import TEST_CASE_RUN_COLUMNS
+from terec.model.results import TestCaseRun, TestCaseRunRow, TestSuiteRun
 
 
 @pytest.mark.usefixtures("api_client")
@@ -14,9 +24,11 @@ class TestFailuresGetFailedTestsAPI:
     def inject_client(self, api_client):
         self.api_client = api_client
 
-    def get_failed_tests(self, org, project, suite, branch, headers=None):
+    def get_failed_tests(
+        self, org, project, suite, branch, headers=None, extra_params=None
+    ):
         url = f"/history/orgs/{org}/projects/{project}/suites/{suite}/failed-tests"
-        params = {"branch": branch}
+        params = {"branch": branch} | (extra_params or {})
         return self.api_client.get(url, params=params, headers=headers)
 
     def test_should_raise_for_not_existing_org(self, cassandra_model) -> None:
@@ -55,6 +67,70 @@ class TestFailuresGetFailedTestsAPI:
         expected_count = sum(x.fail_count for x in runs)
         assert len(resp.json()) == expected_count
 
+    def test_should_return_only_selected_fields(self, cassandra_model, public_project):
+        # given some generated data with failed tests
+        suite, suite_runs, test_runs = generate_suite_with_test_runs(
+            public_project.org, public_project.name, num_runs=3
+        )
+        # when we get failed tests with selected fields only
+        resp = self.get_failed_tests(
+            suite.org,
+            suite.project,
+            suite.suite,
+            "main",
+            extra_params={"fields": "test_group"},
+        )
+        assert resp.is_success, resp.text
+        # then test runs have only keys, result and selected fields
+        assert len(resp.json()) == sum(x.fail_count for x in suite_runs)
+        for item in resp.json():
+            assert set(item["test_run"]) == {
+                "test_package",
+                "test_suite",
+                "test_case",
+                "test_config",
+                "result",
+                "test_group",
+            }
+
+    def test_should_return_normalized_failed_tests(
+        self, cassandra_model, public_project
+    ):
+        # given some generated data with failed tests
+        suite, suite_runs, test_runs = generate_suite_with_test_runs(
+            public_project.org, public_project.name, num_runs=3
+        )
+        # when we get failed tests in normalized format
+        resp = self.get_failed_tests(
+            suite.org,
+            suite.project,
+            suite.suite,
+            "main",
+            extra_params={"normalized": True},
+        )
+        assert resp.is_success, resp.text
+        # then each suite run is returned once and tests reference them by run_id
+        data = resp.json()
+        assert {int(k) for k in data["runs"]} == {x.run_id for x in suite_runs}
+        assert len(data["tests"]) == sum(x.fail_count for x in suite_runs)
+        for item in data["tests"]:
+            assert item["result"] == "FAIL"
+            assert str(item["run_id"]) in data["runs"]
+
+    def test_should_fail_for_unknown_fields(self, cassandra_model, public_project):
+        suite, _, _ = generate_suite_with_test_runs(
+            public_project.org, public_project.name, num_runs=1
+        )
+        resp = self.get_failed_tests(
+            suite.org,
+            suite.project,
+            suite.suite,
+            "main",
+            extra_params={"exclude": "stdout,not_a_field"},
+        )
+        assert resp.status_code == 400, resp.text
+        assert "not_a_field" in resp.text
+
     def test_authz(self, cassandra_model, private_project):
         prj, tokens = private_project
         org = prj.org
@@ -190,6 +266,79 @@ class TestFailuresGetTestRunsAPI:
         )
         assert len(resp.json()) == expected_count, resp.text
 
+    def test_should_return_history_of_many_tests(self, cassandra_model, public_project):
+        # given some generated data
+        suite, suite_runs, test_runs = generate_suite_with_test_runs(
+            public_project.org, public_project.name, branch="main"
+        )
+        tests = {(x.test_package, x.test_suite, x.test_case): x for x in test_runs}
+        the_tests = list(tests.values())[:3]
+        # when we get history of some tests at once
+        url = f"/history/orgs/{suite.org}/projects/{suite.project}/suites/{suite.suite}/test-runs"
+        body = {
+            "branch": "main",
+            "depth": 5,
+            "tests": [
+                {
+                    "test_package": t.test_package,
+                    "test_class": t.test_suite,
+                    "test_case": t.test_case,
+                }
+                for t in the_tests
+            ],
+        }
+        resp = self.api_client.post(url, json=body)
+        assert resp.is_success, resp.text
+        # then we get history of each test in the latest runs, in order of the query
+        latest_runs = sorted(x.run_id for x in suite_runs)[-5:]
+        assert len(resp.json()) == len(the_tests)
+        for the_test, item in zip(the_tests, resp.json()):
+            assert item["test"]["test_case"] == the_test.test_case
+            expected_count = len(
+                [
+                    x
+                    for x in test_runs
+                    if x.is_same_test_case(the_test) and x.run_id in latest_runs
+                ]
+            )
+            assert len(item["runs"]) == expected_count, item
+
+    def test_should_return_history_summary(self, cassandra_model, public_project):
+        # given some generated data
+        suite, suite_runs, test_runs = generate_suite_with_test_runs(
+            public_project.org, public_project.name, branch="main"
+        )
+        the_test = test_runs[0]
+        # when we get summary of its history
+        url = f"/history/orgs/{suite.org}/projects/{suite.project}/suites/{suite.suite}/test-runs/summary"
+        body = {
+            "branch": "main",
+            "tests": [
+                {
+                    "test_package": the_test.test_package,
+                    "test_class": the_test.test_suite,
+                    "test_case": the_test.test_case,
+                    "test_config": the_test.test_config,
+                }
+            ],
+        }
+        resp = self.api_client.post(url, json=body)
+        assert resp.is_success, resp.text
+        # then results are aligned with the suite runs from the latest one
+        data = resp.json()
+        assert data["run_ids"] == sorted((x.run_id for x in suite_runs), reverse=True)
+        results = {
+            x.run_id: x.result[0]
+            for x in test_runs
+            if x.is_same_test_case(the_test) and x.test_config == the_test.test_config
+        }
+        summary = data["tests"][0]
+        assert summary["results"] == "".join(
+            results.get(r, "_") for r in data["run_ids"]
+        )
+        assert summary["num_fail"] == summary["results"].count("F")
+        assert summary["num_pass"] == summary["results"].count("P")
+
     def test_authz(self, cassandra_model, private_project):
         prj, tokens = private_project
         resp = self.get_test_runs(prj.org, prj.name, "s", "main", "p")
@@ -287,6 +436,36 @@ class TestFailuresCheckTestRunAPI:
         assert data["summary"]["num_skip"] == 0
         assert data["summary"]["num_pass"] == 2
 
+    def test_check_suite_run(self, gen_with_suite_runs):
+        # given a history of known failure FPPF and new failure PPPF
+        gen = gen_with_suite_runs
+        known, new = gen.test_cases[:2]
+        for n, results in enumerate(["FP", "PP", "PP", "FF"], start=1):
+            for template, result in zip([known, new], results):
+                details = self.TEST_FAIL if result == "F" else self.TEST_PASS
+                gen.test_case_run(gen.get_suite_run(n), template, details)
+        # when we check the whole suite run
+        run = gen.get_suite_run(4)
+        url = f"/history/orgs/{run.org}/projects/{run.project}/suites/{run.suite}/run-check"
+        resp = self.api_client.get(url, params={"branch": run.branch, "run_id": 4})
+        # then both failures are checked at once
+        assert resp.is_success, resp.text
+        data = resp.json()
+        assert data["suite_run"]["run_id"] == 4
+        assert data["num_failures"] == 2
+        assert data["num_known_failures"] == 1
+        assert data["num_new_failures"] == 1
+        checks = {t["test_case"]["test_case"]: t for t in data["tests"]}
+        assert checks[known["test_case"]]["is_known_failure"]
+        assert checks[new["test_case"]]["is_known_failure"] is False
+        summary = checks[known["test_case"]]["summary"]
+        assert summary["num_runs"] == 3
+        assert summary["num_same_fail"] == 1
+        assert summary["num_pass"] == 2
+        assert checks[new["test_case"]]["summary"]["num_pass"] == 3
+        # and suite runs checked are cached
+        assert suite_runs_cache.get((run.org, run.project, run.suite, run.branch, 32))
+
     def test_get_test_run_check(self, cassandra_model, public_project):
         suite, suite_runs, test_runs = generate_suite_with_test_runs(
             public_project.org, public_project.name, branch="main"
@@ -320,3 +499,70 @@ class TestFailuresCheckTestRunAPI:
     #
     # def test_check_new_fail_on_other_branch(self, cassandra_model, test_project):
     #     pass
+
+
+@pytest.mark.parametrize("fields", [None, ["test_group"]])
+def test_fast_response_same_as_models(fields):
+    # given suite runs and rows of their test runs
+    tstamp = datetime.datetime(2025, 1, 1, 12, 30, 15, 123000)
+    suite_runs = [
+        TestSuiteRun(
+            org="o",
+            project="p",
+            suite="s",
+            branch="b",
+            run_id=n,
+            tstamp=tstamp,
+            status="FAILURE",
+        )
+        for n in (1, 2)
+    ]
+    columns = projection_columns(fields=fields)
+    rows = []
+    for run_id, case in [(1, "a"), (2, "a"), (2, "b")]:
+        row = dict.fromkeys(TEST_CASE_RUN_COLUMNS)
+        row |= {"org": "o", "project": "p", "suite": "s", "branch": "b"}
+        row |= {"run_id": run_id, "test_package": "pkg", "test_suite": "cls"}
+        row |= {"test_case": case, "test_config": "#", "result": "FAIL"}
+        row |= {"tstamp": tstamp, "duration_ms": 10, "stdout": "out"}
+        rows.append({k: v for k, v in row.items() if not columns or k in columns})
+    # when response is built from rows directly
+    fast = failures_router.runs_history_response(
+        [TestCaseRunRow(r) for r in rows], suite_runs, columns, normalized=False
+    )
+    # then it is the same as built and serialized with the models
+    pairs = failures_router.combine_test_runs_with_suite_runs(
+        [TestCaseRun(**r) for r in rows], suite_runs, columns
+    )
+    adapter = TypeAdapter(list[failures_router.TestCaseSuiteRunInfo])
+    expected = json.loads(adapter.dump_json(pairs, exclude_unset=True))
+    assert orjson.loads(fast.body) == expected
+
+
+def test_suite_branch_runs_are_cached_until_invalidated(monkeypatch):
+    suite_runs_cache.clear()
+    loads = []
+
+    async def load_runs(org, project, suite, branch, limit):
+        loads.append((branch, limit))
+        return [TestSuiteRun(org=org, project=project, suite=suite, branch=branch)]
+
+    monkeypatch.setattr(failures_router, "load_suite_branch_runs_async", load_runs)
+
+    def get_runs(branch, limit):
+        return asyncio.run(
+            failures_router.get_suite_branch_runs_async("o", "p", "s", branch, limit)
+        )
+
+    # when runs are read twice then they are loaded once per branch and limit
+    first = get_runs("main", 16)
+    assert get_runs("main", 16) is first
+    get_runs("main", 32)
+    get_runs(None, 32)
+    assert loads == [("main", 16), ("main", 32), (None, 32)]
+    # and when new run of the branch is saved then they are loaded again
+    invalidate_suite_runs("o", "p", "s", "main")
+    get_runs("main", 16)
+    get_runs(None, 32)
+    assert loads[3:] == [("main", 16), (None, 32)]
+    suite_runs_cache.clear()
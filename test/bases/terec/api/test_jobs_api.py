@@ -0,0 +1,15 @@
+from .random_data import random_test_case_run_info
+from terec.api.routers.jobs import chunk_tests
+
+
+def test_tests_are_queued_in_chunks():
+    tests = [random_test_case_run_info() for _ in range(10)]
+    # chunks are limited by number of tests
+    assert [len(c) for c in chunk_tests(tests, max_rows=4)] == [4, 4, 2]
+    # and by size of the tests
+    size = len(tests[0].model_dump_json(exclude_none=True))
+    chunks = chunk_tests(tests[:1] * 3, max_rows=10, max_bytes=2 * size)
+    assert [len(c) for c in chunks] == [2, 1]
+    # but a single big test is not rejected
+    assert [len(c) for c in chunk_tests(tests[:2], max_bytes=1)] == [1, 1]
+    assert [t for c in chunk_tests(tests, max_rows=3) for t in c] == tests
@@ -0,0 +1,72 @@
+import gzip
+
+import pytest
+
+from terec.model.results import TestCaseRun, TestSuiteRun
+
+
+def junit_xml(num_cases: int) -> str:
+    cases = "".join(
+        f'<testcase classname="org.example.Test" name="test_{i}" time="0.5"/>'
+        for i in range(num_cases - 1)
+    )
+    failed = (
+        '<testcase classname="org.example.Test" name="test_failed" time="1.0">'
+        '<failure message="expected 1">java.lang.AssertionError</failure></testcase>'
+    )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?><testsuites>'
+        f'<testsuite name="junit" tests="{num_cases}" failures="1">{cases}{failed}</testsuite>'
+        "</testsuites>"
+    )
+
+
+@pytest.mark.usefixtures("api_client")
+class TestJunitAPI:
+    @pytest.fixture(autouse=True)
+    def inject_client(self, api_client):
+        self.api_client = api_client
+
+    def junit_url(self, org: str, prj: str, branch: str, run_id: int) -> str:
+        return f"/tests/orgs/{org}/projects/{prj}/branches/{branch}/runs/{run_id}/junit"
+
+    @pytest.mark.parametrize("gzipped", [False, True])
+    def test_should_import_junit_xml(self, cassandra_model, public_project, gzipped):
+        # given junit report with many test cases
+        data = junit_xml(1500).encode("utf-8")
+        if gzipped:
+            data = gzip.compress(data)
+        # when it is uploaded
+        url = self.junit_url(public_project.org, public_project.name, "main", 1)
+        resp = self.api_client.post(url, content=data)
+        # then suite run and all test cases are created
+        assert resp.is_success, resp.text
+        assert resp.json()["test_count"] == 1500
+        assert resp.json()["suites"] == {"junit": 1500}
+        run = TestSuiteRun.objects(
+            org=public_project.org,
+            project=public_project.name,
+            suite="junit",
+            branch="main",
+            run_id=1,
+        ).get()
+        assert run.total_count == 1500
+        assert run.fail_count == 1
+        loaded = TestCaseRun.objects(
+            org=public_project.org,
+            project=public_project.name,
+            suite="junit",
+            branch="main",
+            run_id=1,
+        )
+        assert len(loaded) == 1500
+
+    def test_should_fail_for_invalid_xml(self, cassandra_model, public_project):
+        url = self.junit_url(public_project.org, public_project.name, "main", 2)
+        resp = self.api_client.post(url, content=b"<testsuites><testsuite name='s'>")
+        assert resp.status_code == 400, resp.text
+
+    def test_should_fail_for_non_existing_project(self, cassandra_model):
+        url = self.junit_url("not-existing-org", "not-existing-prj", "main", 1)
+        resp = self.api_client.post(url, content=junit_xml(1).encode("utf-8"))
+        assert resp.status_code == 404, resp.text
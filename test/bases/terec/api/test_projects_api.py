@@ -102,6 +102,30 @@ class TestGetOrgProjectsApi:
         response = self._put_project(org_name, "p")
         assert response.is_success, response.text
 
+    def test_train_compression_dict_needs_failures(self, cassandra_model):
+        org_name = random_name("org")
+        self._put_org(org_name, private=False)
+        self._put_project(org_name, "p")
+        response = self.api_client.post(
+            f"/admin/orgs/{org_name}/projects/p/compression-dict"
+        )
+        assert response.status_code == 400, response.text
+
+    def test_backfill_project_without_runs(self, cassandra_model):
+        org_name = random_name("org")
+        self._put_org(org_name, private=False)
+        self._put_project(org_name, "p")
+        response = self.api_client.post(
+            f"/admin/orgs/{org_name}/projects/p/failures/backfill"
+        )
+        assert response.is_success, response.text
+        assert response.json() == {"runs_count": 0, "failures_count": 0}
+        response = self.api_client.post(
+            f"/admin/orgs/{org_name}/projects/p/history/backfill"
+        )
+        assert response.is_success, response.text
+        assert response.json() == {"runs_count": 0, "test_runs_count": 0}
+
     def test_create_project_in_private_org(self, cassandra_model):
         # given private org
         org_name = random_name("org")
@@ -1,5 +1,7 @@
+import asyncio
 import pytest
 import json
+import uuid
 from unittest import SkipTest
 
 from fastapi.encoders import jsonable_encoder
@@ -11,8 +13,15 @@ from .random_data import (
     random_test_suite_run_info,
     random_test_case_run_info,
 )
+from terec.api.cache import suite_runs_cache
+from terec.api.compression import json_request_body
+from terec.api.routers import results as results_router
+from terec.api.routers.results import SuiteRunWithTests
+from terec.model.aggregates import COUNTERS, update_suite_run_aggregates
+from terec.model.ingest import IngestCounts
 from terec.model.projects import Org, Project
 from terec.model.results import TestSuite, TestSuiteRun, TestCaseRun, TestCaseRunStatus
+from terec.regression.fingerprint import failure_fingerprint
 
 
 def not_none(d: dict) -> dict:
@@ -112,6 +121,46 @@ class TestSuiteRunsAPI:
         assert suite_run.skip_count is not None
         assert suite_run.total_count is not None
 
+    def test_should_import_runs_with_tests_in_bulk(self, cassandra_model, org_name):
+        # given an existing project
+        org = Org.create(name=org_name)
+        prj = Project.create(org=org.name, name="a")
+        # and a stream of runs with tests, one of them in not existing project
+        runs = [
+            SuiteRunWithTests(
+                run=random_test_suite_run_info(org.name, prj.name, "ci", run_id=n),
+                tests=[random_test_case_run_info() for _ in range(n)],
+            )
+            for n in range(1, 6)
+        ]
+        runs[2].run.project = "not-existing"
+        body = "\n".join(r.model_dump_json(exclude_none=True) for r in runs)
+        # when it is imported in bulk
+        response = self.api_client.post(
+            f"/tests/orgs/{org.name}/runs/bulk", content=body
+        )
+        # then all but one runs are imported
+        assert response.status_code == 200, response.text
+        report = response.json()
+        assert report["runs_imported"] == 4
+        assert report["runs_failed"] == 1
+        assert [r["status"] for r in report["runs"]] == [
+            "OK",
+            "OK",
+            "FAILED",
+            "OK",
+            "OK",
+        ]
+        assert "Project not found" in report["runs"][2]["error"]
+        # and stored in the db with their tests
+        stored = TestSuiteRun.objects(org=org.name, project=prj.name, suite="ci")
+        assert [x.run_id for x in stored] == [5, 4, 2, 1]
+        for run_id in [1, 2, 4, 5]:
+            tests = TestCaseRun.objects(
+                org=org.name, project=prj.name, suite="ci", branch="main", run_id=run_id
+            )
+            assert len(tests) == len({str(t) for t in runs[run_id - 1].tests})
+
     # TODO: we need to add and test get methods
 
 
@@ -230,6 +279,344 @@ class TestCaseResultsAPI:
         )
         assert len(loaded) == len(tests)
 
+    @pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+    def test_should_write_compressed_test_results(
+        self, cassandra_model, public_project, public_project_suite_run, encoding
+    ):
+        # given compressed list of test results in some existing suite run
+        tests = [random_test_case_run_info() for _ in range(7)]
+        data, headers = json_request_body(
+            jsonable_encoder(tests, exclude_none=True), encoding
+        )
+        # when it is imported via api call
+        url = (
+            f"/tests/orgs/{public_project.org}/projects/{public_project.name}"
+            f"/suites/{public_project_suite_run.suite}/branches/{public_project_suite_run.branch}"
+            f"/runs/{public_project_suite_run.run_id}/tests"
+        )
+        resp = self.api_client.post(url, content=data, headers=headers)
+        # then it is accepted
+        assert resp.is_success, resp.text
+        assert resp.json()["test_count"] == len(tests)
+
+    def test_should_write_test_results_in_background(
+        self, cassandra_model, public_project, public_project_suite_run
+    ):
+        from terec.api.routers.jobs import ingest_queue
+
+        # given list of test results in some existing suite run
+        tests = [random_test_case_run_info() for _ in range(7)]
+        # when it is imported in async mode
+        url = (
+            f"/tests/orgs/{public_project.org}/projects/{public_project.name}"
+            f"/suites/{public_project_suite_run.suite}/branches/{public_project_suite_run.branch}"
+            f"/runs/{public_project_suite_run.run_id}/tests"
+        )
+        body = jsonable_encoder(tests, exclude_none=True)
+        resp = self.api_client.post(
+            url, content=json.dumps(body), params={"mode": "async"}
+        )
+        assert 202 == resp.status_code, resp.text
+        job_id = resp.json()["job_id"]
+        # then the job is processed
+        ingest_queue().join()
+        resp = self.api_client.get(f"/tests/orgs/{public_project.org}/jobs/{job_id}")
+        assert resp.is_success, resp.text
+        job = resp.json()
+        assert job["status"] == "DONE"
+        assert job["rows_total"] == len(tests)
+        assert job["rows_written"] == len(tests)
+        assert job["rows_failed"] == 0
+        # and test results are stored in the database
+        loaded = TestCaseRun.objects(
+            org=public_project.org,
+            project=public_project.name,
+            suite=public_project_suite_run.suite,
+            branch=public_project_suite_run.branch,
+            run_id=public_project_suite_run.run_id,
+        )
+        assert len(loaded) == len({str(t) for t in tests})
+
+    def test_should_read_back_big_test_output(
+        self, cassandra_model, public_project, public_project_suite_run
+    ):
+        # given test results sharing big stacktrace and having big stdout
+        stacktrace = "java.lang.AssertionError\n" + "\tat org.example.Test\n" * 50
+        tests = [random_test_case_run_info(result="FAIL") for _ in range(3)]
+        for i, t in enumerate(tests):
+            t.test_case = f"test_{i}"
+            t.error_stacktrace = stacktrace
+            t.stdout = f"output of test {i} " * 100
+        # when they are imported
+        body = jsonable_encoder(tests, exclude_none=True)
+        resp = self.post_test_results(
+            public_project.org,
+            public_project.name,
+            public_project_suite_run.suite,
+            public_project_suite_run.branch,
+            public_project_suite_run.run_id,
+            json.dumps(body),
+        )
+        assert resp.is_success, resp.text
+        # then rows keep only hashes
+        loaded = TestCaseRun.objects(
+            org=public_project.org,
+            project=public_project.name,
+            suite=public_project_suite_run.suite,
+            branch=public_project_suite_run.branch,
+            run_id=public_project_suite_run.run_id,
+        )
+        assert all(x.error_stacktrace is None for x in loaded)
+        assert len({x.error_stacktrace_hash for x in loaded}) == 1
+        # and full texts are returned by the api
+        resp = self.get_test_results(
+            public_project.org,
+            public_project.name,
+            public_project_suite_run.suite,
+            public_project_suite_run.branch,
+            public_project_suite_run.run_id,
+        )
+        assert resp.is_success, resp.text
+        returned = {x["test_case"]: x for x in resp.json()}
+        for t in tests:
+            assert returned[t.test_case]["error_stacktrace"] == stacktrace
+            assert returned[t.test_case]["stdout"] == t.stdout
+
+    def test_should_read_back_output_compressed_with_project_dictionary(
+        self, cassandra_model, public_project, public_project_suite_run
+    ):
+        # given project with failures used to train compression dictionary
+        run = public_project_suite_run
+
+        def failures(prefix: str) -> list:
+            tests = [random_test_case_run_info(result="FAIL") for _ in range(30)]
+            for i, t in enumerate(tests):
+                t.test_case = f"{prefix}_{i}"
+                t.error_stacktrace = (
+                    f"java.lang.AssertionError: {prefix} {i}\n"
+                    + "".join(
+                        f"\tat org.example.Test{j}.method(Test.java:{i + j})\n"
+                        for j in range(20)
+                    )
+                )
+            return tests
+
+        def post(tests):
+            body = jsonable_encoder(tests, exclude_none=True)
+            resp = self.post_test_results(
+                run.org,
+                run.project,
+                run.suite,
+                run.branch,
+                run.run_id,
+                json.dumps(body),
+            )
+            assert resp.is_success, resp.text
+
+        post(failures("sample"))
+        url = f"/admin/orgs/{run.org}/projects/{run.project}/compression-dict"
+        resp = self.api_client.post(url)
+        assert resp.status_code == 201, resp.text
+        assert resp.json()["samples"] >= 30
+        # when new failures are imported
+        tests = failures("test")
+        post(tests)
+        # then they are returned decompressed
+        resp = self.get_test_results(
+            run.org, run.project, run.suite, run.branch, run.run_id
+        )
+        assert resp.is_success, resp.text
+        returned = {x["test_case"]: x for x in resp.json()}
+        for t in tests:
+            assert returned[t.test_case]["error_stacktrace"] == t.error_stacktrace
+
+    def test_should_store_failure_fingerprint(
+        self, cassandra_model, public_project, public_project_suite_run
+    ):
+        # given failed and passed test results
+        failed = random_test_case_run_info(result="FAIL")
+        failed.error_stacktrace = "java.lang.AssertionError\n\tat org.example.Test:42"
+        passed = random_test_case_run_info(result="PASS")
+        passed.test_case = failed.test_case + "_passed"
+        # when they are imported
+        body = jsonable_encoder([failed, passed], exclude_none=True)
+        resp = self.post_test_results(
+            public_project.org,
+            public_project.name,
+            public_project_suite_run.suite,
+            public_project_suite_run.branch,
+            public_project_suite_run.run_id,
+            json.dumps(body),
+        )
+        assert resp.is_success, resp.text
+        # then only the failure has fingerprint
+        loaded = {
+            x.test_case: x
+            for x in TestCaseRun.objects(
+                org=public_project.org,
+                project=public_project.name,
+                suite=public_project_suite_run.suite,
+                branch=public_project_suite_run.branch,
+                run_id=public_project_suite_run.run_id,
+            )
+        }
+        assert loaded[failed.test_case].failure_fingerprint == failure_fingerprint(
+            failed.error_stacktrace
+        )
+        assert loaded[passed.test_case].failure_fingerprint is None
+
+    def test_should_skip_unchanged_test_results(
+        self, cassandra_model, public_project, public_project_suite_run
+    ):
+        # given test results already imported
+        run = public_project_suite_run
+        tests = [random_test_case_run_info() for _ in range(5)]
+        for i, test in enumerate(tests):
+            test.test_case = f"test_case_{i}"
+
+        def post(tests) -> dict:
+            body = jsonable_encoder(tests, exclude_none=True)
+            resp = self.post_test_results(
+                run.org,
+                run.project,
+                run.suite,
+                run.branch,
+                run.run_id,
+                json.dumps(body),
+            )
+            assert resp.is_success, resp.text
+            return resp.json()
+
+        assert post(tests)["written_count"] == 5
+        # when they are imported again with one of them changed
+        tests[0].result = TestCaseRunStatus.FAIL
+        report = post(tests)
+        # then only the changed one is written
+        assert report["test_count"] == 5
+        assert report["written_count"] == 1
+        assert report["skipped_count"] == 4
+
+    def test_should_count_suite_run_results_once(
+        self, cassandra_model, public_project, public_project_suite_run
+    ):
+        # given some passed and failed test results
+        run = public_project_suite_run
+        passed = [random_test_case_run_info(result="PASS") for _ in range(3)]
+        failed = [random_test_case_run_info(result="FAIL") for _ in range(2)]
+        for i, test in enumerate(passed + failed):
+            test.test_case = f"test_case_{i}"
+
+        def post(tests):
+            body = jsonable_encoder(tests, exclude_none=True)
+            resp = self.post_test_results(
+                run.org,
+                run.project,
+                run.suite,
+                run.branch,
+                run.run_id,
+                json.dumps(body),
+            )
+            assert resp.is_success, resp.text
+
+        # when they are imported in two chunks and one chunk is sent again
+        # with one of the failed tests re-run and passed
+        post(passed)
+        post(failed)
+        rerun = failed[0].model_copy(update={"result": TestCaseRunStatus.PASS})
+        post([failed[1], rerun])
+        # then every test is counted once with its last result
+        url = f"/tests/orgs/{run.org}/projects/{run.project}/suites/{run.suite}/branches/{run.branch}/runs/{run.run_id}/"
+        info = self.api_client.get(url).json()
+        assert info["pass_count"] == 4
+        assert info["fail_count"] == 1
+        assert info["skip_count"] == 0
+        assert info["total_count"] == 5
+        assert info["tests_duration_ms"] == sum(
+            t.duration_ms for t in passed + [failed[1], rerun]
+        )
+
+    def test_should_recount_suite_run_results(
+        self, cassandra_model, public_project, public_project_suite_run
+    ):
+        # given imported test results
+        run = public_project_suite_run
+        tests = [random_test_case_run_info(result="PASS") for _ in range(3)]
+        for i, test in enumerate(tests):
+            test.test_case = f"test_case_{i}"
+        body = jsonable_encoder(tests, exclude_none=True)
+        resp = self.post_test_results(
+            run.org, run.project, run.suite, run.branch, run.run_id, json.dumps(body)
+        )
+        assert resp.is_success, resp.text
+        # and counters which drifted (e.g. counted twice by overlapping uploads)
+        drift = {c: 1 for c in COUNTERS}
+        update_suite_run_aggregates(run, drift)
+        # when the run is recounted
+        url = f"/tests/orgs/{run.org}/projects/{run.project}/suites/{run.suite}/branches/{run.branch}/runs/{run.run_id}"
+        resp = self.api_client.post(f"{url}/recount")
+        assert resp.is_success, resp.text
+        # then counts match the stored tests
+        info = self.api_client.get(f"{url}/").json()
+        assert resp.json()["total_count"] == info["total_count"] == 3
+        assert info["pass_count"] == 3
+        assert info["tests_duration_ms"] == sum(t.duration_ms for t in tests)
+
+    def test_should_fail_for_non_existing_job(self, cassandra_model, public_project):
+        resp = self.api_client.get(
+            f"/tests/orgs/{public_project.org}/jobs/{uuid.uuid4()}"
+        )
+        assert 404 == resp.status_code, resp.text
+
+    def post_test_results_ndjson(
+        self, org: str, prj: str, suite: str, branch: str, run: int, body: str
+    ):
+        url = f"/tests/orgs/{org}/projects/{prj}/suites/{suite}/branches/{branch}/runs/{run}/tests/ndjson"
+        return self.api_client.post(url, content=body)
+
+    def test_should_write_test_results_from_ndjson(
+        self, cassandra_model, public_project, public_project_suite_run
+    ):
+        # given list of test results in some existing suite run
+        tests = [random_test_case_run_info() for _ in range(1100)]
+        # when it is imported as ndjson stream
+        body = "\n".join(t.model_dump_json(exclude_none=True) for t in tests)
+        resp = self.post_test_results_ndjson(
+            public_project.org,
+            public_project.name,
+            public_project_suite_run.suite,
+            public_project_suite_run.branch,
+            public_project_suite_run.run_id,
+            body,
+        )
+        assert resp.is_success, resp.text
+        assert resp.json()["test_count"] == len(tests)
+        # then it is correctly stored in the database
+        loaded = TestCaseRun.objects(
+            org=public_project.org,
+            project=public_project.name,
+            suite=public_project_suite_run.suite,
+            branch=public_project_suite_run.branch,
+            run_id=public_project_suite_run.run_id,
+        )
+        assert len(loaded) == len({str(t) for t in tests})
+
+    def test_should_fail_for_invalid_ndjson_line(
+        self, cassandra_model, public_project, public_project_suite_run
+    ):
+        tests = [random_test_case_run_info() for _ in range(3)]
+        lines = [t.model_dump_json(exclude_none=True) for t in tests]
+        lines.insert(2, '{"test_package": "org.example"}')
+        resp = self.post_test_results_ndjson(
+            public_project.org,
+            public_project.name,
+            public_project_suite_run.suite,
+            public_project_suite_run.branch,
+            public_project_suite_run.run_id,
+            "\n".join(lines),
+        )
+        assert 400 == resp.status_code, resp.text
+        assert "line 3" in resp.text
+
     def test_should_get_test_results(self, cassandra_model, public_project):
         org, project = public_project.org, public_project.name
         branch = "main"
@@ -274,6 +661,65 @@ class TestCaseResultsAPI:
         ]
         assert len(run_tests) == len(resp.json())
 
+    def test_should_get_test_results_in_pages(self, cassandra_model, public_project):
+        org, project = public_project.org, public_project.name
+        branch = "main"
+        suite, suite_runs, test_runs = generate_suite_with_test_runs(
+            org, project, branch=branch, num_runs=1
+        )
+        run_id = suite_runs[0].run_id
+        url = (
+            f"/tests/orgs/{org}/projects/{project}/suites/{suite.suite}"
+            f"/branches/{branch}/runs/{run_id}/tests"
+        )
+        # when tests are read page by page
+        loaded, params = [], {"page_size": 3}
+        while True:
+            resp = self.api_client.get(url, params=params)
+            assert resp.is_success, resp.text
+            assert len(resp.json()) <= 3
+            loaded += resp.json()
+            token = resp.headers.get("X-Next-Page-Token")
+            if not token:
+                break
+            params["page_token"] = token
+        # then all of them are returned once
+        run_tests = [x for x in test_runs if x.run_id == run_id]
+        assert len(loaded) == len(run_tests)
+        assert len({x["test_case"] for x in loaded}) == len(run_tests)
+
+    def test_should_fail_for_invalid_page_token(
+        self, cassandra_model, public_project_suite_run
+    ):
+        run = public_project_suite_run
+        url = (
+            f"/tests/orgs/{run.org}/projects/{run.project}/suites/{run.suite}"
+            f"/branches/{run.branch}/runs/{run.run_id}/tests"
+        )
+        resp = self.api_client.get(url, params={"page_size": 3, "page_token": "%%"})
+        assert 400 == resp.status_code, resp.text
+
+    def test_should_stream_test_results_as_ndjson(
+        self, cassandra_model, public_project
+    ):
+        org, project = public_project.org, public_project.name
+        branch = "main"
+        suite, suite_runs, test_runs = generate_suite_with_test_runs(
+            org, project, branch=branch, num_runs=1
+        )
+        run_id = suite_runs[0].run_id
+        url = (
+            f"/tests/orgs/{org}/projects/{project}/suites/{suite.suite}"
+            f"/branches/{branch}/runs/{run_id}/tests/ndjson"
+        )
+        resp = self.api_client.get(url, params={"result": "FAIL"})
+        assert resp.is_success, resp.text
+        assert resp.headers["content-type"] == "application/x-ndjson"
+        lines = [json.loads(line) for line in resp.text.splitlines()]
+        failed = [x for x in test_runs if x.result == TestCaseRunStatus.FAIL]
+        assert len(lines) == len(failed)
+        assert all(x["result"] == "FAIL" for x in lines)
+
 
 @pytest.mark.usefixtures("api_client")
 class TestIgnoreSuiteRunAPI:
@@ -287,3 +733,30 @@ class TestIgnoreSuiteRunAPI:
         # mark it ignored and check it is indeed
         # remove ignored status and check it is not ignored
         raise SkipTest("ignore api not implemented")
+
+
+def test_writing_tests_invalidates_cached_suite_runs(monkeypatch):
+    suite_runs_cache.clear()
+    run = TestSuiteRun(org="o", project="p", suite="s", branch="main", run_id=1)
+
+    async def write_async(suite_run, tests):
+        return IngestCounts(written=len(tests))
+
+    monkeypatch.setattr(results_router, "write_test_case_runs_async", write_async)
+    monkeypatch.setattr(
+        results_router, "write_test_case_runs", lambda r, t: IngestCounts()
+    )
+    # given cached runs of the suite on the branch and on all branches
+    keys = [("o", "p", "s", "main", 32), ("o", "p", "s", None, 32)]
+    other = ("o", "p", "s", "other", 32)
+    for key in keys + [other]:
+        suite_runs_cache.put(key, [run])
+    # when tests of a run are written then cached runs with old counts are dropped
+    asyncio.run(results_router.write_suite_run_tests_async(run, []))
+    assert all(suite_runs_cache.get(key) is None for key in keys)
+    assert suite_runs_cache.get(other)
+    # and the same for the sync version
+    suite_runs_cache.put(keys[0], [run])
+    results_router.write_suite_run_tests(run, [])
+    assert suite_runs_cache.get(keys[0]) is None
+    suite_runs_cache.clear()
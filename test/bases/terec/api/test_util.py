@@ -0,0 +1,29 @@
+import asyncio
+
+from terec.api.routers.util import iter_ndjson_lines
+
+
+async def _stream(chunks: list[bytes]):
+    for c in chunks:
+        yield c
+
+
+def collect_ndjson_lines(chunks: list[bytes]) -> list[bytes]:
+    async def collect():
+        return [line async for line in iter_ndjson_lines(_stream(chunks))]
+
+    return asyncio.run(collect())
+
+
+def test_ndjson_lines_split_across_chunks():
+    chunks = [b'{"a": 1}\n{"b"', b": 2}\n", b'{"c": 3}']
+    assert collect_ndjson_lines(chunks) == [b'{"a": 1}', b'{"b": 2}', b'{"c": 3}']
+
+
+def test_ndjson_empty_lines_are_skipped():
+    chunks = [b"\n\n", b'{"a": 1}\r\n', b"  \n"]
+    assert collect_ndjson_lines(chunks) == [b'{"a": 1}\r']
+
+
+def test_ndjson_empty_stream():
+    assert collect_ndjson_lines([]) == []
@@ -1,6 +1,11 @@
 import pytest
-from terec.converters.junit.converter import JunitXmlConverter
-from terec.api.routers.results import TestCaseRunStatus, TestSuiteRunStatus
+from terec.converters.junit.converter import JunitXmlConverter, JunitXmlStreamParser
+from terec.api.routers.results import (
+    TestCaseRunInfo,
+    TestCaseRunStatus,
+    TestSuiteRunInfo,
+    TestSuiteRunStatus,
+)
 
 
 @pytest.fixture
@@ -140,3 +145,30 @@ def test_junit_converter_handles_multiple_suites():
     for case in cases_a + cases_b:
         assert case.stdout is None
         assert case.stderr is None
+
+
+def test_junit_stream_parser_returns_the_same_as_converter(sample_pytest_junit_xml):
+    # given xml fed to the parser in small chunks
+    parser = JunitXmlStreamParser()
+    data = sample_pytest_junit_xml.encode("utf-8")
+    parsed = []
+    for i in range(0, len(data), 16):
+        parsed += parser.feed(data[i : i + 16])
+    parsed += parser.close()
+    # then suite and all its test cases are parsed like by the converter
+    converter = JunitXmlConverter(sample_pytest_junit_xml)
+    suites = [x for x in parsed if isinstance(x, TestSuiteRunInfo)]
+    cases = [x for x in parsed if isinstance(x, TestCaseRunInfo)]
+    assert [s.suite for s in suites] == ["pytest"]
+    assert suites[0].total_count == 4
+    assert cases == converter.get_test_cases_for_suite("pytest")
+
+
+def test_junit_stream_parser_drops_parsed_test_cases():
+    parser = JunitXmlStreamParser()
+    parser.feed(b'<testsuites><testsuite name="s">')
+    suite_element = parser.elements[-1]
+    for i in range(100):
+        cases = parser.feed(f'<testcase classname="m" name="t{i}"/>'.encode("utf-8"))
+        assert [c.test_case for c in cases] == [f"t{i}"]
+    assert len(suite_element) == 0
@@ -0,0 +1,106 @@
+import asyncio
+import threading
+
+from cassandra import OperationTimedOut
+
+from terec.database.aio import execute_aio, execute_concurrent_aio, iter_pages_aio
+from terec.database.concurrency import AimdConcurrency
+
+
+class FakeResponseFuture:
+    """
+    Returns given pages of rows (or error) calling callbacks from another thread.
+    """
+
+    def __init__(self, pages: list | Exception):
+        self.pages = pages
+        self.has_more_pages = False
+
+    def add_callbacks(self, callback, errback):
+        self.callback, self.errback = callback, errback
+        self.start_fetching_next_page()
+
+    def start_fetching_next_page(self):
+        def complete():
+            if isinstance(self.pages, Exception):
+                self.errback(self.pages)
+                return
+            page = self.pages.pop(0)
+            self.has_more_pages = bool(self.pages)
+            self.callback(page)
+
+        threading.Thread(target=complete).start()
+
+
+class FakeSession:
+    def __init__(self, timeouts: int = 0):
+        self.timeouts = timeouts
+
+    def execute_async(self, statement, params):
+        if statement == "timeout" and self.timeouts > 0:
+            self.timeouts -= 1
+            return FakeResponseFuture(OperationTimedOut("timeout"))
+        return FakeResponseFuture([[params], [params + 1]])
+
+
+def test_execute_aio_returns_rows_of_all_pages():
+    rows = asyncio.run(execute_aio(FakeSession(), "select", 1))
+    assert rows == [1, 2]
+
+
+def test_execute_aio_raises_errors():
+    async def execute():
+        return await execute_aio(FakeSession(timeouts=1), "timeout", 1)
+
+    try:
+        asyncio.run(execute())
+        assert False, "expected timeout"
+    except OperationTimedOut:
+        pass
+
+
+def test_execute_concurrent_aio_returns_results_in_order():
+    concurrency = AimdConcurrency("test", initial=4, max_limit=4)
+    statements = [("select", i * 10) for i in range(50)]
+    results = asyncio.run(
+        execute_concurrent_aio(FakeSession(), statements, concurrency)
+    )
+    assert [rows for ok, rows in results] == [[i * 10, i * 10 + 1] for i in range(50)]
+
+
+def test_execute_concurrent_aio_retries_overloaded_requests():
+    concurrency = AimdConcurrency("test", initial=8)
+    session = FakeSession(timeouts=2)
+    results = asyncio.run(
+        execute_concurrent_aio(session, [("timeout", 1)], concurrency)
+    )
+    assert results[0].success
+    assert concurrency.current() == 4
+    session = FakeSession(timeouts=5)
+    results = asyncio.run(
+        execute_concurrent_aio(session, [("timeout", 1)], concurrency, max_retries=1)
+    )
+    assert not results[0].success
+
+
+def test_iter_pages_aio_yields_pages_on_demand():
+    pages = [[1, 2], [3], [4, 5]]
+    future = FakeResponseFuture(pages)
+
+    class PagingSession:
+        def execute_async(self, statement, params):
+            return future
+
+    async def first_page():
+        async for page in iter_pages_aio(PagingSession(), "stmt"):
+            return page
+
+    assert asyncio.run(first_page()) == [1, 2]
+    # next pages were not fetched
+    assert pages == [[3], [4, 5]]
+
+    async def all_pages():
+        return [p async for p in iter_pages_aio(PagingSession(), "stmt")]
+
+    future = FakeResponseFuture([[1, 2], [3], [4, 5]])
+    assert asyncio.run(all_pages()) == [[1, 2], [3], [4, 5]]
@@ -0,0 +1,38 @@
+from terec.database.batch import (
+    CELL_OVERHEAD_BYTES,
+    UnloggedBatchWriter,
+    estimated_size,
+)
+
+
+def test_estimated_size():
+    overhead = CELL_OVERHEAD_BYTES
+    assert estimated_size(("abc", None, 7, b"12")) == 3 + 8 + 2 + 4 * overhead
+    assert estimated_size(("żółw",)) == 7 + overhead
+
+
+def test_rows_are_grouped_by_partition():
+    writer = UnloggedBatchWriter(session=None, max_batch_bytes=1024)
+    for i in range(6):
+        writer.add(("p", i % 2), "stmt", (f"row-{i}",))
+    assert writer.num_rows == 6
+    assert not writer.ready_batches
+    assert len(writer.open_batches) == 2
+    assert [len(rows) for rows, _ in writer.open_batches.values()] == [3, 3]
+
+
+def test_batches_are_split_by_size():
+    row_size = 4 + CELL_OVERHEAD_BYTES
+    writer = UnloggedBatchWriter(session=None, max_batch_bytes=2 * row_size + 1)
+    for i in range(5):
+        writer.add(("p",), "stmt", ("x" * 4,))
+    assert [len(rows) for rows in writer.ready_batches] == [2, 2]
+    rows, size = writer.open_batches[("p",)]
+    assert len(rows) == 1 and size == row_size
+
+
+def test_no_batching_with_zero_limit():
+    writer = UnloggedBatchWriter(session=None, max_batch_bytes=0)
+    for i in range(3):
+        writer.add(("p",), "stmt", ("x",))
+    assert [len(rows) for rows in writer.ready_batches] == [1, 1]
@@ -0,0 +1,139 @@
+import threading
+
+from cassandra import OperationTimedOut
+
+from terec.database.concurrency import (
+    RETRY_DELAY_SEC,
+    AimdConcurrency,
+    execute_adaptive,
+    retry_delay,
+)
+
+
+def test_concurrency_grows_additively():
+    concurrency = AimdConcurrency("test", initial=4, max_limit=8)
+    # about one round of successful requests adds one
+    for _ in range(5):
+        concurrency.on_success(latency=0.001)
+    assert concurrency.current() == 5
+    for _ in range(100):
+        concurrency.on_success(latency=0.001)
+    assert concurrency.current() == 8
+
+
+def test_concurrency_is_halved_once_per_round():
+    concurrency = AimdConcurrency("test", initial=32, min_limit=4)
+    concurrency.on_overload()
+    assert concurrency.current() == 16
+    # other requests of the same round do not decrease it further
+    for _ in range(10):
+        concurrency.on_overload()
+    assert concurrency.current() == 16
+    for _ in range(6):
+        concurrency.on_overload()
+    assert concurrency.current() == 8
+
+
+def test_concurrency_decreases_on_high_latency():
+    concurrency = AimdConcurrency("test", initial=32, target_latency_ms=100)
+    concurrency.on_success(latency=0.5)
+    assert concurrency.current() == 16
+
+
+def test_concurrency_stays_within_limits():
+    concurrency = AimdConcurrency("test", initial=100, min_limit=4, max_limit=10)
+    assert concurrency.current() == 10
+    for _ in range(100):
+        concurrency.on_overload()
+    assert concurrency.current() == 4
+
+
+class FakeFuture:
+    has_more_pages = False
+    _col_names = None
+    _col_types = None
+    _continuous_paging_session = None
+
+    def __init__(self, session, result):
+        self.session = session
+        self.result = result
+
+    def add_callbacks(self, callback, callback_args, errback, errback_args):
+        # complete in another thread like the driver does
+        def complete():
+            with self.session.lock:
+                self.session.in_flight -= 1
+            if isinstance(self.result, Exception):
+                errback(self.result, *errback_args)
+            else:
+                callback([self.result], *callback_args)
+
+        threading.Thread(target=complete).start()
+
+    def clear_callbacks(self):
+        pass
+
+
+class FakeSession:
+    """
+    Returns params as the only row. Statement "timeout" fails with OperationTimedOut
+    given number of times.
+    """
+
+    def __init__(self, timeouts: int = 0):
+        self.timeouts = timeouts
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def execute_async(self, statement, params):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            if statement == "timeout" and self.timeouts > 0:
+                self.timeouts -= 1
+                return FakeFuture(self, OperationTimedOut("timeout"))
+        return FakeFuture(self, params)
+
+
+def test_execute_adaptive_returns_results_in_order():
+    session = FakeSession()
+    concurrency = AimdConcurrency("test", initial=4, max_limit=4)
+    results = execute_adaptive(session, [("ok", i) for i in range(100)], concurrency)
+    assert [list(rows) for ok, rows in results] == [[i] for i in range(100)]
+    assert session.max_in_flight <= 4
+
+
+def test_execute_adaptive_retries_overloaded_requests():
+    session = FakeSession(timeouts=2)
+    concurrency = AimdConcurrency("test", initial=8)
+    results = execute_adaptive(session, [("timeout", 1)], concurrency)
+    assert results[0].success
+    assert concurrency.current() == 4
+
+
+def test_execute_adaptive_reports_errors():
+    session = FakeSession(timeouts=10)
+    concurrency = AimdConcurrency("test")
+    results = execute_adaptive(session, [("timeout", 1)], concurrency, max_retries=1)
+    assert not results[0].success
+    assert isinstance(results[0].result_or_exc, OperationTimedOut)
+
+
+def test_retry_delay_grows_with_attempts():
+    for attempt in [1, 2, 3]:
+        delays = [retry_delay(attempt) for _ in range(100)]
+        assert 0 <= min(delays) < max(delays) <= RETRY_DELAY_SEC * 2 ** (attempt - 1)
+
+
+class FailingConcurrency(AimdConcurrency):
+    def on_success(self, latency: float) -> None:
+        raise RuntimeError("callback failure")
+
+
+def test_execute_adaptive_completes_when_callback_fails():
+    session = FakeSession()
+    concurrency = FailingConcurrency("test", initial=4)
+    results = execute_adaptive(session, [("ok", i) for i in range(10)], concurrency)
+    assert all(not r.success for r in results)
+    assert isinstance(results[0].result_or_exc, RuntimeError)
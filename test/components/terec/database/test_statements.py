@@ -0,0 +1,120 @@
+import asyncio
+from types import SimpleNamespace
+
+from terec.database.statements import StatementRegistry
+
+
+class FakeSession:
+    def __init__(self):
+        self.prepared = []
+
+    def prepare(self, cql):
+        self.prepared.append(cql)
+        return f"prepared: {cql}"
+
+
+def test_statement_is_prepared_once():
+    registry = StatementRegistry()
+    registry.register("select", lambda: "SELECT 1")
+    session = FakeSession()
+    assert registry.get("select", session) == "prepared: SELECT 1"
+    assert registry.get("select", session) == "prepared: SELECT 1"
+    assert session.prepared == ["SELECT 1"]
+
+
+def test_warm_up_prepares_all_statements():
+    registry = StatementRegistry()
+    registry.register("select", lambda: "SELECT 1")
+    registry.register("insert", lambda: "INSERT 1")
+    session = FakeSession()
+    registry.warm_up(session)
+    assert sorted(session.prepared) == ["INSERT 1", "SELECT 1"]
+    registry.get("insert", session)
+    assert len(session.prepared) == 2
+
+
+def test_statements_are_prepared_again_for_new_session():
+    registry = StatementRegistry()
+    registry.register("select", lambda: "SELECT 1")
+    old_session, new_session = FakeSession(), FakeSession()
+    registry.get("select", old_session)
+    registry.get("select", new_session)
+    assert new_session.prepared == ["SELECT 1"]
+
+
+def test_statements_are_prepared_again_after_invalidate():
+    registry = StatementRegistry()
+    registry.register("select", lambda: "SELECT 1")
+    session = FakeSession()
+    registry.get("select", session)
+    registry.invalidate()
+    registry.get("select", session)
+    assert session.prepared == ["SELECT 1", "SELECT 1"]
+
+
+def test_projected_statement_is_prepared_once_per_columns():
+    registry = StatementRegistry()
+    registry.register("select", lambda columns=None: f"SELECT {columns or '*'}")
+    session = FakeSession()
+    registry.get_projected("select", None, session)
+    registry.get_projected("select", ("a", "b"), session)
+    registry.get_projected("select", ("a", "b"), session)
+    registry.get_projected("select", ("a",), session)
+    assert session.prepared == ["SELECT *", "SELECT ('a', 'b')", "SELECT ('a',)"]
+
+
+class FakeClusterSession:
+    """
+    Session with driver metadata of a single table: statements are bound to it.
+    """
+
+    def __init__(self):
+        self.prepared = []
+        self.cluster = SimpleNamespace(metadata=SimpleNamespace(keyspaces={}))
+        self.alter_table()
+
+    def alter_table(self):
+        # driver replaces table metadata on schema change events
+        tables = {"t": object()}
+        self.cluster.metadata.keyspaces["ks"] = SimpleNamespace(tables=tables)
+
+    def prepare(self, cql):
+        self.prepared.append(cql)
+        return SimpleNamespace(
+            column_metadata=[SimpleNamespace(keyspace_name="ks", table_name="t")]
+        )
+
+
+def test_statements_are_prepared_again_after_table_schema_change():
+    registry = StatementRegistry()
+    registry.register("select", lambda: "SELECT * FROM ks.t WHERE a=?")
+    session = FakeClusterSession()
+    registry.get("select", session)
+    registry.get("select", session)
+    assert len(session.prepared) == 1
+    session.alter_table()
+    registry.get("select", session)
+    registry.get("select", session)
+    assert len(session.prepared) == 2
+
+
+def test_async_get_prepares_once():
+    registry = StatementRegistry()
+    registry.register("select", lambda columns=None: f"SELECT {columns or '*'}")
+    session = FakeSession()
+
+    async def get_twice():
+        await registry.get_projected_async("select", ("a",), session)
+        return await registry.get_async("select(a)", session)
+
+    assert asyncio.run(get_twice()) == "prepared: SELECT ('a',)"
+    assert session.prepared == ["SELECT ('a',)"]
+
+
+def test_registered_projections_are_warmed_up():
+    registry = StatementRegistry()
+    registry.register("select", lambda columns=None: f"SELECT {columns or '*'}")
+    registry.register_projection("select", ("a",))
+    session = FakeSession()
+    registry.warm_up(session)
+    assert sorted(session.prepared) == sorted(["SELECT *", "SELECT ('a',)"])
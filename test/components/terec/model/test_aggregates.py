@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+
+from terec.model.aggregates import aggregates_delta, results_aggregates
+from terec.model.manifest import ManifestEntry, case_key
+from terec.model.results import TestCaseRunStatus
+
+
+def case_run(name: str, result: str, duration_ms: int | None = None):
+    return SimpleNamespace(
+        test_package="org.example",
+        test_suite="TestSuite",
+        test_case=name,
+        test_config="#",
+        result=TestCaseRunStatus(result),
+        duration_ms=duration_ms,
+    )
+
+
+def test_new_tests_are_added():
+    tests = [
+        case_run("a", "PASS", 10),
+        case_run("b", "FAIL", 20),
+        case_run("c", "SKIP"),
+    ]
+    delta = aggregates_delta({}, tests)
+    assert delta == {
+        "pass_count": 1,
+        "fail_count": 1,
+        "skip_count": 1,
+        "total_count": 3,
+        "duration_ms": 30,
+    }
+
+
+def test_repeated_tests_do_not_change_counts():
+    tests = [case_run("a", "PASS", 10), case_run("b", "FAIL", 20)]
+    existing = {
+        case_key(t): ManifestEntry(t.result.value, t.duration_ms, None) for t in tests
+    }
+    delta = aggregates_delta(existing, tests)
+    assert not any(delta.values())
+
+
+def test_changed_result_replaces_existing_one():
+    existing = {case_key(case_run("a", "FAIL")): ManifestEntry("FAIL", 100, None)}
+    delta = aggregates_delta(existing, [case_run("a", "PASS", 30)])
+    assert delta == {
+        "pass_count": 1,
+        "fail_count": -1,
+        "skip_count": 0,
+        "total_count": 0,
+        "duration_ms": -70,
+    }
+
+
+def test_last_result_wins_within_chunk():
+    tests = [case_run("a", "FAIL", 10), case_run("a", "PASS", 20)]
+    delta = aggregates_delta({}, tests)
+    assert delta["pass_count"] == 1
+    assert delta["fail_count"] == 0
+    assert delta["total_count"] == 1
+    assert delta["duration_ms"] == 20
+
+
+def test_results_aggregates():
+    counts = results_aggregates(
+        [("PASS", 10), ("FAIL", 20), ("SKIP", None), ("PASS", 5)]
+    )
+    assert counts == {
+        "pass_count": 2,
+        "fail_count": 1,
+        "skip_count": 1,
+        "total_count": 4,
+        "duration_ms": 35,
+    }
@@ -0,0 +1,114 @@
+from terec.model.blobs import (
+    BLOB_MIN_SIZE,
+    TextBlobs,
+    _KnownBlobs,
+    _blob_dict_ids,
+    _set_blob_texts,
+    mark_blobs_written,
+    new_blob_rows,
+    text_hash,
+)
+from terec.model.results import TestCaseRun
+from terec.model.text_compression import (
+    NO_DICT,
+    compress_text,
+    decompress_text,
+    project_dicts,
+)
+
+
+def test_text_hash_is_stable_and_content_based():
+    assert text_hash("some text") == text_hash("some text")
+    assert text_hash("some text") != text_hash("other text")
+    assert len(text_hash("some text")) == 32
+
+
+def test_short_texts_are_kept_inline():
+    blobs = TextBlobs("org", "prj")
+    assert blobs.add(None) == (None, None)
+    assert blobs.add("short") == ("short", None)
+    assert not blobs.blobs
+
+
+def test_big_texts_are_stored_once():
+    blobs = TextBlobs("org", "prj")
+    text = "x" * BLOB_MIN_SIZE
+    inline_1, hash_1 = blobs.add(text)
+    inline_2, hash_2 = blobs.add(text)
+    assert inline_1 is None and inline_2 is None
+    assert hash_1 == hash_2 == text_hash(text)
+    assert blobs.blobs == {hash_1: text}
+
+
+def test_written_blobs_are_not_written_again():
+    blobs = TextBlobs("org-blobs-test", "prj")
+    _, h = blobs.add("y" * BLOB_MIN_SIZE)
+    project_dicts.put("org-blobs-test", "prj", None)
+    project_dicts.put("org-blobs-test", "other-prj", None)
+    rows = new_blob_rows(blobs)
+    assert len(rows) == 1
+    assert rows[0][:3] == ("org-blobs-test", "prj", h)
+    assert rows[0][4] == NO_DICT
+    assert decompress_text("org-blobs-test", "prj", NO_DICT, rows[0][3]) == (
+        "y" * BLOB_MIN_SIZE
+    )
+    mark_blobs_written(rows)
+    assert new_blob_rows(blobs) == []
+    # the same content in other project is a different blob
+    other = TextBlobs("org-blobs-test", "other-prj")
+    other.add("y" * BLOB_MIN_SIZE)
+    assert len(new_blob_rows(other)) == 1
+
+
+def test_known_blobs_are_bounded():
+    known = _KnownBlobs(max_size=2)
+    known.add("a")
+    known.add("b")
+    assert "a" in known
+    known.add("c")
+    # "b" was least recently used
+    assert "b" not in known
+    assert "a" in known and "c" in known
+
+
+def test_dictionaries_of_loaded_blobs():
+    keys = [("org", "a", "h1"), ("org", "a", "h2"), ("org", "b", "h3")]
+    results = [
+        (True, [{"compressed": b"x", "dict_id": 7}]),
+        (True, [{"compressed": b"x", "dict_id": NO_DICT}, {"compressed": None}]),
+        (False, Exception("failed")),
+    ]
+    assert _blob_dict_ids(keys, results) == {("org", "a"): {7}}
+
+
+def test_blobs_written_before_compression_are_read_uncompressed():
+    project_dicts.put("org-blobs-test", "prj", None)
+    old_text, new_text = "old " * BLOB_MIN_SIZE, "new " * BLOB_MIN_SIZE
+    _, data = compress_text("org-blobs-test", "prj", new_text)
+    test_run = TestCaseRun(
+        org="org-blobs-test",
+        project="prj",
+        stdout_hash=text_hash(old_text),
+        stderr_hash=text_hash(new_text),
+    )
+    keys = [
+        ("org-blobs-test", "prj", text_hash(old_text)),
+        ("org-blobs-test", "prj", text_hash(new_text)),
+    ]
+    results = [
+        (True, [{"hash": keys[0][2], "content": old_text, "compressed": None}]),
+        (
+            True,
+            [
+                {
+                    "hash": keys[1][2],
+                    "content": None,
+                    "compressed": data,
+                    "dict_id": NO_DICT,
+                }
+            ],
+        ),
+    ]
+    _set_blob_texts([test_run], keys, results)
+    assert test_run.stdout == old_text
+    assert test_run.stderr == new_text
@@ -1,6 +1,29 @@
+import asyncio
+
+import pytest
+
 from generator import generate_suite_with_test_runs
-from terec.model.failures import load_failed_tests_for_suite_runs, load_test_case_runs
-from terec.model.results import TestCaseRun
+from terec.model.failures import (
+    _filter_test_case_history,
+    backfill_failed_test_case_runs,
+    backfill_test_case_history,
+    load_failed_test_case_runs_async,
+    load_failed_tests_for_suite_runs,
+    load_failed_tests_for_suite_runs_async,
+    load_suite_branch_runs_async,
+    load_test_case_history,
+    load_test_case_history_async,
+    load_test_case_runs,
+    load_test_case_runs_async,
+    load_test_cases_history_async,
+    projection_columns,
+)
+from terec.model.results import (
+    FailedTestCaseRun,
+    TestCaseRun,
+    TestCaseRunHistory,
+    TestCaseRunRow,
+)
 
 
 def test_get_failed_tests_for_suite_runs(cassandra_model, public_project):
@@ -92,3 +115,257 @@ def test_load_test_case_runs_with_result(cassandra_model, public_project):
         if the_test.is_same_test_case_and_config(x) and x.result == "FAIL"
     ]
     assert len(loaded_test_runs) == len(generated_test_runs)
+
+
+def test_load_failed_tests_async(cassandra_model, public_project):
+    # given some runs
+    branch = "main"
+    suite, suite_runs, test_runs = generate_suite_with_test_runs(
+        public_project.org, public_project.name, branch
+    )
+    # when we collect runs and their failed tests asynchronously
+    loaded_runs = asyncio.run(
+        load_suite_branch_runs_async(
+            public_project.org, public_project.name, suite.suite, branch
+        )
+    )
+    failed_tests = asyncio.run(load_failed_tests_for_suite_runs_async(loaded_runs))
+    # then we get the same results as with the sync version
+    assert sorted(x.run_id for x in loaded_runs) == sorted(x.run_id for x in suite_runs)
+    assert len(failed_tests) == len(load_failed_tests_for_suite_runs(suite_runs))
+
+
+def test_load_failed_test_case_runs_async(cassandra_model, public_project):
+    # given some runs
+    suite, suite_runs, test_runs = generate_suite_with_test_runs(
+        public_project.org, public_project.name
+    )
+    # when we load failures of selected test case runs only
+    selected = test_runs[:10]
+    failures = asyncio.run(load_failed_test_case_runs_async(selected))
+    # then only failed ones are read
+    expected = [x for x in selected if x.result == "FAIL"]
+    key = lambda x: (x.run_id, x.test_package, x.test_suite, x.test_case)
+    assert sorted(map(key, failures)) == sorted(map(key, expected))
+
+
+def test_load_failed_tests_as_rows(cassandra_model, public_project):
+    # given some runs
+    suite, suite_runs, test_runs = generate_suite_with_test_runs(
+        public_project.org, public_project.name
+    )
+    # when we load failed tests as plain rows
+    tests = asyncio.run(load_failed_tests_for_suite_runs_async(suite_runs))
+    rows = asyncio.run(load_failed_tests_for_suite_runs_async(suite_runs, as_rows=True))
+    # then they have same content in same order
+    assert all(isinstance(r, TestCaseRunRow) for r in rows)
+    assert [t.test_case_run_id_tuple() for t in tests] == [
+        (r.test_package, r.test_suite, r.test_case, r.test_config, r.run_id)
+        for r in rows
+    ]
+    assert [t.stdout for t in tests] == [r["stdout"] for r in rows]
+
+
+def test_load_test_case_runs_async(cassandra_model, public_project):
+    # given some runs
+    branch = "main"
+    suite, suite_runs, test_runs = generate_suite_with_test_runs(
+        public_project.org, public_project.name, branch
+    )
+    the_test: TestCaseRun = test_runs[0]
+    # when we load all runs of selected test asynchronously
+    loaded_test_runs = asyncio.run(
+        load_test_case_runs_async(
+            public_project.org,
+            public_project.name,
+            suite.suite,
+            branch,
+            [r.run_id for r in suite_runs],
+            test_package=the_test.test_package,
+            test_class=the_test.test_suite,
+            test_case=the_test.test_case,
+        )
+    )
+    # then we got from database expected
+    generated_test_runs = [x for x in test_runs if the_test.is_same_test_case(x)]
+    assert len(loaded_test_runs) == len(generated_test_runs)
+
+
+def test_backfill_failed_tests_for_suite_runs(cassandra_model, public_project):
+    # given runs with failures missing in the failures table
+    suite, suite_runs, test_runs = generate_suite_with_test_runs(
+        public_project.org, public_project.name
+    )
+    for run in suite_runs:
+        FailedTestCaseRun.objects(
+            org=run.org,
+            project=run.project,
+            suite=run.suite,
+            branch=run.branch,
+            run_id=run.run_id,
+        ).delete()
+    assert not load_failed_tests_for_suite_runs(suite_runs)
+    # when failures are backfilled
+    written = backfill_failed_test_case_runs(suite_runs)
+    # then all of them are loaded again
+    expected_count = sum([x.fail_count for x in suite_runs])
+    assert written == expected_count
+    assert len(load_failed_tests_for_suite_runs(suite_runs)) == expected_count
+
+
+def test_backfill_removes_tests_not_failing_anymore(cassandra_model, public_project):
+    # given a test which passed but is stored in the failures table
+    # (e.g. run re-imported with a fixed test before it had a manifest)
+    suite, suite_runs, test_runs = generate_suite_with_test_runs(
+        public_project.org, public_project.name
+    )
+    passed = next(t for t in test_runs if t.result == "PASS")
+    stale = {c: getattr(passed, c) for c in TestCaseRun._columns}
+    FailedTestCaseRun.create(**stale)
+    run = next(r for r in suite_runs if r.run_id == passed.run_id)
+    assert len(load_failed_tests_for_suite_runs([run])) == run.fail_count + 1
+    # when failures are backfilled
+    backfill_failed_test_case_runs([run])
+    # then only the failed tests are left
+    failures = load_failed_tests_for_suite_runs([run])
+    assert len(failures) == run.fail_count
+    assert all(t.result == "FAIL" for t in failures)
+
+
+def test_load_test_case_history(cassandra_model, public_project):
+    # given some runs
+    branch = "main"
+    suite, suite_runs, test_runs = generate_suite_with_test_runs(
+        public_project.org, public_project.name, branch
+    )
+    the_test: TestCaseRun = test_runs[0]
+    # when we load history of selected test in some of the runs
+    run_ids = [r.run_id for r in suite_runs][2:6]
+    history = load_test_case_history(
+        public_project.org,
+        public_project.name,
+        suite.suite,
+        branch,
+        run_ids,
+        test_package=the_test.test_package,
+        test_class=the_test.test_suite,
+        test_case=the_test.test_case,
+    )
+    # then we got runs of the test from these suite runs only, latest first
+    expected = [
+        x for x in test_runs if the_test.is_same_test_case(x) and x.run_id in run_ids
+    ]
+    assert len(history) == len(expected)
+    assert [x.run_id for x in history] == sorted(
+        [x.run_id for x in history], reverse=True
+    )
+    # and async version gets the same
+    history_async = asyncio.run(
+        load_test_case_history_async(
+            public_project.org,
+            public_project.name,
+            suite.suite,
+            branch,
+            run_ids,
+            test_package=the_test.test_package,
+            test_class=the_test.test_suite,
+            test_case=the_test.test_case,
+            test_config=the_test.test_config,
+        )
+    )
+    assert len(history_async) == len(
+        [x for x in expected if x.test_config == the_test.test_config]
+    )
+
+
+def test_load_test_cases_history_async(cassandra_model, public_project):
+    # given some runs
+    branch = "main"
+    suite, suite_runs, test_runs = generate_suite_with_test_runs(
+        public_project.org, public_project.name, branch
+    )
+    tests = {(x.test_package, x.test_suite, x.test_case): x for x in test_runs}
+    test_cases = [key + (None,) for key in list(tests)[:4]]
+    # when we load history of many test cases at once
+    histories = asyncio.run(
+        load_test_cases_history_async(
+            public_project.org,
+            public_project.name,
+            suite.suite,
+            branch,
+            [r.run_id for r in suite_runs],
+            test_cases,
+        )
+    )
+    # then each test case has its own history
+    assert len(histories) == len(test_cases)
+    for (package, cls, case, _), history in zip(test_cases, histories):
+        expected = [
+            x
+            for x in test_runs
+            if (x.test_package, x.test_suite, x.test_case) == (package, cls, case)
+        ]
+        assert len(history) == len(expected)
+        assert all(x.test_case == case for x in history)
+
+
+def test_backfill_test_case_history(cassandra_model, public_project):
+    # given runs with empty test case history
+    suite, suite_runs, test_runs = generate_suite_with_test_runs(
+        public_project.org, public_project.name
+    )
+    the_test: TestCaseRun = test_runs[0]
+    history_query = dict(
+        org=the_test.org,
+        project=the_test.project,
+        suite=the_test.suite,
+        branch=the_test.branch,
+        test_package=the_test.test_package,
+        test_suite=the_test.test_suite,
+        test_case=the_test.test_case,
+    )
+    TestCaseRunHistory.objects(**history_query).delete()
+    # when history is backfilled
+    written = backfill_test_case_history(suite_runs)
+    # then all test runs are copied
+    assert written == len(test_runs)
+    expected = [x for x in test_runs if the_test.is_same_test_case(x)]
+    assert TestCaseRunHistory.objects(**history_query).count() == len(expected)
+
+
+def test_projection_columns():
+    keys = ("org", "project", "suite", "branch", "run_id")
+    keys += ("test_package", "test_suite", "test_case", "test_config", "result")
+    assert projection_columns() is None
+    assert projection_columns(fields=["result"]) == keys
+    # texts stored as blobs are read with their hashes
+    assert projection_columns(fields=["stdout", "test_group"]) == keys + (
+        "test_group",
+        "stdout",
+        "stdout_hash",
+    )
+    excluded = projection_columns(exclude=["stdout", "stderr", "error_stacktrace"])
+    assert "stdout" not in excluded and "stdout_hash" not in excluded
+    assert "error_details" in excluded and "error_details_hash" in excluded
+    with pytest.raises(ValueError):
+        projection_columns(fields=["result", "unknown"])
+
+
+def test_test_case_run_row():
+    row = TestCaseRunRow(test_case="a", stdout_hash=None)
+    row.stdout = "text"
+    assert row.test_case == "a"
+    assert row == {"test_case": "a", "stdout_hash": None, "stdout": "text"}
+    assert getattr(row, "stderr_hash", None) is None
+    with pytest.raises(AttributeError):
+        row.stderr
+
+
+def test_filter_test_case_history_limits_after_filtering():
+    # given history with passes in the latest runs
+    rows = [{"run_id": 5 - i, "result": "PASS" if i < 3 else "FAIL"} for i in range(5)]
+    # when we ask for a single failure
+    history = _filter_test_case_history(rows, "FAIL", 1, TestCaseRunRow)
+    # then passes do not use up the limit
+    assert [x.run_id for x in history] == [2]
+    assert len(_filter_test_case_history(rows, None, 4, TestCaseRunRow)) == 4
@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+from terec.model.history import HistorySummary, summarize_history
+
+
+def case_run(run_id: int, result: str, test_group: str | None = None):
+    return SimpleNamespace(run_id=run_id, result=result, test_group=test_group)
+
+
+def test_summarize_history():
+    run_ids = [5, 4, 3, 2, 1]
+    histories = [
+        [
+            case_run(1, "FAIL"),
+            case_run(2, "PASS", "ui"),
+            case_run(4, "SKIP"),
+            case_run(5, "FAIL"),
+        ],
+        [case_run(3, "PASS"), case_run(4, "PASS")],
+    ]
+    summaries = summarize_history(histories, run_ids)
+    assert summaries == [
+        HistorySummary(
+            num_pass=1,
+            num_fail=2,
+            num_skip=1,
+            first_fail_run_id=1,
+            last_fail_run_id=5,
+            test_group="ui",
+            results="FS_PF",
+        ),
+        HistorySummary(2, 0, 0, None, None, None, "_PP__"),
+    ]
+
+
+def test_worst_result_of_suite_run_wins():
+    # e.g. runs of many configs of the test in the same suite run
+    histories = [[case_run(1, "PASS"), case_run(1, "FAIL"), case_run(1, "SKIP")]]
+    summary = summarize_history(histories, [1])[0]
+    assert summary.results == "F"
+    assert (summary.num_pass, summary.num_fail, summary.num_skip) == (0, 1, 0)
+
+
+def test_runs_of_other_suite_runs_are_ignored():
+    summary = summarize_history([[case_run(7, "FAIL")]], [2, 1])[0]
+    assert summary.results == "__"
+    assert summary.first_fail_run_id is None
+
+
+def test_summarize_history_without_runs():
+    summaries = summarize_history([[], []], [])
+    assert [s.results for s in summaries] == ["", ""]
@@ -0,0 +1,58 @@
+import uuid
+from datetime import datetime, timedelta
+
+from terec.model.jobs import IngestJob, IngestJobChunk, job_progress
+
+NOW = datetime(2025, 5, 6, 12, 0, 0)
+
+
+def ingest_job(num_chunks: int, **kwargs) -> IngestJob:
+    params = {"status": IngestJob.QUEUED, "updated_at": NOW - timedelta(minutes=5)}
+    return IngestJob(job_id=uuid.uuid4(), num_chunks=num_chunks, **params | kwargs)
+
+
+def job_chunk(n: int, written: int, failed: int = 0, error=None) -> IngestJobChunk:
+    return IngestJobChunk(
+        chunk=n,
+        rows_written=written,
+        rows_skipped=0,
+        rows_failed=failed,
+        error=error,
+        updated_at=NOW - timedelta(minutes=1),
+    )
+
+
+def test_job_progress_is_combined_from_chunks():
+    job = ingest_job(num_chunks=3)
+    assert job_progress(job, [], 3600, NOW)["status"] == "QUEUED"
+    chunks = [job_chunk(0, 10), job_chunk(1, 5)]
+    progress = job_progress(job, chunks, 3600, NOW)
+    assert progress["status"] == "RUNNING"
+    assert progress["rows_written"] == 15
+    assert progress["updated_at"].replace(tzinfo=None) == chunks[0].updated_at
+    chunks.append(job_chunk(2, 0, failed=7, error="timeout"))
+    progress = job_progress(job, chunks, 3600, NOW)
+    assert progress["status"] == "FAILED"
+    assert progress["rows_failed"] == 7
+    assert progress["error"] == "timeout"
+    assert job_progress(job, chunks[:2], 3600, NOW)["status"] == "RUNNING"
+    assert (
+        job_progress(ingest_job(num_chunks=2), chunks[:2], 3600, NOW)["status"]
+        == "DONE"
+    )
+
+
+def test_job_without_progress_is_failed():
+    job = ingest_job(num_chunks=2)
+    # when chunks were lost (e.g. in-process queue on restart)
+    progress = job_progress(job, [job_chunk(0, 10)], 30, NOW)
+    # then job is reported as failed
+    assert progress["status"] == "FAILED"
+    assert "1 of 2 chunks" in progress["error"]
+
+
+def test_job_failed_when_queued_stays_failed():
+    job = ingest_job(num_chunks=2, status=IngestJob.FAILED, error="queue full")
+    progress = job_progress(job, [job_chunk(0, 10)], 3600, NOW)
+    assert progress["status"] == "FAILED"
+    assert progress["error"] == "queue full"
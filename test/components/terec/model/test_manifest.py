@@ -0,0 +1,209 @@
+import datetime
+
+import pytest
+
+from types import SimpleNamespace
+
+from terec.database.batch import UnloggedBatchWriter
+from terec.model.blobs import BLOB_MIN_SIZE, TextBlobs, text_hash
+from terec.model import ingest
+from terec.model.manifest import (
+    ManifestEntry,
+    case_key,
+    content_hash,
+    manifest_params,
+)
+from terec.model.results import TestCaseRunStatus
+from terec.model.text_compression import project_dicts
+
+SUITE_RUN = SimpleNamespace(
+    org="org-manifest-test",
+    project="prj",
+    suite="suite",
+    branch="main",
+    run_id=1,
+    tstamp=datetime.datetime(2025, 6, 1),
+)
+
+
+@pytest.fixture
+def unprepared_statements(monkeypatch):
+    # statements are not prepared, writers are only filled
+    monkeypatch.setattr(ingest.statements, "get", lambda name, session=None: name)
+
+
+def case_run(name: str, result: str = "PASS", stdout: str | None = None):
+    return SimpleNamespace(
+        test_package="org.example",
+        test_suite="TestSuite",
+        test_case=name,
+        test_config="#",
+        result=TestCaseRunStatus(result),
+        test_group=None,
+        tstamp=None,
+        duration_ms=10,
+        stdout=stdout,
+        stderr=None,
+        error_stacktrace=None,
+        error_details=None,
+        skip_details=None,
+    )
+
+
+def manifest_entry(test) -> ManifestEntry:
+    params = ingest.test_case_run_params(SUITE_RUN, test, TextBlobs("org", "prj"))
+    return ManifestEntry(test.result.value, test.duration_ms, content_hash(params))
+
+
+def test_content_hash_depends_on_row_content():
+    blobs = TextBlobs("org", "prj")
+    params = ingest.test_case_run_params(SUITE_RUN, case_run("a"), blobs)
+    same = ingest.test_case_run_params(SUITE_RUN, case_run("a"), blobs)
+    failed = ingest.test_case_run_params(SUITE_RUN, case_run("a", "FAIL"), blobs)
+    assert content_hash(params) == content_hash(same)
+    assert content_hash(params) != content_hash(failed)
+
+
+def test_manifest_params():
+    params = ingest.test_case_run_params(
+        SUITE_RUN, case_run("a"), TextBlobs("org", "prj")
+    )
+    assert manifest_params(params, "hash") == (
+        "org-manifest-test",
+        "prj",
+        "suite",
+        "main",
+        1,
+        "org.example",
+        "TestSuite",
+        "a",
+        "#",
+        "PASS",
+        10,
+        "hash",
+    )
+
+
+def test_unchanged_rows_and_their_blobs_are_skipped(unprepared_statements):
+    project_dicts.put(SUITE_RUN.org, SUITE_RUN.project, None)
+    unchanged = case_run("unchanged", stdout="u" * BLOB_MIN_SIZE)
+    changed = case_run("changed", stdout="c" * BLOB_MIN_SIZE)
+    existing = {
+        case_key(unchanged): manifest_entry(unchanged),
+        case_key(changed): manifest_entry(case_run("changed", "FAIL")),
+    }
+    new = case_run("new")
+    tests = [unchanged, changed, new]
+    result = ingest._test_case_runs_writers(SUITE_RUN, tests, existing, None, 0)
+    changed_tests, blob_rows, _, writer, manifest_writer = result
+    assert changed_tests == [changed, new]
+    # only blob of changed test is written
+    assert [r[2] for r in blob_rows] == [text_hash(changed.stdout)]
+    # each changed test has its row, history and manifest entry,
+    # previously failed one is also removed from failures
+    assert writer.num_rows == 5
+    assert manifest_writer.num_rows == 2
+
+
+def test_last_duplicate_wins(unprepared_statements):
+    first, last = case_run("a", "FAIL"), case_run("a", "PASS")
+    result = ingest._test_case_runs_writers(SUITE_RUN, [first, last], {}, None, 0)
+    assert result[0] == [last]
+
+
+def writer_rows(writer) -> list[tuple]:
+    batches = writer.ready_batches + [rows for rows, _ in writer.open_batches.values()]
+    return [row for rows in batches for row in rows]
+
+
+def test_failures_are_written_to_failures_table(unprepared_statements):
+    failed, passed = case_run("failed", "FAIL"), case_run("passed")
+    result = ingest._test_case_runs_writers(SUITE_RUN, [failed, passed], {}, None, 0)
+    writer = result[3]
+    # rows and history entries of both tests and failure copy of the failed one
+    assert writer.num_rows == 5
+    statements = [stmt for stmt, _ in writer_rows(writer)]
+    assert statements.count("failed_test_case_run_insert") == 1
+    assert statements.count("test_case_history_insert") == 2
+
+
+def test_fixed_failure_is_removed_from_failures_table(unprepared_statements):
+    fixed = case_run("fixed")
+    existing = {case_key(fixed): manifest_entry(case_run("fixed", "FAIL"))}
+    result = ingest._test_case_runs_writers(SUITE_RUN, [fixed], existing, None, 0)
+    writer = result[3]
+    deletes = [
+        p for stmt, p in writer_rows(writer) if stmt == "failed_test_case_run_delete"
+    ]
+    assert deletes == [
+        ("org-manifest-test", "prj", "suite", "main", 1)
+        + ("org.example", "TestSuite", "fixed", "#")
+    ]
+
+
+class FakeTables:
+    """
+    Rows written by statement name, inserts of given test cases fail once.
+    """
+
+    def __init__(self, failing: set[str]):
+        self.failing = failing
+        self.rows = []
+
+    def writer(self, session, max_batch_bytes: int = 0):
+        tables = self
+
+        class Writer(UnloggedBatchWriter):
+            def execute(self) -> int:
+                statements, num_rows = self._take_statements()
+                errors = []
+                for stmt, params in statements:
+                    if stmt == "test_case_run_insert" and params[7] in tables.failing:
+                        tables.failing.remove(params[7])
+                        errors.append(Exception(f"write of {params[7]} failed"))
+                    else:
+                        tables.rows.append((stmt, params))
+                if errors:
+                    raise errors[0]
+                return num_rows
+
+        return Writer(session, max_batch_bytes=max_batch_bytes)
+
+    def manifest(self, suite_run, tests, session=None) -> dict:
+        return {
+            p[5:9]: ManifestEntry(p[9], p[10], p[11])
+            for stmt, p in self.rows
+            if stmt == "manifest_insert"
+        }
+
+    def written(self, stmt: str) -> list[str]:
+        return [p[7] for s, p in self.rows if s == stmt]
+
+
+def test_failed_row_is_written_again_on_retry(unprepared_statements, monkeypatch):
+    project_dicts.put(SUITE_RUN.org, SUITE_RUN.project, None)
+    tables = FakeTables(failing={"b"})
+    monkeypatch.setattr(ingest, "UnloggedBatchWriter", tables.writer)
+    monkeypatch.setattr(ingest, "load_run_manifest", tables.manifest)
+    monkeypatch.setattr(ingest, "update_suite_run_aggregates", lambda *args: None)
+    tests = [case_run("a"), case_run("b"), case_run("c")]
+
+    def write(tests):
+        # every row is a separate request
+        return ingest.write_test_case_runs(
+            SUITE_RUN, tests, session=object(), max_batch_bytes=0
+        )
+
+    # when write of one of the rows fails
+    with pytest.raises(Exception, match="write of b failed"):
+        write(tests)
+    # then no manifest entry is written
+    assert tables.written("manifest_insert") == []
+    # and the retry writes all the rows again
+    counts = write(tests)
+    assert counts.written == 3
+    assert sorted(tables.written("test_case_run_insert")) == ["a", "a", "b", "c", "c"]
+    assert sorted(tables.written("manifest_insert")) == ["a", "b", "c"]
+    # while the next import skips them
+    counts = write(tests)
+    assert counts.skipped == 3
@@ -0,0 +1,19 @@
+from terec.model.migrations import drop_obsolete_indexes
+from terec.model.results import OBSOLETE_INDEXES, TestCaseRun
+
+
+class RecordingSession:
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, query):
+        self.executed.append(query)
+
+
+def test_drop_obsolete_indexes():
+    session = RecordingSession()
+    drop_obsolete_indexes(session)
+    keyspace = TestCaseRun._get_keyspace()
+    assert session.executed == [
+        f"DROP INDEX IF EXISTS {keyspace}.{name}" for name in OBSOLETE_INDEXES
+    ]
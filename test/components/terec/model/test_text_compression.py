@@ -0,0 +1,109 @@
+import asyncio
+
+import zstandard
+
+from terec.model.text_compression import (
+    COMPRESSION_LEVEL,
+    LATEST_DICT_TTL_SEC,
+    NO_DICT,
+    _ProjectDicts,
+    compress_text,
+    decompress_text,
+    project_dicts,
+)
+
+
+def stacktrace(n: int) -> str:
+    frames = [
+        f"\tat org.apache.cassandra.db.ColumnFamilyStore{i % 7}.method{i}(ColumnFamilyStore.java:{i * 13})"
+        for i in range(n, n + 20)
+    ]
+    return f"java.lang.AssertionError: expected {n} but was {n + 1}\n" + "\n".join(
+        frames
+    )
+
+
+def trained_dict() -> zstandard.ZstdCompressionDict:
+    samples = [stacktrace(n).encode("utf-8") for n in range(500)]
+    return zstandard.train_dictionary(4096, samples, level=COMPRESSION_LEVEL)
+
+
+def test_compress_without_dictionary():
+    project_dicts.put("org-compression-test", "no-dict", None)
+    text = stacktrace(1)
+    dict_id, data = compress_text("org-compression-test", "no-dict", text)
+    assert dict_id == NO_DICT
+    assert len(data) < len(text)
+    assert decompress_text("org-compression-test", "no-dict", dict_id, data) == text
+
+
+def test_compress_with_project_dictionary():
+    d = trained_dict()
+    project_dicts.put("org-compression-test", "dict", d)
+    project_dicts.put("org-compression-test", "no-dict", None)
+    text = stacktrace(1000)
+    dict_id, data = compress_text("org-compression-test", "dict", text)
+    _, plain_data = compress_text("org-compression-test", "no-dict", text)
+    assert dict_id == d.dict_id() != NO_DICT
+    assert len(data) < len(plain_data)
+    assert decompress_text("org-compression-test", "dict", dict_id, data) == text
+
+
+def test_old_dictionaries_are_kept_for_reading():
+    dicts = _ProjectDicts()
+    old = trained_dict()
+    dicts.put("org", "prj", old)
+    dicts.put("org", "prj", None)
+    assert dicts.get_latest("org", "prj") is None
+    assert dicts.get("org", "prj", old.dict_id()) is old
+
+
+def test_latest_dictionary_expires():
+    now = [0.0]
+    dicts = _ProjectDicts(timer=lambda: now[0])
+    dicts.put("org", "prj", None)
+    loaded = []
+    dicts.load = lambda org, project, session=None: loaded.append(project)
+    assert dicts.get_latest("org", "prj") is None
+    assert not loaded
+    now[0] += 3600
+    dicts.get_latest("org", "prj")
+    assert loaded == ["prj"]
+
+
+def test_latest_dictionary_is_refreshed_ahead_of_expiry_by_async_code():
+    now = [0.0]
+    dicts = _ProjectDicts(timer=lambda: now[0])
+    dicts.put("org", "prj", None)
+    loaded = []
+
+    async def load_async(org, project, session=None):
+        loaded.append(project)
+        dicts.put(org, project, None)
+
+    dicts.load_async = load_async
+    asyncio.run(dicts.get_latest_async("org", "prj"))
+    assert not loaded
+    now[0] += LATEST_DICT_TTL_SEC * 0.75
+    asyncio.run(dicts.get_latest_async("org", "prj"))
+    assert loaded == ["prj"]
+    # so sync lookup right after does not load it
+    dicts.load = lambda org, project, session=None: loaded.append("sync")
+    dicts.get_latest("org", "prj")
+    assert loaded == ["prj"]
+
+
+def test_only_missing_dictionaries_are_preloaded():
+    dicts = _ProjectDicts()
+    d = trained_dict()
+    dicts.put("org", "prj", d)
+    loaded = []
+
+    async def load_async(org, project, session=None):
+        loaded.append(project)
+
+    dicts.load_async = load_async
+    asyncio.run(dicts.preload_async("org", "prj", {d.dict_id()}))
+    assert not loaded
+    asyncio.run(dicts.preload_async("org", "prj", {d.dict_id(), 12345}))
+    assert loaded == ["prj"]
@@ -1,3 +1,5 @@
+import asyncio
+
 import pytest
 
 from terec.model.results import TestSuiteRun
@@ -5,7 +7,10 @@ from .text_samples import sample_npe_stack_trace
 
 from conftest import random_name
 from generator import ResultsGenerator
-from terec.regression.failure_analysis import TestCaseRunFailureAnalyser
+from terec.regression.failure_analysis import (
+    SuiteRunFailureAnalyser,
+    TestCaseRunFailureAnalyser,
+)
 
 
 class TestFailureAnalyser:
@@ -123,3 +128,43 @@ class TestFailureAnalyser:
         assert analyzer.is_known_failure()
         assert len(analyzer.similar_failures) == 2
         assert {x.run_id for x in analyzer.similar_failures} == {1, 4}
+
+    def test_check_suite_run_failures_at_once(self, gen_with_suite_runs):
+        # given histories of two tests FPPF and PPPF
+        gen = gen_with_suite_runs
+        known, new = gen.test_cases[:2]
+        for n, results in enumerate(["FP", "PP", "PP", "FF"], start=1):
+            for template, result in zip([known, new], results):
+                details = self.TEST_FAIL if result == "F" else self.TEST_PASS
+                gen.test_case_run(gen.get_suite_run(n), template, details)
+        # when we analyze all failures of the last run
+        analyzer = SuiteRunFailureAnalyser(gen.get_suite_run(4))
+        asyncio.run(analyzer.check_async(depth=8))
+        # then each of them is analyzed against 3 previous runs
+        assert analyzer.num_failures() == 2
+        by_case = {a.failed_test.test_case: a for a in analyzer.analysers}
+        assert by_case[known["test_case"]].is_known_failure()
+        assert by_case[known["test_case"]].num_test_runs_checked() == 3
+        assert by_case[known["test_case"]].similar_failures[0].run_id == 1
+        assert by_case[new["test_case"]].is_known_failure() is False
+        assert by_case[new["test_case"]].num_test_runs_pass() == 3
+        assert analyzer.num_new_failures() == 1
+
+    def test_check_regression_on_given_suite_runs(self, gen_with_suite_runs):
+        # given a history of test runs with failures FPPF
+        gen = gen_with_suite_runs
+        case_template = gen.test_case_template()
+        for n, details in enumerate(
+            [self.TEST_FAIL, self.TEST_PASS, self.TEST_PASS], start=1
+        ):
+            gen.test_case_run(gen.get_suite_run(n), case_template, details)
+        failed_test = gen.test_case_run(
+            gen.get_suite_run(4), case_template, self.TEST_FAIL
+        )
+        # when we analyze last failure with suite runs given (e.g. cached)
+        suite_runs = [gen.get_suite_run(n) for n in (2, 3)]
+        analyzer = TestCaseRunFailureAnalyser(failed_test)
+        asyncio.run(analyzer.check_regression_async(depth=8, suite_runs=suite_runs))
+        # then only the given suite runs are checked
+        assert analyzer.num_test_runs_checked() == 2
+        assert analyzer.is_known_failure() is False
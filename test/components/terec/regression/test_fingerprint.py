@@ -0,0 +1,82 @@
+from .text_samples import (
+    sample_npe_stack_trace,
+    sample_npe_stack_trace_with_line_changes,
+    different_npe_stack_trace,
+)
+from terec.model.results import TestCaseRun
+from terec.regression.failure_analysis import TestCaseRunFailureAnalyser
+from terec.regression.fingerprint import failure_fingerprint, fingerprint_of
+
+
+def failed_test_run(stacktrace: str, details: str = "error happened") -> TestCaseRun:
+    run = TestCaseRun()
+    run.org = "some-org"
+    run.project = "some-prj"
+    run.suite = "some-suite"
+    run.result = "FAIL"
+    run.error_details = details
+    run.error_stacktrace = stacktrace
+    return run
+
+
+def test_fingerprint_requires_stacktrace():
+    assert failure_fingerprint(None, "error") is None
+    assert failure_fingerprint("", "error") is None
+
+
+def test_fingerprint_ignores_line_numbers():
+    assert failure_fingerprint(sample_npe_stack_trace) == failure_fingerprint(
+        sample_npe_stack_trace.replace(".java:15", ".java:17")
+    )
+
+
+def test_fingerprint_ignores_memory_addresses():
+    assert failure_fingerprint("segfault at 0x7f3a2c") == failure_fingerprint(
+        "segfault at 0x55d0e1"
+    )
+
+
+def test_fingerprint_depends_on_stacktrace_and_details():
+    fp = failure_fingerprint(sample_npe_stack_trace, "error happened")
+    assert fp != failure_fingerprint(different_npe_stack_trace, "error happened")
+    assert fp != failure_fingerprint(sample_npe_stack_trace, "other error")
+
+
+def test_fingerprint_of_stored_and_legacy_runs():
+    run = failed_test_run(sample_npe_stack_trace)
+    expected = failure_fingerprint(sample_npe_stack_trace, "error happened")
+    assert fingerprint_of(run) == expected
+    run.failure_fingerprint = "stored"
+    assert fingerprint_of(run) == "stored"
+    run.result = "PASS"
+    assert fingerprint_of(run) is None
+
+
+# differs from sample_npe_stack_trace in a way not covered by normalization
+similar_npe_stack_trace = sample_npe_stack_trace.replace("methodA", "MethodA")
+
+
+def test_analyser_uses_exact_fingerprint_matches_first():
+    # given history with one failure matching the fingerprint and one only similar
+    failed_test = failed_test_run(sample_npe_stack_trace)
+    same = failed_test_run(sample_npe_stack_trace_with_line_changes)
+    similar = failed_test_run(similar_npe_stack_trace)
+    analyser = TestCaseRunFailureAnalyser(failed_test)
+    analyser.test_runs_to_check = [same, similar]
+    # when similar runs are searched
+    analyser.find_similar_test_runs()
+    # then only the fingerprint match is found
+    assert analyser.similar_failures == [same]
+
+
+def test_analyser_falls_back_to_similarity_check():
+    # given history with similar failure only
+    failed_test = failed_test_run(sample_npe_stack_trace)
+    similar = failed_test_run(similar_npe_stack_trace)
+    different = failed_test_run(different_npe_stack_trace)
+    analyser = TestCaseRunFailureAnalyser(failed_test)
+    analyser.test_runs_to_check = [similar, different]
+    # when similar runs are searched
+    analyser.find_similar_test_runs()
+    # then similar failure is found
+    assert analyser.similar_failures == [similar]
@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+
+from terec.work_queue.core import InProcessWorkQueue, WorkQueueFull
+
+
+def test_in_process_queue_processes_all_messages():
+    processed = []
+    lock = threading.Lock()
+
+    def handler(message: bytes):
+        with lock:
+            processed.append(message)
+
+    q = InProcessWorkQueue("test", handler, num_workers=3)
+    messages = [f"message-{n}".encode() for n in range(20)]
+    for m in messages:
+        q.put(m)
+    q.join()
+    assert sorted(processed) == sorted(messages)
+
+
+def test_in_process_queue_survives_handler_failure():
+    processed = []
+
+    def handler(message: bytes):
+        if message == b"bad":
+            raise ValueError("cannot process")
+        processed.append(message)
+
+    q = InProcessWorkQueue("test", handler, num_workers=1)
+    for m in [b"bad", b"good"]:
+        q.put(m)
+    q.join()
+    assert processed == [b"good"]
+
+
+def test_in_process_queue_rejects_messages_when_full():
+    started, release = threading.Event(), threading.Event()
+
+    def handler(message: bytes):
+        started.set()
+        release.wait()
+
+    q = InProcessWorkQueue("test", handler, num_workers=1, max_size=2)
+    # worker takes the first message and waits, next two fill the queue
+    q.put(b"first")
+    started.wait()
+    q.put(b"second")
+    q.put(b"third")
+    with pytest.raises(WorkQueueFull):
+        q.put(b"too many")
+    release.set()
+    q.join()
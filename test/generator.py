@@ -3,7 +3,14 @@ import random
 import faker
 
 from conftest import random_name
-from terec.model.results import TestSuite, TestSuiteRun, TestCaseRun, TestCaseRunStatus
+from terec.model.results import (
+    FailedTestCaseRun,
+    TestSuite,
+    TestSuiteRun,
+    TestCaseRun,
+    TestCaseRunHistory,
+    TestCaseRunStatus,
+)
 
 
 class ResultsGenerator:
@@ -75,6 +82,9 @@ class ResultsGenerator:
         params["branch"] = run.branch
         params["run_id"] = run.run_id
         params.update(update)
+        if params["result"] == TestCaseRunStatus.FAIL.upper():
+            FailedTestCaseRun.create(**params)
+        TestCaseRunHistory.create(**params)
         return TestCaseRun.create(**params)
 
     def test_case_runs(self, run: TestSuiteRun) -> list[TestCaseRun]: